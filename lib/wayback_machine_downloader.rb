@@ -6,6 +6,7 @@ require 'open-uri'
 require 'fileutils'
 require 'cgi'
 require 'json'
+require 'digest'
 require_relative 'wayback_machine_downloader/tidy_bytes'
 require_relative 'wayback_machine_downloader/to_regex'
 require_relative 'wayback_machine_downloader/archive_api'
@@ -18,7 +19,7 @@ class WaybackMachineDownloader
 
   attr_accessor :base_url, :exact_url, :directory, :all_timestamps, :all_timestamps_latest,
     :from_timestamp, :to_timestamp, :only_filter, :exclude_filter, 
-    :all, :maximum_pages, :threads_count
+    :all, :maximum_pages, :threads_count, :collapse
 
   def initialize params
     @base_url = params[:base_url]
@@ -33,6 +34,7 @@ class WaybackMachineDownloader
     @all = params[:all]
     @maximum_pages = params[:maximum_pages] ? params[:maximum_pages].to_i : 100
     @threads_count = params[:threads_count].to_i
+    @collapse = params[:collapse]
   end
 
   def backup_name
@@ -84,8 +86,7 @@ class WaybackMachineDownloader
   def get_all_snapshots_to_consider
     # Note: Passing a page index parameter allow us to get more snapshots,
     # but from a less fresh index
-    http = Net::HTTP.new("web.archive.org", 443)
-    http.use_ssl = true
+    http = archive_http
     http.start()
     print "Getting snapshot pages"
     snapshot_list_to_consider = []
@@ -263,8 +264,7 @@ class WaybackMachineDownloader
     @processed_file_count = 0
     @threads_count = 1 unless @threads_count != 0
     @threads_count.times do
-      http = Net::HTTP.new("web.archive.org", 443)
-      http.use_ssl = true
+      http = archive_http
       http.start()
       threads << Thread.new do
         until file_queue.empty?
@@ -326,19 +326,18 @@ class WaybackMachineDownloader
       file_path = file_path.gsub(/[:*?&=<>\\|]/) {|s| '%' + s.ord.to_s(16) }
     end
     unless File.exist? file_path
+      saved = false
       begin
         structure_dir_path dir_path
         open(file_path, "wb") do |file|
           begin
-            # http.get(URI("https://web.archive.org/web/#{file_timestamp}id_/#{file_url}")) do |body|
-            http.get(URI("https://web.archive.org/web/#{file_timestamp}/#{file_url}")) do |body|
-              file.write(body)
-            
-            file_name = file_url.split('/')[3..-1].join('_')
+            # fetch_snapshot(http, URI("https://web.archive.org/web/#{file_timestamp}id_/#{file_url}"), file)
+            fetch_snapshot(http, URI("#{archive_base_url}/web/#{file_timestamp}/#{file_url}"), file)
+            saved = true
+
             recorded_url = "https://web.archive.org/web/#{file_timestamp}/#{file_url}"
             File.open(File.join(backup_path, "#{backup_name}.txt"), "a") { |f| f.puts(recorded_url) }
             # File.open("#{backup_name}.txt", "a") { |f| f.puts(uri) }  # 记录每次访问的URL
-            end
           rescue OpenURI::HTTPError => e
             puts "#{file_url} # #{e}"
             if @all
@@ -349,12 +348,17 @@ class WaybackMachineDownloader
             puts "#{file_url} # #{e}"
           end
         end
+        append_manifest(file_path, file_timestamp, file_url) if saved
       rescue StandardError => e
         puts "#{file_url} # #{e}"
       ensure
         if not @all and File.exist?(file_path) and File.size(file_path) == 0
           File.delete(file_path)
           puts "#{file_path} was empty and was removed."
+        elsif not @all and not saved and File.exist?(file_path)
+          # A partial body would be skipped as "already exists" on the next run
+          File.delete(file_path)
+          puts "#{file_path} was incomplete and was removed."
         end
       end
       semaphore.synchronize do
@@ -369,6 +373,51 @@ class WaybackMachineDownloader
     end
   end
 
+  # Streams a snapshot into file, following same-host redirects. Error
+  # statuses raise "HTTP <code> <message>" so that 429/5xx can be told apart
+  # from real content (they used to be saved as the snapshot body).
+  # The redirect is followed after request_get returns: a `return` from inside
+  # its block would skip Net::HTTP's end_transport and leave the connection
+  # unfinished (and open after "Connection: close") for the next request.
+  def fetch_snapshot http, uri, file, redirects_left = 5
+    redirect = nil
+    http.request_get(uri) do |response|
+      if response.is_a?(Net::HTTPRedirection) and redirects_left > 0 and response['location']
+        location = URI.join(uri.to_s, response['location'])
+        if location.host == uri.host
+          response.read_body
+          redirect = location
+          next
+        end
+      end
+      unless response.is_a?(Net::HTTPSuccess) or @all
+        raise "HTTP #{response.code} #{response.message}"
+      end
+      written = 0
+      response.read_body { |chunk| written += file.write(chunk) }
+      expected = response['content-length']
+      if expected and written != expected.to_i
+        raise "Truncated body: #{written} of #{expected} bytes"
+      end
+    end
+    fetch_snapshot(http, redirect, file, redirects_left - 1) if redirect
+  end
+
+  # Records size and SHA1 of a saved snapshot in <backup_path>/.manifest.jsonl,
+  # the sidecar checked by wayback_tools/verify.py.
+  def append_manifest file_path, file_timestamp, file_url
+    entry = {
+      path: file_path.sub(backup_path, ''),
+      size: File.size(file_path),
+      sha1: Digest::SHA1.file(file_path).hexdigest,
+      timestamp: file_timestamp,
+      url: file_url
+    }
+    semaphore.synchronize do
+      File.open(File.join(backup_path, ".manifest.jsonl"), "a") { |f| f.puts(entry.to_json) }
+    end
+  end
+
   def file_queue
     @file_queue ||= file_list_by_timestamp.each_with_object(Queue.new) { |file_info, q| q << file_info }
   end
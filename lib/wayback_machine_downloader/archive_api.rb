@@ -3,14 +3,32 @@ require 'uri'
 
 module ArchiveAPI
 
+  # WAYBACK_BASE_URL points every request at another server, e.g. the local
+  # stand-in started by `python -m wayback_tools.fake_archive`.
+  def archive_base_url
+    @archive_base_url ||= (ENV['WAYBACK_BASE_URL'] || "https://web.archive.org").chomp('/')
+  end
+
+  def archive_http
+    uri = URI(archive_base_url)
+    http = Net::HTTP.new(uri.host, uri.port)
+    http.use_ssl = uri.scheme == 'https'
+    http
+  end
+
   def get_raw_list_from_api url, page_index, http
-    request_url = URI("https://web.archive.org/cdx/search/xd")
+    request_url = URI("#{archive_base_url}/cdx/search/xd")
     params = [["output", "json"], ["url", url]]
     params += parameters_for_api page_index
     request_url.query = URI.encode_www_form(params)
 
     begin
-      json = JSON.parse(http.get(URI(request_url)).body)
+      response = http.get(URI(request_url))
+      unless response.is_a?(Net::HTTPSuccess)
+        puts "#{request_url} # HTTP #{response.code} #{response.message}"
+        return []
+      end
+      json = JSON.parse(response.body)
       if (json[0] <=> ["timestamp","original"]) == 0
         json.shift
       end
@@ -21,7 +39,7 @@ module ArchiveAPI
   end
 
   def parameters_for_api page_index
-    parameters = [["fl", "timestamp,original"], ["collapse", "digest"], ["gzip", "false"]]
+    parameters = [["fl", "timestamp,original"], ["collapse", @collapse || "digest"], ["gzip", "false"]]
     if !@all
       parameters.push(["filter", "statuscode:200"])
     end
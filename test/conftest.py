@@ -0,0 +1,74 @@
+"""
+Python 工具的 pytest 公共夹具。
+
+fake_archive 在后台线程里启动 wayback_tools.fake_archive 替身服务器（随机端口），
+测试通过 archive.base_url 访问，通过 archive.stats 检查服务器端的请求计数。
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wayback_tools.fake_archive import FakeArchive, build_synthetic  # noqa: E402
+
+
+class ArchiveServer:
+    def __init__(self, archive):
+        self.archive = archive
+        self.base_url = None
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def stats(self):
+        return self.archive.stats
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.archive.app())
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        self._loop.run_until_complete(site.start())
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        self._thread.start()
+        self._started.wait(10)
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+
+
+@pytest.fixture
+def archive_factory():
+    """archive_factory(corpus=None, **FakeArchive 参数) 启动一个替身服务器，测试结束时关闭"""
+    servers = []
+
+    def start(corpus=None, **kwargs):
+        server = ArchiveServer(FakeArchive(corpus or build_synthetic(domains=3, pages=2, body_bytes=2000),
+                                           **kwargs)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def archive(archive_factory):
+    return archive_factory(page_size=10)
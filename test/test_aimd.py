@@ -0,0 +1,74 @@
+import sys
+
+import pytest
+
+import wayback_main
+from wayback_tools.aimd import AIMDController
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.fake_archive import build_synthetic
+from wayback_tools.retry import FailureTally
+
+
+def test_additive_increase_and_multiplicative_decrease():
+    controller = AIMDController(initial=4, maximum=6, cooldown=0)
+    for _ in range(4):
+        controller.on_success(0.1)
+    assert controller.window == 5
+    for _ in range(20):
+        controller.on_success(0.1)
+    assert controller.window == 6
+    controller.on_error()
+    assert controller.window == 3 and controller.cuts == 1
+
+
+def test_cooldown_and_latency_spikes():
+    controller = AIMDController(initial=16, cooldown=60, spike_floor=0.5)
+    controller.on_success(0.2)
+    controller.on_success(0.55)   # 低于 spike_floor 的 3 倍基线不算飙升
+    assert controller.cuts == 0
+    controller.on_success(2.0)
+    assert controller.window == 8
+    controller.on_error()
+    assert controller.window == 8 and controller.cuts == 1
+
+
+def test_engine_cuts_the_window_when_the_archive_throttles(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=1, pages=10, body_bytes=500),
+                              max_concurrency=4, latency=0.02)
+    controller = AIMDController(initial=16, cooldown=0)
+    engine = DownloadEngine(pool_size=16, base_url=archive.base_url, controller=controller)
+    corpus = archive.archive.corpus
+    file_list = [{'file_url': c['original'], 'timestamp': c['timestamp'], 'file_id': f"{i}.html"}
+                 for i, c in enumerate(corpus.by_host["site0.example"])]
+    stats = engine.download_files("site0.example", file_list, 16, str(tmp_path), emit=lambda line: None)
+    engine.close()
+    assert archive.stats['throttled'] > 0 and stats['errors']
+    assert controller.cuts > 0 and controller.window < 16
+    assert controller.in_flight == 0
+
+
+class _Recorder:
+    def __init__(self):
+        self.successes = 0
+        self.errors = 0
+
+    def on_success(self, latency=None):
+        self.successes += 1
+
+    def on_error(self):
+        self.errors += 1
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="需要 POSIX shell")
+def test_downloader_output_only_counts_saved_files(tmp_path):
+    saved = tmp_path / "index.html"
+    saved.write_bytes(b"<html>")
+    lines = [f"http://a.com/ -> {saved} (1/3)",
+             "http://a.com/x # HTTP 503 Service Unavailable",
+             f"http://a.com/x -> {tmp_path / 'x.html'} (2/3)",
+             f"http://a.com/y -> {tmp_path / 'y.html'} (3/3)"]
+    recorder = _Recorder()
+    code = wayback_main.run_downloader("; ".join(f"echo '{line}'" for line in lines), FailureTally(),
+                                       log_path="/dev/null", controller=recorder)
+    assert code == 0
+    assert (recorder.successes, recorder.errors) == (1, 1)
@@ -0,0 +1,113 @@
+import os
+import sys
+
+import pytest
+
+import wayback_main
+from wayback_tools.budget import DomainBudget, budget_from
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.fake_archive import build_synthetic
+from wayback_tools.job_store import CAPPED, DONE, PENDING, JobStore, measure_dir
+from wayback_tools.planner import curated_file_list, plan_latest_per_year
+from wayback_tools.retry import FailureTally
+from wayback_tools.snapshot_store import ContentStore
+from wayback_tools.verify import snapshot_files
+
+
+def test_reserve_counts_files_in_flight():
+    budget = DomainBudget(max_files=2)
+    assert budget.reserve() and budget.reserve()
+    assert not budget.reserve()
+    assert budget.reason.startswith("文件数")
+    budget.add(0, 0, reserved=True)
+    budget.add(1, 10, reserved=True)
+    assert (budget.files, budget.bytes, budget.reserved) == (1, 10, 0)
+    assert budget_from({'max_files': 0, 'max_bytes': 0, 'max_seconds': 0}) is None
+
+
+def test_byte_cap_stops_new_files():
+    budget = DomainBudget(max_bytes=100)
+    assert budget.reserve()
+    budget.add(1, 150, reserved=True)
+    # 没有剩下的文件时不算超出，再开始新文件则超出
+    assert not budget.exceeded() and not budget.reserve()
+    assert budget.reason.startswith("字节数")
+
+
+def test_exact_file_cap_is_not_exceeded():
+    budget = DomainBudget(max_files=3)
+    for _ in range(3):
+        budget.add(1, 10)
+    assert not budget.exceeded() and budget.reason is None
+    assert budget.exceeded(upcoming=1) and budget.reason.startswith("文件数")
+
+
+def _downloader(tmp_path, total):
+    """模拟 Ruby 下载器：逐个输出已保存的文件，最后停一会儿（被结束时不必等）"""
+    lines = []
+    for i in range(1, total + 1):
+        path = tmp_path / f"{i}.html"
+        path.write_bytes(b"x" * 10)
+        lines.append(f"echo 'http://a.com/{i} -> {path} ({i}/{total})'")
+    return "; ".join(lines + ["sleep 0.5"])
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="需要 POSIX 进程组")
+def test_ruby_path_kills_the_downloader_only_when_files_are_left(tmp_path):
+    budget = DomainBudget(max_files=3)
+    code = wayback_main.run_downloader(_downloader(tmp_path, 5), FailureTally(), log_path="/dev/null",
+                                       budget=budget)
+    assert code != 0 and budget.reason.startswith("文件数") and budget.files == 3
+
+    budget = DomainBudget(max_files=3)
+    code = wayback_main.run_downloader(_downloader(tmp_path, 3), FailureTally(), log_path="/dev/null",
+                                       budget=budget)
+    assert code == 0 and budget.reason is None and budget.files == 3
+
+
+def _homepages(archive, domain):
+    rows = [[c['timestamp'], c['original']]
+            for key in (f"{domain}/", f"www.{domain}/") for c in archive.archive.corpus.by_key.get(key, [])]
+    return curated_file_list(plan_latest_per_year(rows))
+
+
+def test_engine_never_saves_more_than_the_file_cap(archive, tmp_path):
+    file_list = _homepages(archive, "site0.example")
+    assert len(file_list) > 3
+    engine = DownloadEngine(pool_size=8, base_url=archive.base_url)
+    budget = DomainBudget(max_files=3)
+    stats = engine.download_files("site0.example", file_list, 8, str(tmp_path), emit=lambda line: None,
+                                  budget=budget)
+    engine.close()
+    assert stats['files'] == 3 and stats['skipped'] == len(file_list) - 3
+    files, size = measure_dir(str(tmp_path / "site0.example"))
+    assert (files, size) == (3, stats['bytes'])
+    assert len(list(snapshot_files(str(tmp_path / "site0.example")))) == 3
+
+
+def test_deduped_download_is_capped_and_continued(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=1, pages=1, body_bytes=2000))
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    store.add_domains(["site0.example"])
+    content_store = ContentStore(str(tmp_path / "store"))
+    base_dir = str(tmp_path / "websites")
+    engine = DownloadEngine(pool_size=4, base_url=archive.base_url)
+    caps = {'max_files': 1, 'max_bytes': 0, 'max_seconds': 0}
+
+    def run():
+        return wayback_main.download_one_deduped("site0.example", 4, store, base_dir=base_dir,
+                                                 content_store=content_store, engine=engine, caps=caps)
+
+    assert not run()
+    assert store.state_of("site0.example") == CAPPED
+    first = list(snapshot_files(os.path.join(base_dir, "site0.example")))
+    assert first and len(os.listdir(content_store.root)) == 1
+
+    assert store.continue_capped() == 1
+    assert store.state_of("site0.example") == PENDING
+    caps['max_files'] = 0
+    assert run()
+    engine.close()
+    assert store.state_of("site0.example") == DONE
+    assert len(list(snapshot_files(os.path.join(base_dir, "site0.example")))) > len(first)
+    store.close()
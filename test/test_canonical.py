@@ -0,0 +1,31 @@
+from wayback_tools.canonical import AliasMap, canonical_domain
+from wayback_tools.domain_input import iter_domains
+from wayback_tools.job_store import JobStore
+
+
+def test_spellings_collapse_to_one_name():
+    for spelling in ["foo.com", "www.foo.com", "HTTP://Foo.com/", "https://www2.foo.com:443/?a=1",
+                     "foo.com:80", "user@foo.com.", "http://www.foo.com/#top"]:
+        assert canonical_domain(spelling) == "foo.com"
+    assert canonical_domain("www.com") == "www.com"
+    assert canonical_domain("foo.com/blog/") == "foo.com/blog"
+    assert canonical_domain("例子.测试") == "xn--fsqu00a.xn--0zwm56d"
+
+
+def test_alias_map_reuses_existing_jobs_and_folders(tmp_path):
+    base = tmp_path / "websites"
+    (base / "www.old.com").mkdir(parents=True)
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    store.add_domains(["Done.com"])
+    (tmp_path / "list.txt").write_text("old.com\nhttp://www.old.com/\ndone.com\nwww.new.com\nnew.com:80\n")
+
+    aliases = AliasMap(store, base_dir=str(base))
+    assert list(iter_domains(str(tmp_path / "list.txt"), aliases.resolve)) == ["www.old.com", "Done.com", "new.com"]
+    aliases.flush()
+    assert aliases.merged == 4
+    assert store.aliases() == {"old.com": "www.old.com", "done.com": "Done.com",
+                               "www.new.com": "new.com", "new.com:80": "new.com"}
+
+    # 下次运行直接使用记录的别名
+    assert AliasMap(store, base_dir=str(tmp_path / "none")).resolve("old.com") == "www.old.com"
+    store.close()
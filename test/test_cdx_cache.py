@@ -0,0 +1,88 @@
+import time
+
+from wayback_tools.cdx_cache import CDXCache
+from wayback_tools.cdx_client import CDXClient, list_snapshots
+
+
+def _listing(archive, cache, url="site0.example"):
+    return list_snapshots(url, base_url=archive.base_url, cache=cache, collapse=None)
+
+
+def _listing_key(cache, url="site0.example"):
+    return cache.make_key(url, CDXClient(collapse=None).parameters_for_api() + [
+        ("exact_url", False), ("maximum_pages", 100)])
+
+
+def test_put_get_and_ttl(tmp_path):
+    cache = CDXCache(str(tmp_path), ttl=60)
+    key = cache.make_key("example.com", [("page", "0"), ("fl", "timestamp")])
+    assert key == cache.make_key("example.com", [("fl", "timestamp"), ("page", "0")])
+    assert cache.get(key) is None
+    cache.put(key, "example.com", [["20150101000000", "http://example.com/"]])
+    assert cache.get(key) == [["20150101000000", "http://example.com/"]]
+
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get(key) is None
+    cache.close()
+
+
+def test_lru_eviction_keeps_recent_pages(tmp_path):
+    cache = CDXCache(str(tmp_path), max_bytes=2000)
+    rows = [["20150101000000", "http://example.com/" + "x" * 100]] * 5
+    keys = [cache.make_key("example.com", [("page", str(i))]) for i in range(5)]
+    for key in keys:
+        cache.put(key, "example.com", rows)
+        time.sleep(0.01)
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) == rows
+    cache.close()
+
+
+def test_complete_listing_is_served_from_cache(archive, tmp_path):
+    cache = CDXCache(str(tmp_path))
+    first = _listing(archive, cache)
+    cursor = cache.get_cursor(_listing_key(cache))
+    assert cursor['complete'] and cursor['page_count'] > 1
+    assert cursor['last_page'] == cursor['page_count'] - 1
+
+    requests = archive.stats['cdx']
+    assert sorted(_listing(archive, cache)) == sorted(first)
+    assert archive.stats['cdx'] == requests
+    cache.close()
+
+
+def test_complete_listing_with_evicted_page_is_refetched(archive, tmp_path):
+    cache = CDXCache(str(tmp_path))
+    first = _listing(archive, cache)
+    prefix = "site0.example/*"
+    with cache._lock:
+        cache._remove(cache.make_key(prefix, CDXClient(collapse=None).request_params(prefix, 0)))
+
+    requests = archive.stats['cdx']
+    again = _listing(archive, cache)
+    assert sorted(again) == sorted(first) and len(again) == len(first)
+    assert archive.stats['cdx'] == requests + 1
+    assert cache.get_cursor(_listing_key(cache))['complete']
+    cache.close()
+
+
+def test_interrupted_listing_resumes_after_last_page(archive, tmp_path):
+    cache = CDXCache(str(tmp_path))
+    first = _listing(archive, cache)
+    key = _listing_key(cache)
+    pages = cache.get_cursor(key)['page_count']
+    # 模拟上次在第 1 页之后中断：游标停在 1，之后的页还没有取得
+    cache.set_cursor(key, "site0.example", last_page=1, complete=False)
+    prefix = "site0.example/*"
+    with cache._lock:
+        for i in range(2, pages):
+            cache._remove(cache.make_key(prefix, CDXClient(collapse=None).request_params(prefix, i)))
+
+    requests = archive.stats['cdx']
+    again = _listing(archive, cache)
+    assert sorted(again) == sorted(first) and len(again) == len(first)
+    assert archive.stats['cdx'] == requests + pages - 2
+    cursor = cache.get_cursor(key)
+    assert cursor['complete'] and cursor['last_page'] == pages - 1
+    cache.close()
@@ -0,0 +1,43 @@
+from wayback_tools import cdx_client
+from wayback_tools.cdx_client import iter_json_rows, list_snapshots, parse_json_row
+
+
+def _expected(archive, host):
+    """与 Ruby 版相同：先列出精确 url（主页），再列出 host/* 的全部快照，主页因此出现两次"""
+    corpus = archive.archive.corpus
+    captures = corpus.by_key[f"{host}/"] + corpus.by_host[host]
+    return sorted([c['timestamp'], c['original']] for c in captures)
+
+
+def test_parse_json_row_handles_first_last_and_header_lines():
+    assert parse_json_row(b'[["timestamp","original"],') == ["timestamp", "original"]
+    assert parse_json_row('["20150101000000","http://a.com/"],\n') == ["20150101000000", "http://a.com/"]
+    assert parse_json_row('["20160101000000","http://a.com/"]]') == ["20160101000000", "http://a.com/"]
+    assert parse_json_row("[]") is None and parse_json_row("not json") is None
+    lines = ['[["timestamp","original"],', '["20150101000000","http://a.com/"]]']
+    assert list(iter_json_rows(lines, ("timestamp", "original"))) == [["20150101000000", "http://a.com/"]]
+
+
+def test_listing_fetches_every_page_concurrently(archive_factory):
+    archive = archive_factory(page_size=5, latency=0.05)
+    rows = list_snapshots("site0.example", base_url=archive.base_url, collapse=None, concurrency=8)
+    assert sorted(rows) == _expected(archive, "site0.example")
+    # showNumPages、精确 url 和每一页各一次请求
+    pages = -(-len(archive.archive.corpus.by_host["site0.example"]) // 5)
+    assert archive.stats['cdx'] == pages + 2
+    assert archive.stats['max_in_flight'] > 1
+
+
+def test_listing_retries_server_errors(archive_factory, monkeypatch):
+    monkeypatch.setattr(cdx_client, 'backoff_delay', lambda attempt: 0)
+    archive = archive_factory(page_size=5, error_rate=0.3)
+    rows = list_snapshots("site1.example", base_url=archive.base_url, collapse=None, retries=20)
+    assert sorted(rows) == _expected(archive, "site1.example")
+    assert archive.stats['errors'] > 0
+
+
+def test_exact_url_skips_the_prefix_listing(archive):
+    rows = list_snapshots("site0.example", exact_url=True, base_url=archive.base_url, collapse=None)
+    assert sorted(rows) == sorted([c['timestamp'], c['original']]
+                                  for c in archive.archive.corpus.by_key["site0.example/"])
+    assert archive.stats['cdx'] == 1
@@ -0,0 +1,80 @@
+import time
+
+from wayback_tools import coordination
+from wayback_tools.coordination import Coordinator, HashRing, _write_json
+
+
+def _node(tmp_path, node_id, lease_ttl=300):
+    return Coordinator(str(tmp_path / "coord"), node_id=node_id, lease_ttl=lease_ttl)
+
+
+def test_ring_moves_only_the_removed_nodes_domains():
+    domains = [f"site{i}.example" for i in range(500)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b"])
+    owners = {d: before.node_for(d) for d in domains}
+    assert set(owners.values()) == {"a", "b", "c"}
+    for domain, owner in owners.items():
+        if owner != "c":
+            assert after.node_for(domain) == owner
+
+
+def test_lease_is_exclusive_until_released(tmp_path):
+    a, b = _node(tmp_path, "a"), _node(tmp_path, "b")
+    assert a.acquire("x.com")
+    assert not b.acquire("x.com")
+    a.release("x.com")
+    assert b.acquire("x.com")
+    b.complete("x.com", coordination.DONE)
+    assert not a.acquire("x.com")
+    assert a.lease_info("x.com")['state'] == coordination.DONE
+
+
+def test_expired_lease_can_be_taken_over(tmp_path):
+    a, b = _node(tmp_path, "a", lease_ttl=0.05), _node(tmp_path, "b")
+    assert a.acquire("x.com")
+    assert not b.acquire("x.com")
+    time.sleep(0.1)
+    assert b.acquire("x.com")
+    assert b.lease_info("x.com")['node_id'] == "b"
+
+
+def test_heartbeat_does_not_revive_a_completed_lease(tmp_path):
+    a = _node(tmp_path, "a")
+    assert a.acquire("x.com")
+    # complete() 的写入发生在心跳取得持有列表之后
+    _write_json(a._lease_path("x.com"), {'node_id': "a", 'state': coordination.DONE, 'finished_at': time.time()})
+    a.heartbeat()
+    assert a.lease_info("x.com")['state'] == coordination.DONE
+    assert "x.com" not in a._held
+
+
+def test_heartbeat_does_not_steal_a_taken_over_lease(tmp_path):
+    a, b = _node(tmp_path, "a", lease_ttl=0.05), _node(tmp_path, "b")
+    assert a.acquire("x.com")
+    time.sleep(0.1)
+    assert b.acquire("x.com")
+    a.heartbeat()
+    assert a.lease_info("x.com")['node_id'] == "b"
+    assert "x.com" not in a._held
+
+
+def test_heartbeat_renews_own_leases(tmp_path):
+    a = _node(tmp_path, "a", lease_ttl=0.2)
+    assert a.acquire("x.com")
+    expires_at = a.lease_info("x.com")['expires_at']
+    time.sleep(0.05)
+    a.heartbeat()
+    assert a.lease_info("x.com")['expires_at'] > expires_at
+    assert a.live_nodes() == ["a"]
+
+
+def test_stop_releases_leases_and_unregisters(tmp_path):
+    a, b = _node(tmp_path, "a"), _node(tmp_path, "b")
+    a.start()
+    b.heartbeat()
+    assert sorted(b.live_nodes()) == ["a", "b"]
+    assert a.acquire("x.com")
+    a.stop()
+    assert b.live_nodes() == ["b"]
+    assert b.acquire("x.com")
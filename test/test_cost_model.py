@@ -0,0 +1,38 @@
+from wayback_tools.cost_model import estimate_domains, lpt_makespan, prepare_plan
+from wayback_tools.fake_archive import build_synthetic, synthetic_domains
+from wayback_tools.job_store import JobStore
+
+
+def test_lpt_makespan():
+    assert lpt_makespan([5, 4, 3, 3, 3], 2) == 10
+    assert lpt_makespan([10, 1, 1], 3) == 10
+    assert lpt_makespan([], 4) == 0
+
+
+def test_homepage_estimate_counts_years(archive):
+    estimate, = estimate_domains(["site0.example"], planner='homepage', base_url=archive.base_url)
+    years = {c['timestamp'][:4] for c in archive.archive.corpus.by_key["site0.example/"]}
+    assert (estimate['pages'], estimate['files']) == (1, len(years))
+    assert archive.stats['cdx'] == 1
+
+
+def test_plan_orders_largest_domains_first_and_is_reused(archive_factory, tmp_path, capsys):
+    archive = archive_factory(build_synthetic(domains=6, pages=6, body_bytes=500), page_size=5)
+    domains = synthetic_domains(6)
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    store.add_domains(domains)
+    estimates = prepare_plan(store, jobs=2, base_url=archive.base_url)
+    assert sorted(e['domain'] for e in estimates) == domains
+    assert "📐 6 个域名" in capsys.readouterr().out
+
+    seconds = {e['domain']: e['seconds'] for e in estimates}
+    claimed = [store.claim_next() for _ in domains]
+    assert [seconds[d] for d in claimed] == sorted(seconds.values(), reverse=True)
+
+    for domain in claimed:
+        store.set_state(domain, "pending")
+    requests = archive.stats['cdx']
+    assert sorted(e['seconds'] for e in prepare_plan(store, jobs=2, base_url=archive.base_url)) == \
+        sorted(seconds.values())
+    assert archive.stats['cdx'] == requests
+    store.close()
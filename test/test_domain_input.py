@@ -0,0 +1,44 @@
+import pytest
+
+from wayback_tools.domain_input import RecentSet, StoreFeeder, iter_domains
+from wayback_tools.job_store import JobStore
+
+DOMAINS = ["a.com", "b.com", "c.com"]
+
+
+def test_text_csv_and_jsonl_inputs(tmp_path):
+    (tmp_path / "list.txt").write_text(" HTTP://A.com\nb.com\n\nhttps://a.com\nc.com\n")
+    (tmp_path / "list.csv").write_text("domain,rank\na.com,1\nB.COM,2\na.com,3\nc.com,4\n")
+    (tmp_path / "list.jsonl").write_text('{"domain": "a.com"}\n"b.com"\n\n{"url": "http://c.com"}\n')
+    for name in ("list.txt", "list.csv", "list.jsonl"):
+        assert list(iter_domains(str(tmp_path / name))) == DOMAINS
+
+
+def test_xlsx_input_skips_the_header(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for value in ["url", "http://a.com", None, "b.com", "c.com", "A.com"]:
+        sheet.append([value])
+    workbook.save(tmp_path / "list.xlsx")
+    assert list(iter_domains(str(tmp_path / "list.xlsx"))) == DOMAINS
+
+
+def test_dedup_window_is_bounded():
+    recent = RecentSet(maxsize=2)
+    assert recent.add("a") and recent.add("b") and not recent.add("a")
+    assert recent.add("c")
+    # b 最久没出现，已被挤出窗口
+    assert recent.add("b")
+
+
+def test_feeder_writes_the_stream_into_the_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    feeder = StoreFeeder(store, iter(DOMAINS + ["a.com"]), batch_size=2)
+    feeder.start()
+    feeder.join(10)
+    assert feeder.error is None
+    assert (feeder.read, feeder.added) == (4, 3)
+    assert store.domains("pending") == DOMAINS
+    assert sum(store.counts().values()) == 3
+    store.close()
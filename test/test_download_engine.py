@@ -0,0 +1,59 @@
+from wayback_tools.download_engine import DownloadEngine, file_id_for, local_file_path
+from wayback_tools.fake_archive import build_synthetic
+from wayback_tools.planner import curated_file_list, plan_latest_per_year
+from wayback_tools.verify import verify_tree
+
+
+def test_paths_match_the_ruby_downloader():
+    base = "websites/a.com/"
+    assert local_file_path(base, "", "http://a.com/", "20150101000000") == ("websites/a.com/",
+                                                                           "websites/a.com/index.html")
+    assert file_id_for("http://a.com/", "2015") == "2015/"
+    assert local_file_path(base, "2015/", "http://a.com/", "20150101000000") == \
+        ("websites/a.com/2015", "websites/a.com/2015/20150101000000_index.html")
+    assert local_file_path(base, "css/site.css", "http://a.com/css/site.css", "20150101000000") == \
+        ("websites/a.com/css", "websites/a.com/css/site.css")
+    assert file_id_for("http://a.com/caf%C3%A9") == "café"
+
+
+def _homepages(archive, domain="site0.example"):
+    corpus = archive.archive.corpus
+    rows = [[c['timestamp'], c['original']] for c in corpus.by_key[f"{domain}/"]]
+    return curated_file_list(plan_latest_per_year(rows))
+
+
+def test_download_files_saves_raw_bodies_and_skips_existing(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=1, pages=1, body_bytes=2000, redirect_rate=0.5),
+                              latency=0.02)
+    file_list = _homepages(archive)
+    engine = DownloadEngine(pool_size=8, max_in_flight=3, raw=True, base_url=archive.base_url)
+    lines = []
+    stats = engine.download_files("site0.example", file_list, 8, str(tmp_path), emit=lines.append)
+    assert stats['files'] == len(file_list) and not stats['errors']
+    assert archive.stats['max_in_flight'] <= 3
+    assert archive.stats['redirects'] > 0
+
+    corpus = archive.archive.corpus
+    for info in file_list:
+        path = tmp_path / "site0.example" / info['file_id'] / f"{info['timestamp']}_index.html"
+        assert path.read_bytes() == corpus.body_of(corpus.nearest("site0.example/", info['timestamp']))
+    assert len((tmp_path / "site0.example" / "site0.example.txt").read_text().splitlines()) == len(file_list)
+    assert verify_tree(str(tmp_path), workers=1) == []
+    assert all(" -> " in line for line in lines)
+
+    requests = archive.stats['snapshots']
+    again = engine.download_files("site0.example", file_list, 8, str(tmp_path), emit=lines.append)
+    engine.close()
+    assert again['files'] == 0 and archive.stats['snapshots'] == requests
+    assert "already exists." in lines[-1]
+
+
+def test_http_errors_are_reported_per_file(archive, tmp_path):
+    engine = DownloadEngine(pool_size=2, base_url=archive.base_url)
+    file_list = [{'file_url': "http://missing.example/", 'timestamp': "20150101000000", 'file_id': "2015/"}]
+    lines = []
+    stats = engine.download_files("missing.example", file_list, 2, str(tmp_path), emit=lines.append)
+    engine.close()
+    assert stats['files'] == 0 and len(stats['errors']) == 1
+    assert "HTTP 404" in lines[0]
+    assert not list(tmp_path.rglob("*.part"))
@@ -0,0 +1,85 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from wayback_tools.fake_archive import Corpus, cdx_digest, load_recorded, url_key
+
+BODY = b"<html>\n<head>\n<title>a</title>\n</head>\n<body>\n<p>a</p>\n</body>\n</html>\n"
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _get(archive, path, follow=True):
+    opener = urllib.request.build_opener() if follow else urllib.request.build_opener(_NoRedirect)
+    try:
+        with opener.open(archive.base_url + path) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def _corpus():
+    corpus = Corpus()
+    for year in (2015, 2016, 2017):
+        corpus.add("http://a.com/", f"{year}0101000000", BODY)
+    corpus.add("http://a.com/about.html", "20150101000000", b"about")
+    corpus.add("http://www.a.com:80/", "20180101000000", BODY, moved=True)
+    corpus.finish()
+    return corpus
+
+
+def test_url_key_ignores_scheme_www_port_and_trailing_slash():
+    assert url_key("https://WWW.a.com:80/") == url_key("a.com") == "a.com/"
+    assert url_key("http://a.com/x/") == "a.com/x"
+
+
+def test_cdx_filters_collapses_and_pages(archive_factory):
+    archive = archive_factory(_corpus(), page_size=2)
+    status, _headers, body = _get(archive, "/cdx/search/xd?url=a.com/*&output=json&fl=timestamp,original,digest"
+                                           "&from=2016&showNumPages=true")
+    assert (status, body) == (200, b"2\n")
+    _status, _headers, body = _get(archive, "/cdx/search/xd?url=a.com&output=json&fl=timestamp,digest"
+                                            "&collapse=digest")
+    rows = json.loads(body)
+    assert rows == [["timestamp", "digest"], ["20150101000000", cdx_digest(BODY)]]
+    _status, _headers, body = _get(archive, "/cdx/search/xd?url=a.com/*&output=json&page=1")
+    # 与 CDX 相同按 (url key, timestamp) 排序
+    assert json.loads(body)[1:] == [["20170101000000", "http://a.com/"], ["20180101000000", "http://www.a.com:80/"]]
+
+
+def test_snapshots_are_rewritten_unless_raw_and_redirect_to_the_nearest(archive_factory):
+    archive = archive_factory(_corpus())
+    _status, _headers, raw = _get(archive, "/web/20150101000000id_/http://a.com/")
+    assert raw == BODY
+    _status, _headers, page = _get(archive, "/web/20150101000000/http://a.com/")
+    assert b"End Wayback Rewrite JS Include" in page and b"FILE ARCHIVED ON" in page
+
+    status, headers, _body = _get(archive, "/web/2016/http://a.com/", follow=False)
+    assert status == 302 and headers['Location'] == "/web/20160101000000/http://a.com/"
+    status, headers, _body = _get(archive, "/web/20180101000000id_/http://www.a.com:80/", follow=False)
+    assert status == 302 and headers['Location'] == "/web/20180101000001id_/http://www.a.com:80/"
+    assert _get(archive, "/web/2015/http://b.com/")[0] == 404
+    assert archive.stats['redirects'] == 2 and archive.stats['not_found'] == 1
+
+
+@pytest.mark.parametrize("kwargs, status, counter", [({'throttle_rate': 1.0}, 429, 'throttled'),
+                                                     ({'error_rate': 1.0}, 503, 'errors')])
+def test_injected_failures(archive_factory, kwargs, status, counter):
+    archive = archive_factory(_corpus(), **kwargs)
+    assert _get(archive, "/web/20150101000000id_/http://a.com/")[0] == status
+    assert archive.stats[counter] == 1
+    assert _get(archive, "/stats")[0] == 200
+
+
+def test_load_recorded_serves_downloaded_homepages(tmp_path):
+    (tmp_path / "a.com" / "2015").mkdir(parents=True)
+    (tmp_path / "a.com" / "2015" / "20150101000000_index.html").write_bytes(BODY)
+    (tmp_path / "a.com" / "a.com.txt").write_text("")
+    corpus = load_recorded(str(tmp_path))
+    capture, = corpus.by_key["a.com/"]
+    assert capture['timestamp'] == "20150101000000" and corpus.body_of(capture) == BODY
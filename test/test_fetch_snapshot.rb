@@ -0,0 +1,62 @@
+require 'minitest/autorun'
+require 'socket'
+require 'stringio'
+require 'wayback_machine_downloader'
+
+# fetch_snapshot against a tiny local server that answers one request per
+# connection with "Connection: close" and then waits for the client to hang
+# up. A client that does not finish the transport would send its next request
+# on that dead connection and never get an answer.
+class FetchSnapshotTest < Minitest::Test
+
+  def setup
+    @server = TCPServer.new('127.0.0.1', 0)
+    @paths = []
+    @thread = Thread.new do
+      loop do
+        Thread.new(@server.accept) do |client|
+          request_line = client.gets
+          @paths << request_line.split(' ')[1]
+          while (line = client.gets) and line != "\r\n"; end
+          client.write(response_for(@paths.last))
+          client.read
+          client.close
+        end
+      end
+    end
+    @downloader = WaybackMachineDownloader.new(base_url: 'http://example.com')
+  end
+
+  def teardown
+    @thread.kill
+    @server.close
+  end
+
+  def response_for path
+    if path.start_with?('/moved')
+      "HTTP/1.1 302 Found\r\nLocation: /web/20150101000000/http://example.com/\r\n" \
+        "Content-Length: 0\r\nConnection: close\r\n\r\n"
+    else
+      body = "snapshot #{path}"
+      "HTTP/1.1 200 OK\r\nContent-Length: #{body.bytesize}\r\nConnection: close\r\n\r\n#{body}"
+    end
+  end
+
+  def fetch http, path
+    file = StringIO.new
+    @downloader.send(:fetch_snapshot, http, URI("http://127.0.0.1:#{@server.addr[1]}#{path}"), file)
+    file.string
+  end
+
+  def test_follows_redirect_and_reuses_the_connection
+    http = Net::HTTP.new('127.0.0.1', @server.addr[1])
+    http.read_timeout = 2
+    http.max_retries = 0
+    http.start
+    assert_equal "snapshot /web/20150101000000/http://example.com/", fetch(http, '/moved')
+    assert_equal "snapshot /next", fetch(http, '/next')
+    assert_equal ['/moved', '/web/20150101000000/http://example.com/', '/next'], @paths
+  ensure
+    http.finish if http and http.started?
+  end
+end
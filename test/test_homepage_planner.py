@@ -0,0 +1,24 @@
+from wayback_tools.cdx_client import list_snapshots
+from wayback_tools.planner import HOMEPAGE_COLLAPSE, is_homepage, list_homepage_rows, plan_latest_per_year
+
+
+def test_is_homepage_matches_the_ruby_check():
+    assert is_homepage("http://a.com/") and is_homepage("http://www.a.com:80/") and is_homepage("http://a.com")
+    assert not is_homepage("http://a.com/about.html") and not is_homepage("a.com")
+
+
+def test_homepage_rows_cost_one_request_and_pick_the_same_years(archive):
+    rows = list_homepage_rows("site0.example", base_url=archive.base_url)
+    assert archive.stats['cdx'] == 1
+    assert HOMEPAGE_COLLAPSE == "timestamp:6"
+    months = [timestamp[:6] for timestamp, _original in rows]
+    assert len(months) == len(set(months))
+
+    homepage = plan_latest_per_year(rows)
+    full = plan_latest_per_year(list_snapshots("site0.example", base_url=archive.base_url, from_timestamp=2009,
+                                               collapse=None))
+    assert [e['year'] for e in homepage] == [e['year'] for e in full]
+    for picked, latest in zip(homepage, full):
+        # 按月折叠后取到的是最后一个月的第一个快照
+        assert picked['timestamp'][:6] == latest['timestamp'][:6]
+        assert picked['timestamp'] <= latest['timestamp']
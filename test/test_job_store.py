@@ -0,0 +1,83 @@
+import os
+
+import pandas as pd
+
+import wayback_main
+from wayback_tools.job_store import DONE, FAILED, LISTING, PENDING, JobStore, measure_dir
+
+
+def _store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def test_claim_order_and_reset_stale(tmp_path):
+    store = _store(tmp_path)
+    assert store.add_domains(["a.com", "b.com", "c.com"]) == 3
+    assert store.add_domains(["a.com"]) == 0
+    store.set_state("c.com", PENDING, priority=5)
+
+    assert store.claim_next() == "c.com"
+    assert store.claim_next() == "a.com"
+    assert store.state_of("a.com") == LISTING
+    assert store.reset_stale() == 2
+    assert store.counts()[PENDING] == 3
+    store.close()
+
+
+def test_requeue_or_fail_backs_off_then_fails(tmp_path):
+    store = _store(tmp_path)
+    store.add_domains(["a.com"])
+    assert store.claim_next() == "a.com"
+    assert store.requeue_or_fail("a.com", "429", lambda attempt: 3600, max_attempts=2)
+    assert store.claim_next() is None  # 还在退避中
+
+    store.set_state("a.com", PENDING, next_attempt_at=0)
+    assert store.claim_next() == "a.com"
+    assert not store.requeue_or_fail("a.com", "429", lambda attempt: 0, max_attempts=2)
+    assert store.state_of("a.com") == FAILED
+    assert store.failures()[0]['URL'] == "a.com"
+    store.close()
+
+
+def test_continue_capped_runs_after_normal_domains(tmp_path):
+    store = _store(tmp_path)
+    store.add_domains(["big.com", "small.com"])
+    store.claim_next()
+    store.mark_capped("big.com", "文件数达到上限 3", files=3)
+    assert store.continue_capped() == 1
+    assert [store.claim_next(), store.claim_next()] == ["small.com", "big.com"]
+    store.close()
+
+
+def test_measure_dir_skips_sidecar_files(tmp_path):
+    domain_dir = tmp_path / "websites" / "a.com"
+    (domain_dir / "2015").mkdir(parents=True)
+    (domain_dir / "2015" / "20150101000000_index.html").write_bytes(b"x" * 10)
+    (domain_dir / "2016").mkdir()
+    (domain_dir / "2016" / "20160101000000_index.html").write_bytes(b"y" * 20)
+    (domain_dir / "a.com.txt").write_text("https://web.archive.org/web/20150101000000/http://a.com/\n")
+    (domain_dir / ".manifest.jsonl").write_text('{"path": "2015/20150101000000_index.html"}\n')
+    (domain_dir / "2016" / "20170101000000_index.html.part").write_bytes(b"z" * 5)
+    assert measure_dir(str(domain_dir)) == (2, 30)
+
+    store = _store(tmp_path)
+    store.add_domains(["a.com"])
+    assert store.mark_existing_done(str(tmp_path / "websites")) == 1
+    assert store.state_of("a.com") == DONE
+    store.close()
+
+
+def test_export_failed_keeps_failed_urls_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history = "Time,URL,Error\n2025-05-23 22:39:33,old.com,exit status 1\n"
+    (tmp_path / "failed_urls.csv").write_text(history, encoding='utf-8')
+    store = _store(tmp_path)
+    store.add_domains(["a.com"])
+    store.mark_failed("a.com", "HTTP 503")
+
+    wayback_main.export_failed(store)
+    assert (tmp_path / "failed_urls.csv").read_text(encoding='utf-8') == history
+    exported = pd.read_csv(os.path.join(tmp_path, "failed_jobs.csv"), encoding='utf-8-sig')
+    assert list(exported["URL"]) == ["a.com"]
+    assert list(exported["Error"]) == ["HTTP 503"]
+    store.close()
@@ -0,0 +1,57 @@
+import json
+
+from wayback_tools.metrics import MetricsWriter, ThroughputMetrics, parse_line
+
+
+def test_parse_each_kind_of_downloader_line():
+    assert parse_line("http://a.com/ -> websites/a.com/2015/index.html (3/10)\n") == \
+        {'done': 3, 'total': 10, 'path': "websites/a.com/2015/index.html"}
+    assert parse_line("http://a.com/ # websites/a.com/index.html already exists. (4/10)") == \
+        {'done': 4, 'total': 10, 'existing': True}
+    assert parse_line("http://a.com/x # HTTP 503") == {'error': "HTTP 503"}
+    assert parse_line("Download completed in 12.5s, saved in websites/a.com/ (7 files)") == \
+        {'completed_seconds': 12.5, 'total': 7}
+    assert parse_line("Getting snapshot pages.. found 5 snaphots to consider.") is None
+
+
+def test_metrics_count_saved_files_and_errors(tmp_path):
+    saved = tmp_path / "index.html"
+    saved.write_bytes(b"x" * 100)
+    metrics = ThroughputMetrics()
+    metrics.start_domain("a.com")
+    metrics.observe_line("a.com", f"http://a.com/ -> {saved} (1/4)")
+    metrics.observe_line("a.com", "http://a.com/x # HTTP 503")
+    metrics.observe_line("a.com", f"http://a.com/y # {saved} already exists. (2/4)")
+    metrics.start_domain("b.com")
+    metrics.add_files("b.com", 3, 300)
+
+    snapshot = metrics.snapshot()
+    assert (snapshot['files'], snapshot['bytes'], snapshot['errors']) == (4, 400, 1)
+    assert snapshot['error_rate'] == 0.2
+    in_flight = {p['domain']: p for p in snapshot['domains_in_flight']}
+    assert (in_flight["a.com"]['done'], in_flight["a.com"]['total']) == (2, 4)
+    assert in_flight["a.com"]['eta_s'] is not None
+
+    metrics.finish_domain("a.com")
+    metrics.finish_domain("b.com", ok=False)
+    snapshot = metrics.snapshot()
+    assert (snapshot['domains_done'], snapshot['domains_failed'], snapshot['domains_in_flight']) == (1, 1, [])
+
+
+def test_writer_replaces_the_metrics_file(tmp_path):
+    metrics = ThroughputMetrics()
+    metrics.add_gauge('concurrency', lambda: {'window': 8})
+    writer = MetricsWriter(metrics, str(tmp_path / "metrics.json"), interval=60, echo=False)
+    writer.start()
+    writer.stop()
+    written = json.loads((tmp_path / "metrics.json").read_text(encoding='utf-8'))
+    assert written['concurrency'] == {'window': 8}
+    assert not (tmp_path / "metrics.json.tmp").exists()
+
+
+def test_stop_reports_write_errors_instead_of_raising(tmp_path, capsys):
+    writer = MetricsWriter(ThroughputMetrics(), str(tmp_path / "missing" / "metrics.json"), interval=60,
+                           echo=False)
+    writer.start()
+    writer.stop()
+    assert "写入指标文件失败" in capsys.readouterr().out
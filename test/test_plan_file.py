@@ -0,0 +1,65 @@
+import json
+
+import wayback_main
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.job_store import DONE, PENDING, JobStore
+from wayback_tools.plan_file import PlanFeeder, iter_plan, parse_snapshot_url
+from wayback_tools.verify import verify_tree
+
+
+def test_parse_snapshot_url():
+    assert parse_snapshot_url("https://web.archive.org/web/20150101000000/http://a.com/") == \
+        ("20150101000000", "http://a.com/")
+    assert parse_snapshot_url("/web/20150101000000id_/http://a.com/x?y=1") == ("20150101000000", "http://a.com/x?y=1")
+    assert parse_snapshot_url("http://a.com/") is None
+
+
+def test_csv_and_jsonl_plans(tmp_path, capsys):
+    (tmp_path / "plan.csv").write_text(
+        "domain,year,url\n"
+        "A.com,2015,https://web.archive.org/web/20150101000000/http://a.com/\n"
+        "b.com,2016,not a snapshot\n")
+    (tmp_path / "plan.jsonl").write_text(
+        json.dumps({'url': "https://web.archive.org/web/20150101000000/http://a.com/"}) + "\n"
+        + json.dumps({'domain': "b.com", 'timestamp': 20160101000000, 'original': "http://b.com/"}) + "\n"
+        + json.dumps({'timestamp': "20160101000000", 'original': "c.com/"}) + "\n"
+        + json.dumps({'url': "https://web.archive.org/web/20160101000000/c.com/about.html"}) + "\n"
+        + json.dumps({'domain': "c.com", 'timestamp': "20170101000000", 'original': "c.com/"}) + "\n"
+        + "garbage\n")
+    assert list(iter_plan(str(tmp_path / "plan.csv"))) == [
+        {'domain': "a.com", 'year': "2015", 'timestamp': "20150101000000", 'url': "http://a.com/"}]
+    # 没有协议头也没有 domain 列的行无法确定域名，与其他无法解析的行一样跳过
+    assert [(e['domain'], e['year']) for e in iter_plan(str(tmp_path / "plan.jsonl"))] == [("a.com", "2015"),
+                                                                                           ("b.com", "2016"),
+                                                                                           ("c.com", "2017")]
+    output = capsys.readouterr().out
+    assert output.count("无法解析") == 2 and "3 行无法解析" in output
+
+
+def test_planned_download_skips_cdx(archive, tmp_path):
+    corpus = archive.archive.corpus
+    captures = corpus.by_key["site0.example/"][:3]
+    plan = tmp_path / "plan.jsonl"
+    plan.write_text("".join(json.dumps({'domain': "site0.example", 'timestamp': c['timestamp'],
+                                        'original': c['original']}) + "\n" for c in captures))
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    feeder = PlanFeeder(store, iter_plan(str(plan)))
+    feeder.run()
+    assert feeder.added == 3 and store.state_of("site0.example") == PENDING
+
+    engine = DownloadEngine(pool_size=4, raw=True, base_url=archive.base_url)
+    base_dir = str(tmp_path / "websites")
+    assert wayback_main.download_one_python("site0.example", 4, store, base_dir=base_dir, engine=engine,
+                                            planned=True)
+    engine.close()
+    assert archive.stats['cdx'] == 0 and archive.stats['snapshots'] >= 3
+    assert store.state_of("site0.example") == DONE
+    assert verify_tree(base_dir, workers=1) == []
+
+    # 已在计划中的行被忽略；有新快照的已完成域名重新排队
+    assert store.add_plan(iter_plan(str(plan))) == 0 and store.state_of("site0.example") == DONE
+    extra = corpus.by_key["site0.example/"][3]
+    assert store.add_plan([{'domain': "site0.example", 'year': extra['timestamp'][:4],
+                            'timestamp': extra['timestamp'], 'url': extra['original']}]) == 1
+    assert store.state_of("site0.example") == PENDING
+    store.close()
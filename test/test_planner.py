@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.fake_archive import Corpus
+from wayback_tools.planner import download_domain_deduped, plan_latest_per_year
+from wayback_tools.snapshot_store import ContentStore
+from wayback_tools.verify import verify_tree
+from wayback_tools.warc_shards import CorpusReader, ShardWriter
+
+
+def test_plan_keeps_latest_homepage_per_year():
+    rows = [["20150101000000", "http://a.com/", "A"],
+            ["20151201000000", "http://www.a.com:80/", "B"],
+            ["20151231000000", "http://a.com/about.html", "C"],
+            ["20160101000000", "http://a.com/", "A"]]
+    assert [(e['year'], e['timestamp'], e['digest']) for e in plan_latest_per_year(rows)] == \
+        [("2015", "20151201000000", "B"), ("2016", "20160101000000", "A")]
+
+
+def test_concurrent_puts_of_the_same_digest(tmp_path):
+    store = ContentStore(str(tmp_path / "store"))
+    barrier = threading.Barrier(2, timeout=10)
+    body = [b"<html>", b"x" * 100000, b"</html>"]
+
+    def chunks():
+        # 两个线程都写到一半时再继续，模拟两个域名同时下载同一 digest
+        yield body[0]
+        barrier.wait()
+        yield from body[1:]
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        sizes = list(pool.map(lambda _: store.put_chunks("ABCDEF", chunks()), range(2)))
+    assert sizes == [len(b"".join(body))] * 2
+    with open(store.path_for("ABCDEF"), 'rb') as f:
+        assert f.read() == b"".join(body)
+    assert os.listdir(os.path.dirname(store.path_for("ABCDEF"))) == ["ABCDEF"]
+
+
+def _corpus():
+    """五年的主页在两种内容之间交替（相邻相同的会被 collapse=digest 折叠）"""
+    corpus = Corpus()
+    for year in range(2015, 2020):
+        body = b"<html><head>\n</head><body>\n<p>%d</p>\n</body></html>\n" % (year % 2)
+        corpus.add("http://site0.example/", f"{year}0601000000", body)
+    corpus.finish()
+    return corpus
+
+
+def _run(archive, tmp_path, **kwargs):
+    engine = DownloadEngine(pool_size=4, base_url=archive.base_url)
+    try:
+        return download_domain_deduped("site0.example", 4, base_dir=str(tmp_path / "websites"),
+                                       base_url=archive.base_url, engine=engine, **kwargs)
+    finally:
+        engine.close()
+
+
+def test_each_digest_is_fetched_once_and_hard_linked(archive_factory, tmp_path):
+    archive = archive_factory(_corpus())
+    store = ContentStore(str(tmp_path / "store"))
+    stats = _run(archive, tmp_path, content_store=store)
+    assert (stats['files'], stats['linked'], stats['fetched']) == (5, 5, 2)
+
+    domain_dir = tmp_path / "websites" / "site0.example"
+    paths = sorted(domain_dir.glob("*/*_index.html"))
+    assert len(paths) == stats['files']
+    assert len({os.stat(p).st_ino for p in paths}) == stats['fetched']
+    corpus = archive.archive.corpus
+    for path in paths:
+        capture = corpus.nearest("site0.example/", path.name[:14])
+        assert path.read_bytes() == corpus.body_of(capture)
+    assert verify_tree(str(tmp_path / "websites"), workers=1) == []
+
+    again = _run(archive, tmp_path, content_store=store)
+    assert (again['fetched'], again['linked']) == (0, 0)
+
+
+def test_shard_writer_stores_each_digest_once(archive_factory, tmp_path):
+    archive = archive_factory(_corpus())
+    writer = ShardWriter(str(tmp_path / "corpus"))
+    stats = _run(archive, tmp_path, shard_writer=writer)
+    writer.close()
+    entries = CorpusReader(str(tmp_path / "corpus")).entries("site0.example")
+    assert len(entries) == stats['files']
+    assert len({(e.shard, e.offset) for e in entries}) == stats['fetched']
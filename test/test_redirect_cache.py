@@ -0,0 +1,45 @@
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.fake_archive import build_synthetic
+from wayback_tools.redirect_cache import RedirectCache
+
+
+def test_resolve_record_and_forget(tmp_path):
+    cache = RedirectCache(str(tmp_path / "redirects.sqlite"))
+    cache.record("http://x/a", "http://x/a", 1)
+    cache.record("http://x/b", "http://x/c", 0)
+    assert cache.resolve("http://x/a") == "http://x/a"
+    cache.record("http://x/a", "http://x/final", 2)
+    assert cache.resolve("http://x/a") == "http://x/final"
+    cache.forget("http://x/a")
+    assert cache.resolve("http://x/a") == "http://x/a"
+    assert cache.snapshot() == {'hits': 1, 'misses': 2, 'hit_rate': 0.3333, 'saved_round_trips': 2, 'recorded': 1}
+    cache.close()
+
+
+def _file_list(archive):
+    return [{'file_url': c['original'], 'timestamp': c['timestamp'], 'file_id': f"{i}.html"}
+            for i, c in enumerate(archive.archive.corpus.by_host["site0.example"])]
+
+
+def test_rerun_skips_the_redirect_round_trips(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=1, pages=2, body_bytes=500, redirect_rate=1.0))
+    file_list = _file_list(archive)
+
+    def run(base_dir):
+        cache = RedirectCache(str(tmp_path / "redirects.sqlite"))
+        engine = DownloadEngine(pool_size=4, base_url=archive.base_url, redirect_cache=cache)
+        stats = engine.download_files("site0.example", file_list, 4, str(tmp_path / base_dir),
+                                      emit=lambda line: None)
+        engine.close()
+        cache.close()
+        return stats, cache.snapshot()
+
+    stats, first = run("first")
+    assert stats['files'] == len(file_list) and first['recorded'] == len(file_list)
+    redirects = archive.stats['redirects']
+    assert redirects == len(file_list)
+
+    stats, second = run("second")
+    assert stats['files'] == len(file_list)
+    assert second['hits'] == len(file_list) and second['saved_round_trips'] == len(file_list)
+    assert archive.stats['redirects'] == redirects
@@ -0,0 +1,55 @@
+import time
+
+import requests
+
+from wayback_tools.retry import (FATAL, RETRYABLE, FailureTally, TokenBucket, backoff_delay, classify_exception,
+                                 classify_line, retry_after_seconds)
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def test_classify_exceptions_and_ruby_lines():
+    assert classify_exception(_http_error(429)) == RETRYABLE
+    assert classify_exception(_http_error(503)) == RETRYABLE
+    assert classify_exception(_http_error(404)) == FATAL
+    assert classify_exception(requests.ConnectionError()) == RETRYABLE
+    assert classify_exception(ValueError()) == FATAL
+
+    assert classify_line("http://a.com/ # HTTP 429 Too Many Requests") == RETRYABLE
+    assert classify_line("http://a.com/ # Net::ReadTimeout") == RETRYABLE
+    assert classify_line("http://a.com/ # HTTP 404") == FATAL
+    assert classify_line("http://a.com/ -> websites/a.com/index.html (1/2)") is None
+
+
+def test_tally_counts_throttling_separately():
+    tally = FailureTally()
+    for line in ["u # HTTP 429", "u # HTTP 503", "u # HTTP 404", "u -> p (1/3)"]:
+        tally.observe_line(line)
+    tally.observe_exception(_http_error(429))
+    assert (tally.retryable, tally.throttled, tally.fatal) == (3, 2, 1)
+    assert "HTTPError" in tally.last_retryable
+
+
+def test_backoff_grows_with_jitter_and_cap():
+    for attempt, full in [(1, 2.0), (3, 8.0), (20, 600.0)]:
+        assert full / 2 <= backoff_delay(attempt) <= full
+    assert retry_after_seconds({'Retry-After': '7'}) == 7.0
+    assert retry_after_seconds({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) is None
+
+
+def test_token_bucket_limits_rate_and_pauses():
+    bucket = TokenBucket(rate=50, burst=5)
+    started = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # 5 个突发之后剩下 10 个按每秒 50 个发放
+    assert time.monotonic() - started >= 0.15
+
+    bucket.pause(0.1)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.1
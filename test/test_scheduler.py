@@ -0,0 +1,65 @@
+import threading
+import time
+
+from wayback_tools.scheduler import ConnectionBudget, DomainScheduler
+
+
+def test_budget_grants_at_most_what_is_left():
+    budget = ConnectionBudget(10, per_domain_max=6)
+    assert budget.acquire(20) == 6
+    assert budget.acquire(6) == 4
+    assert budget.in_use == 10
+    budget.release(6)
+    assert budget.acquire(3) == 3
+    budget.resize(4)
+    assert budget.available == -3
+    budget.release(4)
+    budget.release(3)
+    assert (budget.total, budget.available) == (4, 4)
+
+
+def test_scheduler_keeps_jobs_domains_in_flight_and_shares_connections():
+    scheduler = DomainScheduler(jobs=3, connections=12)
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'peak': 0, 'connections': 0, 'peak_connections': 0}
+    done = {}
+
+    def worker(domain, connections):
+        with lock:
+            state['in_flight'] += 1
+            state['connections'] += connections
+            state['peak'] = max(state['peak'], state['in_flight'])
+            state['peak_connections'] = max(state['peak_connections'], state['connections'])
+        time.sleep(0.02)
+        with lock:
+            state['in_flight'] -= 1
+            state['connections'] -= connections
+        if domain == "bad.com":
+            raise RuntimeError("boom")
+        return connections
+
+    def on_done(domain, result, error):
+        done[domain] = (result, error)
+
+    domains = [f"d{i}.com" for i in range(9)] + ["bad.com"]
+    scheduler.run(iter(domains), worker, on_done)
+    assert set(done) == set(domains)
+    assert state['peak'] == 3 and state['peak_connections'] <= 12
+    # 队列未取完时按 jobs 均分
+    assert [done[f"d{i}.com"][0] for i in range(3)] == [4, 4, 4]
+    assert isinstance(done["bad.com"][1], RuntimeError)
+    assert scheduler.budget.available == 12
+
+
+def test_errors_in_on_done_are_reported(capsys):
+    done = []
+
+    def on_done(domain, result, error):
+        if domain == "b.com":
+            raise RuntimeError("store is locked")
+        done.append(domain)
+
+    DomainScheduler(jobs=2, connections=4).run(iter(["a.com", "b.com", "c.com"]), lambda d, c: c, on_done)
+    assert sorted(done) == ["a.com", "c.com"]
+    out = capsys.readouterr().out
+    assert "b.com" in out and "RuntimeError: store is locked" in out
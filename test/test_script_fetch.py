@@ -0,0 +1,60 @@
+from wayback_tools.fake_archive import build_synthetic, cdx_digest
+from wayback_tools.planner import plan_latest_per_year
+from wayback_tools.script_fetch import fetch_scripts, is_third_party, nearest_capture, script_urls
+from wayback_tools.snapshot_store import ContentStore
+
+
+def test_script_urls_drop_wayback_prefix_and_toolbar():
+    html = (b'<script src="/_static/js/bundle-playback.js"></script>'
+            b'<script src="https://web.archive.org/web/20150101000000js_/http://cdn.x.com/a.js"></script>'
+            b"<script type='text/javascript' src='/js/site.js#v1'></script>"
+            b'<SCRIPT async src=//cdn.x.com/a.js></SCRIPT><script>inline()</script>')
+    assert script_urls(html, "http://a.com/") == ["http://cdn.x.com/a.js", "http://a.com/js/site.js"]
+    assert is_third_party("http://cdn.x.com/a.js", "a.com")
+    assert not is_third_party("http://static.a.com/a.js", "www.a.com")
+    assert not is_third_party("http://web-static.archive.org/a.js", "a.com")
+
+
+def test_nearest_capture_prefers_the_version_live_at_the_time():
+    captures = [("2015", "A"), ("2017", "B")]
+    assert nearest_capture(captures, "2016") == ("2015", "A")
+    assert nearest_capture(captures, "2014") == ("2015", "A")
+    assert nearest_capture([], "2016") is None
+
+
+def _write_homepages(archive, base):
+    corpus = archive.archive.corpus
+    pages = 0
+    for host in ("site0.example", "site1.example", "site2.example"):
+        rows = [[c['timestamp'], c['original']] for c in corpus.by_key[f"{host}/"]]
+        for entry in plan_latest_per_year(rows):
+            capture = corpus.nearest(f"{host}/", entry['timestamp'])
+            path = base / host / entry['year'] / f"{entry['timestamp']}_index.html"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(corpus.body_of(capture))
+            pages += 1
+    return pages
+
+
+def test_each_script_version_is_fetched_once(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=3, pages=1, body_bytes=2000))
+    pages = _write_homepages(archive, tmp_path / "websites")
+    root = str(tmp_path / "script_store")
+    stats = fetch_scripts(str(tmp_path / "websites"), root, base_url=archive.base_url)
+    assert stats['scanned'] == pages and stats['unresolved'] == 0 and stats['errors'] == 0
+    assert stats['refs'] > stats['digests'] == stats['fetched'] > 0
+    assert archive.stats['snapshots'] == stats['fetched']
+
+    content_store = ContentStore(root)
+    corpus = archive.archive.corpus
+    scripts = {c['digest'] for captures in corpus.by_key.values() for c in captures
+               if c['mimetype'] == "application/javascript"}
+    fetched = [digest for digest in scripts if content_store.has(digest)]
+    assert len(fetched) == stats['fetched']
+    for digest in fetched:
+        with open(content_store.path_for(digest), 'rb') as f:
+            assert cdx_digest(f.read()) == digest
+
+    again = fetch_scripts(str(tmp_path / "websites"), root, base_url=archive.base_url)
+    assert (again['scanned'], again['listed'], again['fetched']) == (0, 0, 0)
+    assert again['reused'] == stats['digests']
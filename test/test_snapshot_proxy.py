@@ -0,0 +1,124 @@
+import json
+import urllib.error
+import urllib.request
+
+from conftest import ArchiveServer
+from wayback_tools import snapshot_proxy
+from wayback_tools.cdx_client import list_snapshots
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.fake_archive import build_synthetic
+from wayback_tools.snapshot_proxy import SnapshotCache, SnapshotProxy
+from wayback_tools.verify import snapshot_files
+
+
+class _ProxyApp:
+    """在服务器线程中创建缓存（SQLite 连接不能跨线程使用）"""
+
+    def __init__(self, cache_dir, upstream):
+        self.cache_dir = cache_dir
+        self.upstream = upstream
+
+    def app(self):
+        return SnapshotProxy(SnapshotCache(self.cache_dir), self.upstream).app()
+
+
+def _proxy(archive, tmp_path):
+    return ArchiveServer(_ProxyApp(str(tmp_path / "cache"), archive.base_url)).start()
+
+
+def _stats(server):
+    with urllib.request.urlopen(server.base_url + "/proxy-stats") as resp:
+        return json.load(resp)
+
+
+def _download(server, archive, base_dir):
+    corpus = archive.archive.corpus
+    file_list = [{'file_url': c['original'], 'timestamp': c['timestamp'], 'file_id': f"{i}.html"}
+                 for i, c in enumerate(corpus.by_host["site0.example"])]
+    engine = DownloadEngine(pool_size=4, base_url=server.base_url)
+    stats = engine.download_files("site0.example", file_list, 4, str(base_dir), emit=lambda line: None)
+    engine.close()
+    return len(file_list), stats
+
+
+def test_second_run_is_served_from_the_cache(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=1, pages=2, body_bytes=2000, redirect_rate=0.5))
+    proxy = _proxy(archive, tmp_path)
+    try:
+        files, first = _download(proxy, archive, tmp_path / "first")
+        assert first['files'] == files and not first['errors']
+        upstream = dict(archive.stats)
+        assert upstream['redirects'] > 0
+
+        _files, second = _download(proxy, archive, tmp_path / "second")
+        assert second['files'] == files
+        assert (archive.stats['snapshots'], archive.stats['redirects']) == (upstream['snapshots'],
+                                                                            upstream['redirects'])
+        stats = _stats(proxy)
+        assert stats['hits'] == stats['misses'] == files + upstream['redirects']
+        assert stats['bytes_from_cache'] == stats['bytes_from_upstream'] == first['bytes']
+        saved = list(snapshot_files(str(tmp_path / "first" / "site0.example")))
+        assert len(saved) == files
+        for path in saved:
+            assert (tmp_path / "first" / "site0.example" / path).read_bytes() == \
+                (tmp_path / "second" / "site0.example" / path).read_bytes()
+
+        # CDX 查询原样转发，不缓存
+        rows = list_snapshots("site0.example", exact_url=True, base_url=proxy.base_url, collapse=None)
+        assert rows and _stats(proxy)['passthrough'] == 1
+    finally:
+        proxy.stop()
+
+
+def test_throttled_responses_pass_through_uncached(archive_factory, tmp_path):
+    archive = archive_factory(build_synthetic(domains=1, pages=1, body_bytes=500), throttle_rate=1.0)
+    proxy = _proxy(archive, tmp_path)
+    capture = archive.archive.corpus.by_key["site0.example/"][0]
+    url = f"{proxy.base_url}/web/{capture['timestamp']}id_/{capture['original']}"
+    try:
+        for _ in range(2):
+            try:
+                urllib.request.urlopen(url)
+                raise AssertionError("应返回 429")
+            except urllib.error.HTTPError as e:
+                assert e.code == 429 and e.headers['Retry-After'] == "1"
+        stats = _stats(proxy)
+        assert (stats['hits'], stats['misses'], stats['entries']) == (0, 2, 0)
+        assert archive.stats['throttled'] == 2
+    finally:
+        proxy.stop()
+
+
+def _commit(cache, i, size=100):
+    key = cache.make_key(f"/web/2015010100000{i}/http://a.com/")
+    tmp = cache.tmp_path(key)
+    with open(tmp, 'wb') as f:
+        f.write(b"x" * size)
+    cache.commit(key, f"/web/{i}", tmp, "text/html")
+    return key
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = SnapshotCache(str(tmp_path), max_bytes=250)
+    keys = [_commit(cache, 0), _commit(cache, 1)]
+    cache.get(keys[0])
+    keys.append(_commit(cache, 2))
+    assert cache.get(keys[0]) and cache.get(keys[2]) and cache.get(keys[1]) is None
+    assert cache.snapshot() == {'entries': 2, 'bytes': 200, 'evictions': 1}
+    assert cache.tmp_path(keys[0]) != cache.tmp_path(keys[0])
+    cache.close()
+
+
+def test_proxies_sharing_a_cache_dir_evict_by_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_proxy, 'TOTAL_REFRESH_SECONDS', 0)
+    first = SnapshotCache(str(tmp_path), max_bytes=250)
+    second = SnapshotCache(str(tmp_path), max_bytes=250)
+    keys = [_commit(first, 0), _commit(first, 1)]
+    # 第二个代理看到的总大小包含第一个写入的 200 字节
+    keys.append(_commit(second, 2))
+    assert second.evictions == 1 and first.get(keys[0]) is None
+    keys.append(_commit(first, 3))
+    assert first.evictions == 1 and second.get(keys[1]) is None
+    assert first.snapshot()['bytes'] == second.snapshot()['bytes'] == 200
+    first.close()
+    second.close()
@@ -0,0 +1,88 @@
+import io
+import json
+import urllib.request
+
+from wayback_tools.toolbar_strip import strip_file, strip_lines, strip_tree
+from wayback_tools.verify import MANIFEST_NAME, append_manifest, hash_file, read_manifest
+
+
+def _strip(data):
+    return b''.join(strip_lines(io.BytesIO(data)))
+
+
+def _fetch(archive, path):
+    with urllib.request.urlopen(archive.base_url + path) as resp:
+        return resp.read()
+
+
+def test_stripped_page_matches_raw_capture(archive):
+    capture = archive.archive.corpus.by_key["site0.example/"][0]
+    raw = _fetch(archive, f"/web/{capture['timestamp']}id_/{capture['original']}")
+    rewritten = _fetch(archive, f"/web/{capture['timestamp']}/{capture['original']}")
+    assert b'End Wayback Rewrite JS Include' in rewritten and b'WAYBACK TOOLBAR' in rewritten
+    assert _strip(rewritten) == raw
+    assert _strip(raw) == raw
+
+
+def test_rewritten_site_script_without_marker_is_kept():
+    page = (b'<html><head><title>T</title>\n'
+            b'<script src="/web/2015js_/http://site.com/_static/js/theme.js"></script>\n'
+            b'</head>\n<body>\n<p>content</p>\n</body>\n</html>\n')
+    assert _strip(page) == page.replace(b'/web/2015js_/', b'')
+
+
+def test_raw_page_with_static_js_is_untouched():
+    page = (b'<html><head>\n<script type="text/javascript" src="/_static/js/theme.js"></script>\n'
+            b'</head>\n<body>\n  <script src="/static/js/analytics.js"></script>\n<p>content</p>\n'
+            b'</body>\n</html>\n')
+    assert _strip(page) == page
+
+
+def test_unterminated_toolbar_block_is_kept():
+    page = (b'<html><body>\n    <!-- BEGIN WAYBACK TOOLBAR INSERT -->\n<div>toolbar?</div>\n'
+            b'<p>content</p>\n</body>\n</html>\n')
+    assert _strip(page) == page
+
+
+def test_head_injection_before_marker_is_removed():
+    page = (b'<html><head>\n'
+            b'<script type="text/javascript" src="https://web-static.archive.org/_static/js/bundle-playback.js">'
+            b'</script>\n'
+            b'<script src="//archive.org/includes/athena.js" type="text/javascript"></script>\n'
+            b'<!-- End Wayback Rewrite JS Include -->\n'
+            b'<title>T</title>\n'
+            b'<script src="/web/2015js_/http://site.com/_static/js/theme.js"></script>\n'
+            b'</head>\n<body>\n<p>content</p>\n</body>\n</html>\n'
+            b'<!--\n     FILE ARCHIVED ON 20150101000000 AND RETRIEVED FROM THE\n-->\n')
+    assert _strip(page) == (b'<html><head>\n<title>T</title>\n'
+                            b'<script src="http://site.com/_static/js/theme.js"></script>\n'
+                            b'</head>\n<body>\n<p>content</p>\n</body>\n</html>\n')
+
+
+def test_strip_file_leaves_unmarked_file_alone(tmp_path):
+    path = tmp_path / "20150101000000_index.html"
+    page = b'<html><head>\n<script src="/_static/js/theme.js"></script>\n</head><body>x</body></html>\n'
+    path.write_bytes(page)
+    _path, size, new_size, _sha1 = strip_file(str(path))
+    assert size == new_size and path.read_bytes() == page
+
+
+def test_strip_tree_updates_manifest_and_skips_clean_files(archive, tmp_path):
+    capture = archive.archive.corpus.by_key["site0.example/"][0]
+    domain_dir = tmp_path / "websites" / "site0.example"
+    (domain_dir / "2015").mkdir(parents=True)
+    path = domain_dir / "2015" / f"{capture['timestamp']}_index.html"
+    path.write_bytes(_fetch(archive, f"/web/{capture['timestamp']}/{capture['original']}"))
+    _p, size, sha1, _html = hash_file(str(path))
+    relative = f"2015/{path.name}"
+    append_manifest(str(domain_dir), [{'path': relative, 'size': size, 'sha1': sha1}])
+
+    ledger = str(tmp_path / "ledger.sqlite")
+    cleaned, skipped, saved = strip_tree(str(tmp_path / "websites"), ledger, workers=1)
+    assert (cleaned, skipped) == (1, 0) and saved > 0
+    _p, new_size, new_sha1, _html = hash_file(str(path))
+    assert read_manifest(str(domain_dir))[relative] == {'path': relative, 'size': new_size, 'sha1': new_sha1}
+    assert len((domain_dir / MANIFEST_NAME).read_text().splitlines()) == 2
+    assert json.loads((domain_dir / MANIFEST_NAME).read_text().splitlines()[0])['size'] == size
+
+    assert strip_tree(str(tmp_path / "websites"), ledger, workers=1) == (0, 1, 0)
@@ -0,0 +1,75 @@
+import csv
+
+from wayback_tools.url_index import URLIndex, build_index
+
+
+def _line(timestamp, url):
+    return f"https://web.archive.org/web/{timestamp}/{url}\n"
+
+
+def _write(path, lines, mode='w'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, mode, encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def _rows(index):
+    return list(index.rows())
+
+
+def test_update_reads_only_appended_lines(tmp_path):
+    base = tmp_path / "websites"
+    _write(base / "a.com" / "a.com.txt", [_line("20150101000000", "http://a.com/")])
+    _write(base / "b.com" / "b.com.txt", [_line("20160101000000", "http://b.com/"), "not a snapshot\n"])
+    index = URLIndex(str(tmp_path / "index.sqlite"))
+    assert index.update(str(base)) == (2, 0, 2, 0)
+    assert index.update(str(base)) == (0, 2, 0, 0)
+
+    _write(base / "a.com" / "a.com.txt", [_line("20170101000000", "http://a.com/"),
+                                          _line("20150101000000", "http://a.com/"),
+                                          "https://web.archive.org/web/2018"], mode='a')
+    assert index.update(str(base)) == (1, 1, 1, 0)
+    assert [r[1] for r in _rows(index) if r[0] == "a.com"] == ["2015", "2017"]
+    index.close()
+
+
+def test_deleted_file_drops_its_rows(tmp_path):
+    base = tmp_path / "websites"
+    _write(base / "a.com" / "a.com.txt", [_line("20150101000000", "http://a.com/")])
+    _write(base / "a.com" / "extra.txt", [_line("20160101000000", "http://a.com/")])
+    _write(base / "b.com" / "b.com.txt", [_line("20160101000000", "http://b.com/")])
+    index = URLIndex(str(tmp_path / "index.sqlite"))
+    index.update(str(base))
+
+    (base / "a.com" / "extra.txt").unlink()
+    (base / "b.com" / "b.com.txt").unlink()
+    read, _skipped, _added, removed = index.update(str(base))
+    assert (read, removed) == (1, 3)
+    assert _rows(index) == [("a.com", "2015", _line("20150101000000", "http://a.com/").strip())]
+    assert index.update(str(base)) == (0, 1, 0, 0)
+    index.close()
+
+
+def test_rewritten_file_is_reread(tmp_path):
+    base = tmp_path / "websites"
+    path = base / "a.com" / "a.com.txt"
+    _write(path, [_line("20150101000000", "http://a.com/"), _line("20160101000000", "http://a.com/")])
+    index = URLIndex(str(tmp_path / "index.sqlite"))
+    index.update(str(base))
+    _write(path, [_line("20170101000000", "http://a.com/")])
+    index.update(str(base))
+    assert [r[1] for r in _rows(index)] == ["2017"]
+    index.close()
+
+
+def test_build_index_rewrites_csv_after_deletion(tmp_path):
+    base = tmp_path / "websites"
+    _write(base / "a.com" / "a.com.txt", [_line("20150101000000", "http://a.com/")])
+    _write(base / "b.com" / "b.com.txt", [_line("20160101000000", "http://b.com/")])
+    output = str(tmp_path / "structured_urls.csv")
+    assert build_index(str(base), output, output_parquet="") == 2
+
+    (base / "b.com" / "b.com.txt").unlink()
+    assert build_index(str(base), output, output_parquet="") == 1
+    with open(output, encoding='utf-8') as f:
+        assert [row['domain'] for row in csv.DictReader(f)] == ["a.com"]
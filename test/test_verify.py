@@ -0,0 +1,68 @@
+import os
+import subprocess
+
+from wayback_tools.fake_archive import build_synthetic
+from wayback_tools.job_store import PENDING, JobStore
+from wayback_tools.verify import append_manifest, hash_file, read_manifest, repair, verify_tree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _snapshot(domain_dir, relative, body, record=True):
+    path = domain_dir / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    if record:
+        _p, size, sha1, _html = hash_file(str(path))
+        append_manifest(str(domain_dir), [{'path': relative, 'size': size, 'sha1': sha1,
+                                           'timestamp': relative.split('/')[-1][:14], 'url': "http://a.com/"}])
+    return path
+
+
+def test_verify_tree_reports_each_kind_of_problem(tmp_path):
+    base = tmp_path / "websites"
+    domain_dir = base / "a.com"
+    _snapshot(domain_dir, "2015/20150101000000_index.html", b"<html>ok</html>")
+    _snapshot(domain_dir, "2016/20160101000000_index.html", b"<html>full body</html>").write_bytes(b"<html>full")
+    _snapshot(domain_dir, "2017/20170101000000_index.html", b"<html>abcd</html>").write_bytes(b"<html>abce</html>")
+    _snapshot(domain_dir, "2018/20180101000000_index.html", b"<html>gone</html>").unlink()
+    _snapshot(domain_dir, "2019/20190101000000_index.html", b"", record=False)
+    _snapshot(domain_dir, "2020/20200101000000_index.html", b"<html><body>cut", record=False)
+    (domain_dir / "a.com.txt").write_text("https://web.archive.org/web/20190101000000/http://www.a.com/\n")
+
+    reasons = {p['path']: p['reason'] for p in verify_tree(str(base), workers=1)}
+    assert reasons == {"2016/20160101000000_index.html": "size",
+                       "2017/20170101000000_index.html": "sha1",
+                       "2018/20180101000000_index.html": "missing",
+                       "2019/20190101000000_index.html": "empty"}
+    strict = {p['path']: p for p in verify_tree(str(base), workers=1, strict=True)}
+    assert strict["2020/20200101000000_index.html"]['reason'] == "truncated"
+    assert strict["2019/20190101000000_index.html"]['url'] == "http://www.a.com/"
+
+
+def test_repair_removes_bad_files_and_requeues(tmp_path):
+    base = tmp_path / "websites"
+    bad = _snapshot(base / "a.com", "2016/20160101000000_index.html", b"<html>full body</html>")
+    bad.write_bytes(b"<html>full")
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    store.add_domains(["a.com"])
+    store.mark_done("a.com")
+
+    assert repair(verify_tree(str(base), workers=1), str(base), store) == ["a.com"]
+    assert not bad.exists()
+    assert store.state_of("a.com") == PENDING
+    store.close()
+
+
+def test_ruby_downloader_writes_a_matching_manifest(archive_factory, tmp_path):
+    # 每个快照都要先 302 一次，下载器在同一个连接上跟随重定向
+    archive = archive_factory(build_synthetic(domains=1, pages=1, body_bytes=2000, redirect_rate=1.0))
+    out = tmp_path / "websites" / "site0.example"
+    env = dict(os.environ, WAYBACK_BASE_URL=archive.base_url)
+    subprocess.run(["ruby", os.path.join(ROOT, "bin", "wayback_machine_downloader"), "http://site0.example",
+                    "-sl", "-f", "2009", "-d", str(out), "--concurrency", "4"],
+                   cwd=ROOT, env=env, check=True, capture_output=True, timeout=120)
+    manifest = read_manifest(str(out))
+    assert manifest and all(record['sha1'] for record in manifest.values())
+    assert verify_tree(str(tmp_path / "websites"), workers=1) == []
+    assert archive.stats['redirects'] >= len(manifest)
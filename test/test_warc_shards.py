@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from web_ana_tools import web_tracking
+from wayback_tools.warc_shards import CorpusReader, ShardWriter, collect_corpus_files, pack_websites
+
+PAGE = (b"<html><head><script>ga('send', 'pageview');</script></head>"
+        b"<body>hello</body></html>\n")
+
+
+def _websites(tmp_path):
+    base = tmp_path / "websites"
+    for domain, year, timestamp, body in [
+        ("a.com", "2015", "20150101000000", PAGE),
+        ("a.com", "2015", "20150601000000", b"<html>later</html>\n"),
+        ("a.com", "2016", "20160101000000", PAGE),
+        ("b.com", "2016", "20160202000000", b"<html>b</html>\n"),
+    ]:
+        (base / domain / year).mkdir(parents=True, exist_ok=True)
+        (base / domain / year / f"{timestamp}_index.html").write_bytes(body)
+    (base / "a.com" / "a.com.txt").write_text(
+        "https://web.archive.org/web/20150101000000/http://www.a.com/\n")
+    return base
+
+
+def test_pack_dedups_identical_bodies(tmp_path):
+    packed, deduped = pack_websites(str(_websites(tmp_path)), str(tmp_path / "corpus"))
+    assert (packed, deduped) == (4, 1)
+    assert pack_websites(str(tmp_path / "websites"), str(tmp_path / "corpus")) == (0, 0)
+
+    reader = CorpusReader(str(tmp_path / "corpus"))
+    assert reader.domains() == ["a.com", "b.com"]
+    assert reader.get("a.com", 2016) == PAGE
+    entry = reader.entries("a.com", 2015, 2015)[0]
+    assert entry.url == "http://www.a.com/"
+    assert reader.read(entry) == PAGE
+
+
+def test_domain_mode_writes_one_shard_per_domain(tmp_path):
+    writer = ShardWriter(str(tmp_path / "corpus"), mode="domain")
+    writer.append("a.com", "2015", "20150101000000", "http://a.com/", PAGE)
+    writer.append("b.com", "2015", "20150101000000", "http://b.com/", b"<html>b</html>")
+    writer.close()
+    shards = {e.shard for e in CorpusReader(str(tmp_path / "corpus")).entries()}
+    assert len(shards) == 2 and all(s.startswith(("a.com", "b.com")) for s in shards)
+
+
+def test_collect_corpus_files_takes_first_snapshot_per_year(tmp_path):
+    pack_websites(str(_websites(tmp_path)), str(tmp_path / "corpus"))
+    reader, files = collect_corpus_files(str(tmp_path / "corpus"))
+    assert [(f['website'], f['year']) for f in files] == [("a.com", 2015), ("a.com", 2016), ("b.com", 2016)]
+    assert files[0]['entry'].timestamp == "20150101000000"
+    assert reader.read(files[0]['entry']) == PAGE
+
+
+def test_analyzer_reads_the_corpus(tmp_path):
+    pack_websites(str(_websites(tmp_path)), str(tmp_path / "corpus"))
+    from_corpus = web_tracking.analyze_multiple_websites(None, corpus_dir=str(tmp_path / "corpus"))
+    from_dir = web_tracking.analyze_multiple_websites(str(tmp_path / "websites"))
+    assert sorted((r['website'], r['year']) for r in from_corpus) == \
+        sorted((r['website'], r['year']) for r in from_dir)
+    events = {(r['website'], r['year']): r['total_events'] for r in from_corpus}
+    assert events[("a.com", 2015)] and events[("a.com", 2016)] and not events[("b.com", 2016)]
+
+
+@pytest.mark.parametrize("script", ["web_tracking.py", "web_personalize.py", "optimized_web_personalize.py"])
+def test_analyzer_scripts_read_the_corpus_outside_the_repo(tmp_path, script):
+    pack_websites(str(_websites(tmp_path)), str(tmp_path / "corpus"))
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env.pop('PYTHONPATH', None)
+    result = subprocess.run([sys.executable, os.path.join(repo_root, "web_ana_tools", script), "--corpus", "corpus",
+                             "--output", "out.xlsx"], cwd=tmp_path, env=env, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "ModuleNotFoundError" not in result.stdout + result.stderr
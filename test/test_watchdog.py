@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+import wayback_main
+from wayback_tools.retry import FailureTally
+from wayback_tools.verify import append_manifest, hash_file
+from wayback_tools.watchdog import Watchdog, iter_output_lines, remove_unrecorded_files
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="需要 POSIX 进程组")
+
+
+def _run(command, watchdog):
+    started = time.time()
+    code = wayback_main.run_downloader(command, FailureTally(), log_path="/dev/null", watchdog=watchdog)
+    return code, time.time() - started
+
+
+def test_stalled_process_group_is_killed():
+    watchdog = Watchdog(stall_timeout=0.3, poll_interval=0.1)
+    code, elapsed = _run("echo start; sleep 30 & wait", watchdog)
+    assert code != 0 and elapsed < 10
+    assert watchdog.reason.endswith("秒没有进展")
+
+
+def test_output_without_newlines_counts_as_progress():
+    watchdog = Watchdog(stall_timeout=0.3, poll_interval=0.1)
+    code, _elapsed = _run("for i in 1 2 3 4 5 6; do printf .; sleep 0.1; done", watchdog)
+    assert code == 0 and watchdog.reason is None
+
+
+def test_wall_timeout():
+    watchdog = Watchdog(stall_timeout=0, wall_timeout=0.3, poll_interval=0.1)
+    code, elapsed = _run("while true; do echo .; sleep 0.05; done", watchdog)
+    assert code != 0 and elapsed < 10
+    assert watchdog.reason.startswith("超过总时长上限")
+
+
+def test_iter_output_lines_keeps_partial_lines():
+    process = subprocess.Popen(["printf", "a\\r\\nb\\nc"], stdout=subprocess.PIPE)
+    assert list(iter_output_lines(process.stdout)) == ["a\n", "b\n", "c"]
+    process.wait()
+
+
+def test_remove_unrecorded_files(tmp_path):
+    old = tmp_path / "2015" / "20150101000000_index.html"
+    old.parent.mkdir()
+    old.write_bytes(b"<html>old</html>")
+    since = time.time()
+    done = tmp_path / "2016" / "20160101000000_index.html"
+    partial = tmp_path / "2017" / "20170101000000_index.html"
+    for path in (done, partial):
+        path.parent.mkdir()
+        path.write_bytes(b"<html>")
+    _p, size, sha1, _html = hash_file(str(done))
+    append_manifest(str(tmp_path), [{'path': "2016/20160101000000_index.html", 'size': size, 'sha1': sha1}])
+    assert remove_unrecorded_files(str(tmp_path), since) == ["2017/20170101000000_index.html"]
+    assert old.exists() and done.exists() and not partial.exists()
@@ -1,80 +1,599 @@
 import pandas as pd
 import subprocess
 import os
-from datetime import datetime
+import json
+import argparse
+from functools import partial
 
+from wayback_tools.scheduler import DomainScheduler
+from wayback_tools.aimd import AIMDController
+from wayback_tools.cdx_client import list_snapshots
+from wayback_tools.cdx_cache import CDXCache
+from wayback_tools.retry import RETRYABLE, FailureTally, TokenBucket, backoff_delay, classify_exception
+from wayback_tools.job_store import JobStore, PENDING, DOWNLOADING, DONE, FAILED, CAPPED, measure_dir
+from wayback_tools.budget import budget_from
+from wayback_tools.domain_input import StoreFeeder, clean_url, iter_domains
+from wayback_tools.canonical import AliasMap, canonical_domain, collapse_redirects
+from wayback_tools.script_fetch import fetch_scripts, format_stats
+from wayback_tools.plan_file import PlanFeeder, iter_plan, plan_file_list
+from wayback_tools.snapshot_store import ContentStore
+from wayback_tools.planner import (curated_file_list, download_domain_deduped, list_homepage_rows,
+                                   plan_latest_per_year, HOMEPAGE_COLLAPSE)
+from wayback_tools.download_engine import DownloadEngine
+from wayback_tools.redirect_cache import RedirectCache
+from wayback_tools.watchdog import Watchdog, iter_output_lines, kill_group, popen_group, remove_unrecorded_files
+from wayback_tools.toolbar_strip import strip_tree
+from wayback_tools import coordination
+from wayback_tools.coordination import Coordinator
+from wayback_tools.cost_model import prepare_plan
+from wayback_tools.warc_shards import ShardWriter
+from wayback_tools.metrics import MetricsWriter, ThroughputMetrics, parse_line
 
-def clean_url(url):
-    url = url.strip()           # 去除首尾空格
-    url = url.lower()           # 全部转小写
-    url = url.replace('http://', '').replace('https://', '')  # 移除协议头
-    return url
+# 用绝对路径调用 Ruby 下载器，在其他工作目录下运行（如压测）时也能找到
+DOWNLOADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin", "wayback_machine_downloader")
 
-def read_urls_from_excel(file_path, base_dir="websites"):
+def export_remaining(store, output_file="domains_remain_remain.xlsx"):
+    """按需把仍待处理的域名导出为 Excel"""
+    pending_urls = store.domains(PENDING)
+    pd.DataFrame(pending_urls, columns=["Pending URLs"]).to_excel(output_file, index=False)
+    print(f"✅ {len(pending_urls)} 个未处理的 URL 已保存至 {output_file}")
+
+def export_failed(store, output_file="failed_jobs.csv"):
+    """按需把任务状态库中的失败记录导出为 CSV，便于排查（不覆盖旧版追加写入的 failed_urls.csv）"""
+    failures = store.failures()
+    pd.DataFrame(failures, columns=["Time", "URL", "Error", "Attempts"]).to_csv(
+        output_file, index=False, encoding='utf-8-sig')
+    print(f"🚨 {len(failures)} 条失败记录已保存至 {output_file}")
+
+def build_download_command(url, concurrency, homepage_only=False):
+    full_url = f"https://{url}"
+    command = f'ruby "{DOWNLOADER}" {full_url} -sl -f 2009 --concurrency {concurrency}'
+    if homepage_only:
+        # 只查询主页本身，按月折叠
+        command += f' -e --collapse {HOMEPAGE_COLLAPSE}'
+    return command
+
+def run_downloader(command, tally, log_path=None, metrics=None, domain=None, controller=None, watchdog=None,
+                   budget=None):
+    """
+    运行 Ruby 下载器，逐行统计其中的错误和进度，返回退出码。
+    给出 log_path 时输出追加写入该日志文件，否则转发到终端。
+    controller 为 AIMDController 时，把每个保存成功的文件和可重试错误反馈给它（Ruby 输出中没有延迟信息）。
+    watchdog 为 Watchdog 时，子进程长时间没有输出或超过总时长会被结束，原因记在 watchdog.reason。
+    budget 为 DomainBudget 时按输出中新保存的文件计数，超出上限立即结束子进程，原因记在 budget.reason。
+    """
+    process = popen_group(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if watchdog:
+        watchdog.watch(process)
+    log = open(log_path, 'a', encoding='utf-8') if log_path else None
+    # 进度行 (done/total) 表明是否还有文件没处理，最后一个文件恰好用完预算时不算超出
+    upcoming = 1
+    try:
+        for line in iter_output_lines(process.stdout, watchdog.touch if watchdog else None):
+            if log:
+                log.write(line)
+            else:
+                print(line, end='')
+            kind = tally.observe_line(line)
+            if metrics:
+                metrics.observe_line(domain, line)
+            event = parse_line(line) or {}
+            # 失败的文件也会输出 "url -> path"，只有文件确实存在才算保存成功
+            saved = 'path' in event and os.path.isfile(event['path'])
+            if controller:
+                if kind == RETRYABLE:
+                    controller.on_error()
+                elif saved:
+                    controller.on_success()
+            if budget and not budget.reason:
+                if 'done' in event:
+                    upcoming = 1 if event['done'] < event['total'] else 0
+                elif 'completed_seconds' in event:
+                    upcoming = 0
+                if saved:
+                    budget.add(1, os.path.getsize(event['path']))
+                if budget.exceeded(upcoming):
+                    kill_group(process)
+        return process.wait()
+    finally:
+        if watchdog:
+            watchdog.stop()
+        if log:
+            log.close()
+
+def domain_log_path(log_dir, url):
+    if not log_dir:
+        return None
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(log_dir, f"{url}.log")
+
+def requeue_retryable(url, store, error, max_attempts, files=0, size=0):
+    """可重试错误：未超过尝试次数时退避后重新排队，否则标记失败"""
+    if store.requeue_or_fail(url, error, backoff_delay, max_attempts, files=files, bytes=size):
+        print(f"🔁 {url} 遇到可重试错误，退避后重新排队: {error}")
+    else:
+        print(f"⚠️ 下载失败: {url}，已重试 {max_attempts} 次: {error}")
+
+def mark_capped(url, store, budget, files=0, size=0, removed=0):
+    """超出单域名预算：保留已下载的文件，记为 capped，之后可用 --continue-capped 低优先级续传"""
+    error = f"超出单域名预算：{budget.reason}（本次下载 {budget.files} 个文件、{budget.bytes} 字节"
+    error += f"，删除 {removed} 个不完整的文件）" if removed else "）"
+    store.mark_capped(url, error, files=files, bytes=size)
+    print(f"✂️ {url} {error}")
+
+def download_one(url, concurrency, store, rate_limiter=None, max_attempts=5, base_dir="websites",
+                 metrics=None, log_dir=None, homepage_only=False, controller=None,
+                 stall_timeout=600, wall_timeout=None, caps=None):
+    """
+    下载单个域名，并把结果写入任务状态库：
+    出现 429/5xx/超时/连接重置等可重试错误时按指数退避重新排队，否则标记完成或失败。
+    metrics 为 ThroughputMetrics 时统计吞吐；log_dir 不为空时下载器输出写入 <log_dir>/<url>.log。
+    controller 为 AIMDController 时由下载器输出驱动自适应并发窗口。
+    下载器 stall_timeout 秒没有输出或运行超过 wall_timeout 秒时被结束，删除不完整的文件后重新排队。
+    caps 为单域名预算（见 budget_from），超出时结束下载器、删除不完整的文件，域名记为 capped。
+    """
+    full_url = f"https://{url}"
+    command = build_download_command(url, concurrency, homepage_only)
+    if rate_limiter:
+        rate_limiter.acquire()
+    print(f"⚡ 开始下载: {full_url}（连接数 {concurrency}）")
+    store.set_state(url, DOWNLOADING)
+    tally = FailureTally()
+    budget = budget_from(caps)
+    watchdog = Watchdog(stall_timeout, wall_timeout, budget=budget) if stall_timeout or wall_timeout or budget \
+        else None
+    if metrics:
+        metrics.start_domain(url)
+    returncode = None
     try:
-        df = pd.read_excel(file_path)
-        urls = [clean_url(url) for url in df.iloc[:, 0].dropna().tolist()]
-        urls = list(set(urls))  # 去重
+        returncode = run_downloader(command, tally, domain_log_path(log_dir, url), metrics, url, controller,
+                                    watchdog, budget)
+    finally:
+        if metrics:
+            metrics.finish_domain(url, ok=returncode == 0 and not tally.retryable)
+
+    if budget and budget.reason:
+        removed = remove_unrecorded_files(os.path.join(base_dir, url), budget.started_at)
+        files, size = measure_dir(os.path.join(base_dir, url))
+        mark_capped(url, store, budget, files, size, len(removed))
+        return False
 
-        # 获取已下载的目录名
-        existing_dirs = set(os.listdir(base_dir)) if os.path.exists(base_dir) else set()
+    if watchdog and watchdog.reason:
+        removed = remove_unrecorded_files(os.path.join(base_dir, url), watchdog.started_at)
+        files, size = measure_dir(os.path.join(base_dir, url))
+        error = f"下载器被看门狗结束：{watchdog.reason}（已保存 {files} 个文件，删除 {len(removed)} 个不完整的文件）"
+        requeue_retryable(url, store, error, max_attempts, files, size)
+        return False
+    files, size = measure_dir(os.path.join(base_dir, url))
 
-        # 过滤出未处理的URL
-        pending_urls = [url for url in urls if url not in existing_dirs]
+    if tally.retryable:
+        if tally.throttled and rate_limiter:
+            rate_limiter.pause(backoff_delay(tally.throttled))
+        error = f"{tally.retryable} 个可重试错误（退出码 {returncode}），最后一个: {tally.last_retryable}"
+        requeue_retryable(url, store, error, max_attempts, files, size)
+        return False
+    if returncode != 0:
+        error = f"Command '{command}' returned non-zero exit status {returncode}."
+        print(f"⚠️ 下载失败: {full_url}，错误信息: {error}")
+        store.mark_failed(url, error, files=files, bytes=size)
+        return False
+    store.mark_done(url, files=files, bytes=size)
+    print(f"✅ 下载完成: {full_url}（{files} 个文件，{size} 字节）")
+    return True
 
-        # 输出为 Excel 文件
-        if pending_urls:
-            output_df = pd.DataFrame(pending_urls, columns=["Pending URLs"])
-            output_df.to_excel("domains_remain_remain.xlsx", index=False)
-            print(f"✅ 未处理的 URL 已保存至 domains_2_remain.xlsx")
+def download_one_python(url, concurrency, store, rate_limiter=None, max_attempts=5, base_dir="websites",
+                        engine=None, cache=None, metrics=None, log_dir=None, homepage_only=False, planned=False,
+                        caps=None):
+    """
+    用进程内的 Python 下载引擎下载单个域名的每年最新主页（与 Ruby 版 -sl -f 2009 相同的文件列表和保存路径），
+    不启动 Ruby 解释器，连接池由所有域名共享。错误的分类与重新排队方式同 download_one。
+    planned 为 True 时下载任务状态库 plan 表中该域名的快照，不查询 CDX。
+    caps 为单域名预算，超出后不再开始新文件，域名记为 capped。
+    """
+    print(f"⚡ 开始下载（Python 引擎）: {url}（连接数 {concurrency}）")
+    store.set_state(url, DOWNLOADING)
+    tally = FailureTally()
+    budget = budget_from(caps)
+    if metrics:
+        metrics.start_domain(url)
+    log_path = domain_log_path(log_dir, url)
+    log = open(log_path, 'a', encoding='utf-8') if log_path else None
+
+    def emit(line):
+        if log:
+            log.write(line + "\n")
         else:
-            print("🎉 所有 URL 都已处理，无需输出文件。")
+            print(line)
+        if metrics:
+            metrics.observe_line(url, line)
 
-        return pending_urls, len(urls), len(pending_urls)
+    ok = False
+    try:
+        if planned:
+            file_list = plan_file_list(store.plan_for(url))
+        else:
+            if homepage_only:
+                rows = list_homepage_rows(url, concurrency, cache, rate_limiter, engine.base_url)
+            else:
+                rows = list_snapshots(url, concurrency=concurrency, from_timestamp=2009, cache=cache,
+                                      rate_limiter=rate_limiter, base_url=engine.base_url)
+            file_list = curated_file_list(plan_latest_per_year(rows))
+        stats = engine.download_files(url, file_list, concurrency, base_dir, emit=emit, budget=budget)
+        for _file_url, error in stats['errors']:
+            tally.observe_exception(error)
+        ok = not stats['errors']
     except Exception as e:
-        print(f"❌ 读取Excel文件出错: {e}")
-        return [], 0, 0
+        tally.observe_exception(e)
+        emit(f"{url} # {type(e).__name__}: {e}")
+    finally:
+        if log:
+            log.close()
+        if metrics:
+            metrics.finish_domain(url, ok=ok)
+    files, size = measure_dir(os.path.join(base_dir, url))
+
+    if budget and budget.reason:
+        mark_capped(url, store, budget, files, size)
+        return False
+    if tally.retryable:
+        if tally.throttled and rate_limiter:
+            rate_limiter.pause(backoff_delay(tally.throttled))
+        error = f"{tally.retryable} 个可重试错误，最后一个: {tally.last_retryable}"
+        requeue_retryable(url, store, error, max_attempts, files, size)
+        return False
+    if tally.fatal:
+        error = f"{tally.fatal} 个文件下载失败"
+        print(f"⚠️ 下载失败: {url}，错误信息: {error}")
+        store.mark_failed(url, error, files=files, bytes=size)
+        return False
+    store.mark_done(url, files=files, bytes=size)
+    print(f"✅ 下载完成: {url}（{files} 个文件，{size} 字节）")
+    return True
+
+def download_one_deduped(url, concurrency, store, rate_limiter=None, max_attempts=5, base_dir="websites",
+                         content_store=None, cache=None, shard_writer=None, metrics=None, engine=None,
+                         homepage_only=False, caps=None):
+    """
+    用 Python 下载路径按 digest 去重下载单个域名的每年最新主页，结果写入任务状态库。
+    caps 为单域名预算，超出后不再下载新的响应体，域名记为 capped。
+    """
+    print(f"⚡ 开始下载（按 digest 去重）: {url}（连接数 {concurrency}）")
+    store.set_state(url, DOWNLOADING)
+    budget = budget_from(caps)
+    if metrics:
+        metrics.start_domain(url)
+    try:
+        stats = download_domain_deduped(url, concurrency, content_store, base_dir, cache=cache,
+                                        rate_limiter=rate_limiter, shard_writer=shard_writer, engine=engine,
+                                        homepage_only=homepage_only, budget=budget)
+    except Exception as e:
+        if metrics:
+            metrics.finish_domain(url, ok=False)
+        files, size = measure_dir(os.path.join(base_dir, url))
+        if classify_exception(e) == RETRYABLE:
+            if getattr(getattr(e, 'response', None), 'status_code', None) == 429 and rate_limiter:
+                rate_limiter.pause(backoff_delay(1))
+            requeue_retryable(url, store, e, max_attempts, files, size)
+        else:
+            print(f"⚠️ 下载失败: {url}，错误信息: {e}")
+            store.mark_failed(url, e, files=files, bytes=size)
+        return False
+    if metrics:
+        metrics.add_files(url, stats['fetched'], stats['bytes'])
+        metrics.finish_domain(url)
+    if budget and budget.reason and stats['capped']:
+        mark_capped(url, store, budget, stats['files'], stats['bytes'])
+        return False
+    store.mark_done(url, files=stats['files'], bytes=stats['bytes'])
+    print(f"✅ 下载完成: {url}（{stats['files']} 个年份快照，实际下载 {stats['fetched']} 个，"
+          f"{stats['bytes']} 字节）")
+    return True
+
+def with_toolbar_stripped(download, ledger_path="strip_ledger.sqlite"):
+    """下载成功后立即去除该域名快照中的 Wayback 工具栏和改写的链接"""
+    def download_and_strip(url, concurrency, store, rate_limiter=None, max_attempts=5, base_dir="websites"):
+        ok = download(url, concurrency, store, rate_limiter, max_attempts, base_dir)
+        if ok:
+            cleaned, _skipped, saved = strip_tree(os.path.join(base_dir, url), ledger_path, workers=1)
+            if cleaned:
+                print(f"🧹 {url}: 清理了 {cleaned} 个文件中的 Wayback 注入内容，节省 {saved} 字节")
+        return ok
+    return download_and_strip
 
-def download_wayback_snapshots(urls):
+def with_coordination(download, coordinator, base_dir="websites"):
+    """
+    多节点运行：只下载一致性哈希环上属于本节点、且能拿到租约的域名，
+    其余域名推迟后再检查（其所属节点崩溃后会落到本节点）；其他节点完成的域名同步到本地任务状态库。
+    """
+    recheck = coordinator.lease_ttl / 3
+
+    def download_sharded(url, concurrency, store, rate_limiter=None, max_attempts=5, base_dir=base_dir):
+        info = coordinator.lease_info(url)
+        if info and info.get('state') == coordination.DONE:
+            files, size = measure_dir(os.path.join(base_dir, url))
+            store.mark_done(url, files=files, bytes=size)
+            return True
+        if info and info.get('state') == coordination.FAILED:
+            store.mark_failed(url, info.get('error') or f"在节点 {info.get('node_id')} 上失败")
+            return False
+        if not coordinator.is_mine(url) or not coordinator.acquire(url):
+            store.defer(url, recheck)
+            return None
+        try:
+            ok = download(url, concurrency, store, rate_limiter, max_attempts, base_dir)
+        except BaseException:
+            coordinator.release(url)
+            raise
+        state = store.state_of(url)
+        if state == DONE:
+            coordinator.complete(url, coordination.DONE)
+        elif state == FAILED:
+            coordinator.complete(url, coordination.FAILED, error=f"在节点 {coordinator.node_id} 上失败")
+        else:
+            coordinator.release(url)  # 已重新排队，退避期间其他节点也可以接手
+        return ok
+    return download_sharded
+
+def download_wayback_snapshots(store, jobs=4, connections=60, per_domain_max=30, controller=None,
+                               rate_limiter=None, max_attempts=5, keep_waiting=None, download=None):
+    """
+    并发下载任务状态库中的 pending 域名：最多 jobs 个域名同时在途，共享 connections 个连接。
+    keep_waiting() 为 True 时（输入列表仍在写入）即使暂时没有 pending 域名也不结束。
+    download 为单个域名的下载函数，默认调用 Ruby 下载器（download_one）。
+    """
+    download = download or download_one
     base_dir = "websites"
     if not os.path.exists(base_dir):
         os.makedirs(base_dir)
 
-    failed_logs = [] #记录每次请求失败的原因、方便后续排查
+    def worker(url, concurrency):
+        return download(url, concurrency, store, rate_limiter, max_attempts, base_dir)
 
-    for url in urls:
-        folder_name = os.path.join(base_dir, url)
-        if os.path.isdir(folder_name):
-            print(f"⏩ 已存在目录，跳过: {url}")
-            continue
+    def on_done(url, result, error):
+        if error is not None:
+            print(f"⚠️ 下载失败: {url}，错误信息: {error}")
+            store.mark_failed(url, error)
+
+    scheduler = DomainScheduler(jobs=jobs, connections=connections, per_domain_max=per_domain_max,
+                                controller=controller)
+    scheduler.run(store.iter_claims(keep_waiting=keep_waiting), worker, on_done=on_done)
+
+    counts = store.counts()
+    print(f"📊 已完成: {counts[DONE]}，失败: {counts[FAILED]}，超出预算: {counts[CAPPED]}，"
+          f"待处理: {counts[PENDING]}")
+    if counts[FAILED]:
+        print("🚨 可用 --export-failed 导出失败记录，或用 --retry-failed 重新排队")
+    if counts[CAPPED]:
+        print("✂️ 可用 --continue-capped 把超出预算的域名以低优先级续传")
+
+def list_domain_snapshots(url, concurrency, output_dir="listings", cache=None, rate_limiter=None):
+    """只获取单个域名的 CDX 快照列表并保存为 JSON，不下载文件"""
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"📋 开始获取快照列表: {url}（并发页数 {concurrency}）")
+    rows = list_snapshots(url, concurrency=concurrency, from_timestamp=2009, cache=cache,
+                          rate_limiter=rate_limiter)
+    output_path = os.path.join(output_dir, f"{url}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f)
+    print(f"✅ {url} 共 {len(rows)} 条快照，已保存至 {output_path}")
+    return None
+
+def list_wayback_snapshots(urls, jobs=4, connections=60, per_domain_max=30, cache=None, rate_limiter=None):
+    """并发获取多个域名的快照列表，cache 为 CDXCache 时已缓存的页不再请求"""
+    def on_done(url, result, error):
+        if error is not None:
+            print(f"⚠️ 获取快照列表失败: {url}，错误信息: {error}")
+
+    def worker(url, concurrency):
+        return list_domain_snapshots(url, concurrency, cache=cache, rate_limiter=rate_limiter)
+
+    scheduler = DomainScheduler(jobs=jobs, connections=connections, per_domain_max=per_domain_max)
+    scheduler.run(iter(urls), worker, on_done=on_done)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='批量下载 Wayback Machine 网站快照')
+    parser.add_argument('--input', type=str, default='domains_remain.xlsx',
+                        help='域名列表：xlsx / csv / jsonl / txt，"-" 表示从标准输入读取')
+    parser.add_argument('--jobs', '-j', type=int, default=4, help='同时下载的域名数（默认 4）')
+    parser.add_argument('--connections', '-c', type=int, default=60, help='所有域名共享的全局连接数（默认 60）')
+    parser.add_argument('--per-domain-max', type=int, default=30, help='单个域名最多占用的连接数（默认 30）')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='AIMD 自适应并发：延迟和错误率正常时逐步增加连接数，遇到 429/5xx 或延迟飙升时减半')
+    parser.add_argument('--min-connections', type=int, default=4, help='自适应并发的最小窗口（默认 4）')
+    parser.add_argument('--max-connections', type=int, default=200, help='自适应并发的最大窗口（默认 200）')
+    parser.add_argument('--raw-domains', action='store_true',
+                        help='不规范化域名（默认把 www.、默认端口、末尾的 /、IDN 等不同写法合并为一个任务）')
+    parser.add_argument('--follow-redirects', action='store_true',
+                        help='查询 CDX，主页最近一次归档重定向到列表中另一个域名时合并两者')
+    parser.add_argument('--fetch-scripts', action='store_true',
+                        help='下载结束后抓取主页引用的第三方脚本，每个不同版本只下载一次')
+    parser.add_argument('--script-store', type=str, default='script_store', help='第三方脚本存储目录（默认 script_store）')
+    parser.add_argument('--plan', type=str, default=None,
+                        help='按计划文件（structured_urls.csv 或 JSONL：domain,year,url）下载其中的快照，不查询 CDX；'
+                             '代替 --input，使用 Python 引擎')
+    parser.add_argument('--list-only', action='store_true', help='只用 Python CDX 客户端获取快照列表到 listings/，不下载')
+    parser.add_argument('--cdx-cache', type=str, default='cdx_cache', help='CDX 响应缓存目录，传空字符串关闭缓存')
+    parser.add_argument('--cdx-cache-ttl-days', type=float, default=30, help='CDX 缓存有效期（天，默认 30）')
+    parser.add_argument('--cdx-cache-max-gb', type=float, default=2, help='CDX 缓存总大小上限（GB，默认 2）')
+    parser.add_argument('--rate', type=float, default=5.0, help='所有 worker 共享的每秒请求数上限（默认 5）')
+    parser.add_argument('--max-attempts', type=int, default=5, help='可重试错误的最大尝试次数（默认 5）')
+    parser.add_argument('--stall-timeout', type=float, default=600,
+                        help='Ruby 下载器连续这么多秒没有输出时结束它并重新排队（默认 600，0 关闭）')
+    parser.add_argument('--wall-timeout', type=float, default=0,
+                        help='单个域名的 Ruby 下载器最多运行的秒数，超过则结束并重新排队（默认 0 不限）')
+    parser.add_argument('--cap-files', type=int, default=0,
+                        help='单个域名一次最多下载的文件数，超出后停止并记为 capped（默认 0 不限）')
+    parser.add_argument('--cap-gb', type=float, default=0, help='单个域名一次最多下载的字节数（GB，默认 0 不限）')
+    parser.add_argument('--cap-minutes', type=float, default=0, help='单个域名一次最多下载的分钟数（默认 0 不限）')
+    parser.add_argument('--continue-capped', action='store_true',
+                        help='把超出预算（capped）的域名以低优先级重新排队，在其他域名之后续传')
+    parser.add_argument('--engine', choices=['ruby', 'python'], default='ruby',
+                        help='下载引擎：每个域名启动一次 Ruby 下载器，或进程内共享连接池的 Python 引擎')
+    parser.add_argument('--planner', choices=['full', 'homepage'], default='full',
+                        help='full 列出整个 domain/* 再挑选主页；homepage 只查询主页的精确 url（按月折叠），请求量小得多')
+    parser.add_argument('--raw', action='store_true', help='Python 引擎使用 id_ 形式下载原始快照（不含 Wayback 工具栏）')
+    parser.add_argument('--strip-toolbar', action='store_true',
+                        help='每个域名下载完成后去除快照中的 Wayback 工具栏、注入脚本和改写的链接')
+    parser.add_argument('--dedup-digests', action='store_true',
+                        help='用 Python 下载路径按 CDX digest 去重，相同内容只下载一次并硬链接到各年份目录')
+    parser.add_argument('--content-store', type=str, default='snapshot_store', help='按内容寻址的快照存储目录')
+    parser.add_argument('--storage', choices=['files', 'shards'], default='files',
+                        help='--dedup-digests 的存储方式：websites/ 下的文件，或 --corpus 下的 WARC 分片')
+    parser.add_argument('--corpus', type=str, default='corpus', help='WARC 分片目录')
+    parser.add_argument('--shard-mode', choices=['bucket', 'domain'], default='bucket',
+                        help='按大小滚动分片，或每个域名一个分片')
+    parser.add_argument('--redirect-cache', type=str, default='redirect_cache.sqlite',
+                        help='Python 下载路径的快照重定向缓存（请求地址 -> 最终地址），传空字符串关闭')
+    parser.add_argument('--metrics-file', type=str, default='metrics.json',
+                        help='定期重写的吞吐指标文件（JSON），传空字符串不写文件')
+    parser.add_argument('--metrics-interval', type=float, default=10, help='指标刷新间隔（秒，默认 10）')
+    parser.add_argument('--log-dir', type=str, default='logs',
+                        help='每个域名的下载器输出写入 <log-dir>/<domain>.log，传空字符串则直接输出到终端')
+    parser.add_argument('--state-db', type=str, default=None,
+                        help='任务状态库路径（默认 wayback_jobs.sqlite，多节点时为 wayback_jobs-<node-id>.sqlite）')
+    parser.add_argument('--node-id', type=str, default=None,
+                        help='多节点运行时本节点的名字；各节点对同一份域名列表按一致性哈希分工')
+    parser.add_argument('--coord-dir', type=str, default='coord', help='多节点共享的心跳和租约目录')
+    parser.add_argument('--lease-ttl', type=float, default=300, help='心跳和租约的过期时间（秒，默认 300）')
+    parser.add_argument('--estimate', action='store_true',
+                        help='下载前用 CDX 页数估算每个域名的成本，打印总量和预计耗时，并按从大到小的顺序下载')
+    parser.add_argument('--dry-run', action='store_true', help='只估算并打印下载计划，不下载')
+    parser.add_argument('--refresh-estimates', action='store_true', help='忽略已保存的估算，全部重新估算')
+    parser.add_argument('--mark-existing-done', action='store_true', help='一次性把 websites/ 下已有目录的域名标记为已完成')
+    parser.add_argument('--retry-failed', action='store_true', help='把失败的域名重新排队')
+    parser.add_argument('--export-remaining', action='store_true', help='把待处理域名导出到 domains_remain_remain.xlsx')
+    parser.add_argument('--export-failed', action='store_true', help='把失败记录导出到 failed_jobs.csv')
+    return parser.parse_args()
 
-        full_url = f"https://{url}"
-        command = f'ruby bin/wayback_machine_downloader {full_url} -sl -f 2009 --concurrency 15'
-        print(f"⚡ 开始下载: {full_url}")
-        try:
-            subprocess.run(command, shell=True, check=True)
-            print(f"✅ 下载完成: {full_url}")
-        except subprocess.CalledProcessError as e:
-            error_msg = str(e)
-            print(f"⚠️ 下载失败: {full_url}，错误信息: {error_msg}")
-            failed_logs.append({
-                "Time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "URL": url, 
-                "Error": error_msg
-                })
-    
-    # 保存失败日志
-    if failed_logs:
-        df_failed = pd.DataFrame(failed_logs)
-        df_failed.to_csv("failed_urls.csv", mode='a', header=not os.path.exists("failed_urls.csv"), index=False, encoding='utf-8-sig')
-        print(f"🚨 共 {len(failed_logs)} 个URL下载失败，已记录到 failed_urls.csv")
-    
 
 if __name__ == "__main__":
-    file_name = "domains_remain.xlsx"
-    urls, total_count, pending_count = read_urls_from_excel(file_name)
-    if urls:
-        print(f"📊 总URL数: {total_count}，已处理: {total_count - pending_count}，待处理: {pending_count}")
-        download_wayback_snapshots(urls)
+    args = parse_args()
+    rate_limiter = TokenBucket(args.rate)
+
+    cache = None
+    if args.cdx_cache:
+        cache = CDXCache(args.cdx_cache, ttl=args.cdx_cache_ttl_days * 86400,
+                         max_bytes=int(args.cdx_cache_max_gb * 1024 ** 3))
+        cache.evict_expired()
+
+    if args.list_only:
+        domains = iter_domains(args.input) if args.raw_domains else iter_domains(args.input, canonical_domain)
+        list_wayback_snapshots(domains, jobs=args.jobs, connections=args.connections,
+                               per_domain_max=args.per_domain_max, cache=cache, rate_limiter=rate_limiter)
     else:
-        print("🚨 没有需要处理的URL，脚本结束。")
\ No newline at end of file
+        state_db = args.state_db or (f"wayback_jobs-{args.node_id}.sqlite" if args.node_id else "wayback_jobs.sqlite")
+        store = JobStore(state_db)
+        coordinator = None
+        if args.node_id:
+            coordinator = Coordinator(args.coord_dir, args.node_id, args.lease_ttl)
+            coordinator.start()
+            print(f"🛰️ 节点 {coordinator.node_id} 已加入，当前在线节点: {', '.join(sorted(coordinator.live_nodes()))}")
+        stale = store.reset_stale()
+        if stale:
+            print(f"♻️ {stale} 个上次中断的域名已重新排队")
+
+        # 边读输入边入库，调度器不必等整个列表读完；www./端口/IDN 等不同写法合并为同一个任务
+        alias_map = None if args.raw_domains else AliasMap(store)
+        normalize = alias_map.resolve if alias_map else clean_url
+        if args.plan:
+            feeder = PlanFeeder(store, iter_plan(args.plan, normalize))
+        else:
+            feeder = StoreFeeder(store, iter_domains(args.input, normalize=normalize))
+        feeder.start()
+        if (args.mark_existing_done or args.export_remaining or args.estimate or args.dry_run
+                or args.follow_redirects):
+            feeder.join()
+        if args.follow_redirects:
+            print(f"🔀 {collapse_redirects(store, args.per_domain_max, cache, rate_limiter)} 个重定向到其他域名的任务已合并")
+        if args.mark_existing_done:
+            print(f"📁 {store.mark_existing_done()} 个已有目录的域名标记为已完成")
+        if args.retry_failed:
+            print(f"🔁 {store.retry_failed()} 个失败域名已重新排队")
+            if coordinator:
+                coordinator.clear_failed()
+        if args.continue_capped:
+            print(f"✂️ {store.continue_capped()} 个超出预算的域名以低优先级重新排队")
+        if args.export_remaining:
+            export_remaining(store)
+        if args.export_failed:
+            export_failed(store)
+        if args.estimate or args.dry_run:
+            prepare_plan(store, args.jobs, args.planner, concurrency=args.per_domain_max, cache=cache,
+                         rate_limiter=rate_limiter, refresh=args.refresh_estimates)
+        if args.dry_run:
+            if coordinator:
+                coordinator.stop()
+            raise SystemExit(0)
+
+        counts = store.counts()
+        print(f"📊 已完成: {counts[DONE]}，失败: {counts[FAILED]}，超出预算: {counts[CAPPED]}，"
+              f"待处理: {counts[PENDING]}" + ("（输入仍在读取中）" if feeder.is_alive() else ""))
+        metrics = ThroughputMetrics()
+        controller = None
+        if args.adaptive:
+            # 以 --connections 为初始窗口
+            controller = AIMDController(initial=args.connections, minimum=args.min_connections,
+                                        maximum=args.max_connections)
+            metrics.add_gauge('concurrency', controller.snapshot)
+        redirect_cache = None
+        if args.redirect_cache and (args.engine == 'python' or args.dedup_digests or args.plan):
+            redirect_cache = RedirectCache(args.redirect_cache)
+            metrics.add_gauge('redirect_cache', redirect_cache.snapshot)
+        metrics_writer = MetricsWriter(metrics, args.metrics_file, args.metrics_interval)
+        metrics_writer.start()
+        engine = None
+        if args.engine == 'python' or args.dedup_digests or args.plan:
+            engine = DownloadEngine(pool_size=max(args.connections, args.max_connections if controller else 0),
+                                    rate_limiter=rate_limiter, raw=args.raw, controller=controller,
+                                    redirect_cache=redirect_cache)
+        homepage_only = args.planner == 'homepage'
+        caps = {'max_files': args.cap_files, 'max_bytes': int(args.cap_gb * 1024 ** 3),
+                'max_seconds': args.cap_minutes * 60}
+        download = partial(download_one, metrics=metrics, log_dir=args.log_dir, homepage_only=homepage_only,
+                           controller=controller, stall_timeout=args.stall_timeout,
+                           wall_timeout=args.wall_timeout, caps=caps)
+        if args.engine == 'python':
+            download = partial(download_one_python, engine=engine, cache=cache, metrics=metrics,
+                               log_dir=args.log_dir, homepage_only=homepage_only, caps=caps)
+        if args.dedup_digests:
+            if args.storage == 'shards':
+                download = partial(download_one_deduped, cache=cache, metrics=metrics, engine=engine,
+                                   homepage_only=homepage_only, caps=caps,
+                                   shard_writer=ShardWriter(args.corpus, args.shard_mode))
+            else:
+                download = partial(download_one_deduped, cache=cache, metrics=metrics, engine=engine,
+                                   homepage_only=homepage_only, caps=caps,
+                                   content_store=ContentStore(args.content_store))
+        if args.plan:
+            download = partial(download_one_python, engine=engine, metrics=metrics, log_dir=args.log_dir,
+                               planned=True, caps=caps)
+        if args.strip_toolbar and not (args.raw and (args.engine == 'python' or args.plan)) and not args.dedup_digests:
+            download = with_toolbar_stripped(download)
+        if coordinator:
+            download = with_coordination(download, coordinator)
+        try:
+            download_wayback_snapshots(store, jobs=args.jobs, connections=args.connections,
+                                       per_domain_max=args.per_domain_max, controller=controller,
+                                       rate_limiter=rate_limiter,
+                                       max_attempts=args.max_attempts, keep_waiting=feeder.is_alive,
+                                       download=download)
+        finally:
+            metrics_writer.stop()
+            if engine:
+                engine.close()
+            if redirect_cache:
+                stats = redirect_cache.snapshot()
+                print(f"↪️ 重定向缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+                      f"省下 {stats['saved_round_trips']} 次往返，新记录 {stats['recorded']} 条")
+                redirect_cache.close()
+            if coordinator:
+                coordinator.stop()
+        feeder.join()
+        print(f"📥 输入URL数: {feeder.read}，新增: {feeder.added}")
+        if alias_map:
+            alias_map.flush()
+            print(f"🔗 {alias_map.merged} 个不同写法合并到已有域名")
+        if args.fetch_scripts:
+            corpus = args.corpus if args.storage == 'shards' else None
+            print(format_stats(fetch_scripts('websites', args.script_store, corpus=corpus,
+                                             concurrency=args.per_domain_max, cache=cache, rate_limiter=rate_limiter)))
@@ -0,0 +1,93 @@
+"""
+AIMD 自适应并发控制。
+
+与 TCP 拥塞控制相同的思路：请求持续成功、延迟正常时，每经过约一个窗口的成功请求
+把并发窗口加 increase（加性增）；遇到 429/5xx、超时，或延迟超过基线的 spike_factor 倍时，
+把窗口乘以 decrease（乘性减）。cooldown 秒内只减一次，避免同一波错误把窗口连续砍到底。
+低于 spike_floor 秒的响应不算延迟飙升，免得基线只有几毫秒时正常抖动也触发减窗。
+
+控制器本身也是一个信号量：with controller: 占用一个在途名额，
+在途请求数不超过当前窗口。
+"""
+
+import threading
+import time
+
+
+class AIMDController:
+    def __init__(self, initial=15, minimum=1, maximum=200, increase=1.0, decrease=0.5,
+                 spike_factor=3.0, spike_floor=1.0, cooldown=2.0):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.spike_factor = spike_factor
+        self.spike_floor = spike_floor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.cuts = 0
+        self._limit = float(min(self.maximum, max(self.minimum, initial)))
+        self._successes = 0
+        self._baseline = None   # 延迟基线（慢速指数滑动平均）
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def window(self):
+        return int(self._limit)
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.window:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def on_success(self, latency=None):
+        """一次成功的请求；latency 为响应时间（秒），不知道时传 None"""
+        with self._cond:
+            if latency is not None:
+                if (self._baseline is not None and latency > self.spike_floor
+                        and latency > self.spike_factor * self._baseline):
+                    self._cut()
+                    return
+                self._baseline = latency if self._baseline is None else 0.95 * self._baseline + 0.05 * latency
+            self._successes += 1
+            if self._successes >= self.window:
+                self._successes = 0
+                self._limit = min(self.maximum, self._limit + self.increase)
+                self._cond.notify_all()
+
+    def on_error(self):
+        """一次可重试错误（429/5xx/超时/连接重置）"""
+        with self._cond:
+            self._cut()
+
+    def _cut(self):
+        now = time.monotonic()
+        if now - self._last_cut < self.cooldown:
+            return
+        self._last_cut = now
+        self._limit = max(self.minimum, self._limit * self.decrease)
+        self._successes = 0
+        self.cuts += 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'window': self.window,
+                'in_flight': self.in_flight,
+                'cuts': self.cuts,
+                'latency_baseline_s': round(self._baseline, 3) if self._baseline is not None else None,
+            }
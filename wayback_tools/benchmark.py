@@ -0,0 +1,166 @@
+"""
+用本地替身服务器（fake_archive）压测 wayback_main.py，不访问 web.archive.org。
+
+启动一个 fake_archive 子进程，对每个变体（追加给 wayback_main.py 的参数）在全新的
+临时目录中运行，记录耗时、完成/失败的域名数、文件数和字节数，以及服务器端看到的
+请求数、429、重定向和最大并发，打印对比表并写入 JSON。并发或重试策略的改动都可以这样离线衡量。
+
+用法：
+    python -m wayback_tools.benchmark --domains 50 --latency 0.1 --throttle-rate 0.02 \\
+        --variant "--engine ruby" --variant "--engine python" --variant "--engine python --adaptive"
+"""
+
+import json
+import os
+import shlex
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from wayback_tools.fake_archive import synthetic_domains
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 压测时不需要真实环境的限速和每 10 秒一次的指标
+BASE_ARGS = ['--rate', '1000', '--metrics-interval', '1', '--log-dir', 'logs']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def fetch_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=10) as resp:
+        return json.load(resp)
+
+
+def start_server(port, server_args, timeout=60):
+    """启动 fake_archive 子进程，等到 /stats 可以访问为止"""
+    process = subprocess.Popen([sys.executable, '-m', 'wayback_tools.fake_archive', '--port', str(port)]
+                               + server_args, cwd=REPO_ROOT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fetch_stats(base_url)
+            return process, base_url
+        except OSError:
+            if process.poll() is not None or time.time() > deadline:
+                process.kill()
+                raise RuntimeError("替身服务器启动失败")
+            time.sleep(0.2)
+
+
+def job_counts(workdir):
+    path = os.path.join(workdir, 'wayback_jobs.sqlite')
+    if not os.path.exists(path):
+        return {}
+    db = sqlite3.connect(path)
+    try:
+        return dict(db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    finally:
+        db.close()
+
+
+def run_variant(variant, domains_file, base_url, timeout, keep=False):
+    """在临时目录中运行一次 wayback_main.py，返回一行结果"""
+    workdir = tempfile.mkdtemp(prefix='wayback_bench_')
+    env = dict(os.environ, WAYBACK_BASE_URL=base_url)
+    command = [sys.executable, os.path.join(REPO_ROOT, 'wayback_main.py'), '--input', domains_file] \
+        + BASE_ARGS + shlex.split(variant)
+    before = fetch_stats(base_url)
+    started = time.time()
+    try:
+        returncode = subprocess.run(command, cwd=workdir, env=env, timeout=timeout,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT).returncode
+    except subprocess.TimeoutExpired:
+        returncode = 'timeout'
+    elapsed = time.time() - started
+    after = fetch_stats(base_url)
+    metrics = {}
+    metrics_path = os.path.join(workdir, 'metrics.json')
+    if os.path.exists(metrics_path):
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            metrics = json.load(f)
+    counts = job_counts(workdir)
+    if keep:
+        print(f"📁 {variant or '(默认)'} 的工作目录: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    server = {key: after[key] - before[key] for key in after if key not in ('in_flight', 'max_in_flight')}
+    return {
+        'variant': variant or '(默认)',
+        'returncode': returncode,
+        'seconds': round(elapsed, 2),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'pending': counts.get('pending', 0),
+        'files': metrics.get('files', 0),
+        'bytes': metrics.get('bytes', 0),
+        'files_per_s': round(metrics.get('files', 0) / max(elapsed, 1e-6), 2),
+        'server': dict(server, max_in_flight=after['max_in_flight']),
+    }
+
+
+def print_table(results):
+    print(f"{'变体':<40} {'秒':>8} {'完成':>5} {'失败':>5} {'文件':>6} {'MB':>8} {'文件/秒':>8} "
+          f"{'请求':>7} {'429':>5} {'503':>5} {'302':>5}")
+    for r in results:
+        s = r['server']
+        print(f"{r['variant'][:40]:<40} {r['seconds']:>8.1f} {r['done']:>5} {r['failed']:>5} {r['files']:>6} "
+              f"{r['bytes'] / 1024 ** 2:>8.1f} {r['files_per_s']:>8.2f} {s['requests']:>7} "
+              f"{s['throttled']:>5} {s['errors']:>5} {s['redirects']:>5}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='用本地替身服务器压测 wayback_main.py')
+    parser.add_argument('--variant', action='append', default=None,
+                        help='追加给 wayback_main.py 的参数，可重复（默认只跑一次默认参数）')
+    parser.add_argument('--repeat', type=int, default=1, help='每个变体运行次数')
+    parser.add_argument('--domains', type=int, default=20, help='合成语料的域名数（默认 20）')
+    parser.add_argument('--timeout', type=float, default=1800, help='单次运行的超时（秒）')
+    parser.add_argument('--output', default='benchmark.json', help='结果 JSON')
+    parser.add_argument('--keep', action='store_true', help='保留每次运行的工作目录')
+    parser.add_argument('--server-url', default=None, help='使用已经启动的替身服务器，而不是新启动一个')
+    args, server_args = parser.parse_known_args()
+    # 其余参数（--latency、--throttle-rate、--redirect-rate 等）原样交给 fake_archive
+
+    process = None
+    if args.server_url:
+        base_url = args.server_url.rstrip('/')
+    else:
+        process, base_url = start_server(free_port(), ['--domains', str(args.domains)] + server_args)
+    domains_file = os.path.abspath(f"benchmark_domains_{args.domains}.txt")
+    with open(domains_file, 'w', encoding='utf-8') as f:
+        f.write("\n".join(synthetic_domains(args.domains)) + "\n")
+
+    results = []
+    try:
+        for variant in args.variant or ['']:
+            for _ in range(args.repeat):
+                result = run_variant(variant, domains_file, base_url, args.timeout, args.keep)
+                print(f"⏱️ {result['variant']}: {result['seconds']} 秒，完成 {result['done']}，"
+                      f"失败 {result['failed']}，{result['files']} 个文件")
+                results.append(result)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        os.remove(domains_file)
+    print_table(results)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'server_args': server_args, 'domains': args.domains, 'results': results}, f,
+                  ensure_ascii=False, indent=2)
+    print(f"✅ 结果已保存至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
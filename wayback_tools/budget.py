@@ -0,0 +1,71 @@
+"""
+单个域名一次下载的预算上限：文件数、字节数、耗时。
+
+不用 -sl 或过滤条件宽松时，少数域名会展开成几十万个快照，一个 worker 被占住几个小时，
+磁盘也被它们吃掉。DomainBudget 在每次下载开始时新建：Python 引擎开始每个文件前 reserve()，
+Ruby 下载器按输出中保存的文件 add()，还有文件没处理时检查 exceeded(upcoming=1)。超出任一上限后不再开始新文件
+（Ruby 下载器被结束，不完整的文件删除），域名记为 capped（而不是失败）。--continue-capped 把它们以低优先级重新排队，
+下次运行在所有正常域名之后接着下载（已存在的文件跳过），每次续传同样受预算限制。
+"""
+
+import threading
+import time
+
+
+class DomainBudget:
+    def __init__(self, max_files=0, max_bytes=0, max_seconds=0):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.files = 0
+        self.bytes = 0
+        self.reserved = 0
+        self.started_at = time.time()
+        self.reason = None
+        self._lock = threading.Lock()
+
+    def _check(self, upcoming):
+        """upcoming 为接下来还要开始的文件数；没有剩下的文件时，恰好用完文件数或字节数预算不算超出"""
+        if self.reason is None:
+            if self.max_files and upcoming and self.files + self.reserved + upcoming > self.max_files:
+                self.reason = f"文件数达到上限 {self.max_files}"
+            elif self.max_bytes and upcoming and self.bytes >= self.max_bytes:
+                self.reason = f"字节数达到上限 {self.max_bytes}"
+            elif self.max_seconds and time.time() - self.started_at >= self.max_seconds:
+                self.reason = f"耗时达到上限 {self.max_seconds:.0f} 秒"
+        return self.reason is not None
+
+    def exceeded(self, upcoming=0):
+        """
+        超出任一上限时返回 True，原因记在 reason 中（第一次超出的原因）。
+        Ruby 下载器还有文件没处理时传 upcoming=1：已保存的文件数达到 max_files 即算超出；
+        不传时只有耗时上限会触发，最后一个文件恰好用完预算的域名照常完成。
+        """
+        with self._lock:
+            return self._check(upcoming)
+
+    def reserve(self):
+        """
+        并发下载时在开始每个文件前调用：未超出上限时占一个文件名额并返回 True。
+        正在下载的文件也计入文件数上限，并发再高保存的文件数也不会超过 max_files。
+        """
+        with self._lock:
+            if self._check(1):
+                return False
+            self.reserved += 1
+            return True
+
+    def add(self, files=1, size=0, reserved=False):
+        """记录保存的文件；reserved 为 True 时同时归还 reserve() 占用的名额（下载失败时 files=0）"""
+        with self._lock:
+            if reserved:
+                self.reserved -= 1
+            self.files += files
+            self.bytes += size
+
+
+def budget_from(caps):
+    """caps 为 {'max_files', 'max_bytes', 'max_seconds'}（值为 0 表示不限），全部为 0 或 None 时返回 None"""
+    if not caps or not any(caps.values()):
+        return None
+    return DomainBudget(**caps)
@@ -0,0 +1,136 @@
+"""
+调度前的域名规范化与别名合并。
+
+clean_url 只去掉协议头并转小写，www.foo.com、foo.com/、foo.com:80 和中文域名的
+Unicode/punycode 两种写法会变成不同的任务、不同的 websites/ 目录，重复请求归档。
+canonical_domain 把这些写法归为同一个规范名：
+    去掉协议、用户信息、默认端口（80/443）、查询串、末尾的 / 和 .，去掉开头的 www./www2.，
+    国际化域名转为 punycode（xn--...）。
+AliasMap 把规范名映射到实际使用的任务名：已有 websites/ 目录或已有任务的写法优先，
+这样旧目录和已完成的任务会被复用；所有见过的写法记在任务状态库的 aliases 表中。
+
+collapse_redirects 额外查询 CDX：某个域名主页最近一次归档是重定向（3xx），且目标是
+列表中的另一个域名时，把它并入目标域名。
+"""
+
+import asyncio
+import os
+import re
+
+import aiohttp
+
+from wayback_tools.cdx_client import WAYBACK_BASE_URL, CDXClient
+from wayback_tools.job_store import PENDING
+
+_SCHEME = re.compile(r'^[a-z][a-z0-9+.-]*://')
+_WWW = re.compile(r'^www\d*\.(?=[^.]+\.)')
+_DEFAULT_PORT = re.compile(r':(?:80|443)$')
+_ARCHIVED_PREFIX = re.compile(r'^(?:https?://[^/]+)?/web/\d{1,14}(?:[a-z]{2}_)?/')
+
+
+def canonical_domain(value):
+    """规范名：主机（punycode，无 www. 和默认端口）加上非空路径"""
+    value = str(value).strip().lower()
+    value = _SCHEME.sub('', value)
+    value = re.split(r'[?#]', value, 1)[0]
+    host, _, path = value.partition('/')
+    host = _DEFAULT_PORT.sub('', host.rsplit('@', 1)[-1]).strip('.')
+    host = _WWW.sub('', host)
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
+    path = path.rstrip('/')
+    return f"{host}/{path}" if path else host
+
+
+class AliasMap:
+    """
+    规范名 -> 任务名。任务名优先用任务状态库中已有的写法，其次是 base_dir 下已有的目录名
+    （名字本身就是规范名的目录优先），都没有时用规范名本身。
+    resolve 可直接作为 iter_domains 的 normalize 参数。
+    """
+
+    def __init__(self, store, base_dir="websites", flush_every=1000):
+        self.store = store
+        self.flush_every = flush_every
+        self.merged = 0
+        self._pending = []
+        folders = {}
+        if os.path.isdir(base_dir):
+            for name in os.listdir(base_dir):
+                if os.path.isdir(os.path.join(base_dir, name)):
+                    canonical = canonical_domain(name)
+                    if canonical not in folders or name == canonical:
+                        folders[canonical] = name
+        self.primary = {}
+        for domain, _state in store.all_domains():
+            self.primary.setdefault(canonical_domain(domain), domain)
+        for canonical, name in folders.items():
+            self.primary.setdefault(canonical, name)
+        self._known = store.aliases()
+
+    def resolve(self, value):
+        spelling = _SCHEME.sub('', str(value).strip().lower()).rstrip('/')
+        if spelling in self._known:
+            return self._known[spelling]
+        canonical = canonical_domain(spelling)
+        if not canonical:
+            return None
+        domain = self.primary.setdefault(canonical, canonical)
+        if spelling != domain:
+            self.merged += 1
+            self._known[spelling] = domain
+            self._pending.append((spelling, domain))
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+        return domain
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self.store.add_aliases(pending)
+
+
+async def _redirect_targets(domains, concurrency, cache, rate_limiter, base_url):
+    client = CDXClient(base_url, concurrency=concurrency, all_statuses=True, cache=cache, rate_limiter=rate_limiter,
+                       fields=("timestamp", "original", "statuscode"), collapse="statuscode")
+    targets = {}
+    async with client, aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+        async def one(domain):
+            try:
+                rows = await client.fetch_page(domain)
+                if not rows or not rows[-1][2].startswith('3'):
+                    return
+                timestamp, original = rows[-1][0], rows[-1][1]
+                if rate_limiter:
+                    await rate_limiter.acquire_async()
+                async with session.get(f"{base_url}/web/{timestamp}id_/{original}", allow_redirects=False) as resp:
+                    location = resp.headers.get('Location')
+                if location:
+                    target = canonical_domain(_ARCHIVED_PREFIX.sub('', location)).split('/')[0]
+                    if target and target != canonical_domain(domain):
+                        targets[domain] = target
+            except Exception as e:
+                print(f"⚠️ 查询重定向失败: {domain}，错误信息: {e}")
+
+        await asyncio.gather(*(one(domain) for domain in domains))
+    return targets
+
+
+def collapse_redirects(store, concurrency=8, cache=None, rate_limiter=None, base_url=WAYBACK_BASE_URL):
+    """
+    对 pending 的域名查询主页最近一次归档是否重定向到列表中的另一个域名，
+    是则把它并入目标域名（删除 pending 任务并记为别名）。返回合并的数量。
+    """
+    pending = store.domains(PENDING)
+    by_canonical = {}
+    for domain, _state in store.all_domains():
+        by_canonical.setdefault(canonical_domain(domain), domain)
+    targets = asyncio.run(_redirect_targets(pending, concurrency, cache, rate_limiter, base_url))
+    merged = 0
+    for domain, target in targets.items():
+        primary = by_canonical.get(target)
+        if primary and primary != domain and store.merge_alias(domain, primary):
+            print(f"🔀 {domain} 重定向到 {primary}，已合并")
+            merged += 1
+    return merged
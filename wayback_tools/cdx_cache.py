@@ -0,0 +1,152 @@
+"""
+CDX 响应的持久化磁盘缓存。
+
+以 url + 查询参数（from/to、filter、collapse、page 等）的哈希作为键，
+每页解析后的行存为一个 JSON 文件，元数据放在 SQLite 索引中，
+支持 TTL 过期与按总大小的 LRU 淘汰。
+另外为每次列表查询记录游标（总页数、最后一个连续成功的页），
+中断的列表查询重跑时可以从缓存续上，已完成的列表完全不再访问网络。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CDXCache:
+    def __init__(self, cache_dir="cdx_cache", ttl=7 * 86400, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"),
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                size INTEGER,
+                created_at REAL,
+                accessed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed_at);
+            CREATE TABLE IF NOT EXISTS cursors (
+                listing_key TEXT PRIMARY KEY,
+                url TEXT,
+                page_count INTEGER,
+                last_page INTEGER DEFAULT -1,
+                complete INTEGER DEFAULT 0,
+                updated_at REAL
+            );
+        """)
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    @staticmethod
+    def make_key(url, params):
+        """url 与参数（顺序无关）的内容哈希"""
+        canonical = json.dumps([url, sorted([str(k), str(v)] for k, v in params)])
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key):
+        """命中且未过期时返回缓存的行列表，否则返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT created_at FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[0] > self.ttl:
+                self._remove(key)
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key))
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._remove(key)
+            return None
+
+    def put(self, key, url, rows):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self._total_bytes += size - (old[0] if old else 0)
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                             (key, url, size, now, now))
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict_lru()
+
+    def _remove(self, key):
+        row = self._db.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._total_bytes -= row[0]
+        self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_lru(self):
+        """按最近访问时间淘汰，直到总大小回到上限的 90% 以下"""
+        target = self.max_bytes * 0.9
+        for (key,) in self._db.execute("SELECT key FROM pages ORDER BY accessed_at").fetchall():
+            if self._total_bytes <= target:
+                break
+            self._remove(key)
+
+    def evict_expired(self):
+        if not self.ttl:
+            return 0
+        with self._lock:
+            expired = self._db.execute("SELECT key FROM pages WHERE created_at < ?",
+                                       (time.time() - self.ttl,)).fetchall()
+            for (key,) in expired:
+                self._remove(key)
+            self._db.execute("DELETE FROM cursors WHERE updated_at < ?", (time.time() - self.ttl,))
+        return len(expired)
+
+    def get_cursor(self, listing_key):
+        """返回 {'page_count', 'last_page', 'complete'}，没有记录时返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT page_count, last_page, complete, updated_at FROM cursors WHERE listing_key = ?",
+                (listing_key,)).fetchone()
+        if row is None or (self.ttl and time.time() - row[3] > self.ttl):
+            return None
+        return {'page_count': row[0], 'last_page': row[1], 'complete': bool(row[2])}
+
+    def set_cursor(self, listing_key, url, page_count=None, last_page=None, complete=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO cursors (listing_key, url, updated_at) VALUES (?, ?, ?)",
+                (listing_key, url, time.time()))
+            if page_count is not None:
+                self._db.execute("UPDATE cursors SET page_count = ? WHERE listing_key = ?",
+                                 (page_count, listing_key))
+            if last_page is not None:
+                self._db.execute("UPDATE cursors SET last_page = ? WHERE listing_key = ?",
+                                 (last_page, listing_key))
+            if complete is not None:
+                self._db.execute("UPDATE cursors SET complete = ? WHERE listing_key = ?",
+                                 (int(complete), listing_key))
+            self._db.execute("UPDATE cursors SET updated_at = ? WHERE listing_key = ?",
+                             (time.time(), listing_key))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,279 @@
+"""
+基于 asyncio 的 Wayback CDX 快照列表客户端。
+
+与 ArchiveAPI#get_raw_list_from_api 的参数保持一致，但：
+  * 先通过 showNumPages 拿到总页数，再并发抓取各页；
+  * 所有请求复用同一个 keep-alive 连接池；
+  * 按行流式解析 JSON，不必等整页下载完再 JSON.parse；
+  * 可选的 CDXCache 磁盘缓存：已抓取的页与分页游标在重跑时直接复用；
+  * 429/5xx/超时按带抖动的指数退避重试，并可与其他 worker 共享一个令牌桶限速。
+"""
+
+import asyncio
+import json
+import os
+
+import aiohttp
+
+from wayback_tools.retry import RETRYABLE, backoff_delay, classify_exception, retry_after_seconds
+
+ARCHIVE_URL = "https://web.archive.org"
+# 设置 WAYBACK_BASE_URL 环境变量可把所有请求指向本地替身服务器（见 fake_archive）
+WAYBACK_BASE_URL = os.environ.get("WAYBACK_BASE_URL", ARCHIVE_URL).rstrip('/')
+CDX_PATH = "/cdx/search/xd"
+
+
+def parse_json_row(line):
+    """解析 CDX output=json 的单行，如 '["2009...","http://..."],'，无法解析时返回 None"""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+    line = line.strip().rstrip(',')
+    if line.startswith('[['):
+        line = line[1:]
+    if line.endswith(']]'):
+        line = line[:-1]
+    if not line or line in ('[', ']'):
+        return None
+    try:
+        row = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return row if isinstance(row, list) and row else None
+
+
+def iter_json_rows(lines, fields):
+    """逐行解析 CDX 响应并跳过表头行"""
+    header = list(fields)
+    for line in lines:
+        row = parse_json_row(line)
+        if row is None or row == header:
+            continue
+        yield row
+
+
+class CDXClient:
+    """
+    并发 CDX 客户端，用法：
+
+        async with CDXClient(from_timestamp=2009) as client:
+            async for timestamp, original in client.iter_snapshots("example.com"):
+                ...
+    """
+
+    def __init__(self, base_url=WAYBACK_BASE_URL, concurrency=8, timeout=120,
+                 from_timestamp=None, to_timestamp=None, all_statuses=False,
+                 fields=("timestamp", "original"), collapse="digest", cache=None,
+                 rate_limiter=None, retries=4):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.from_timestamp = from_timestamp
+        self.to_timestamp = to_timestamp
+        self.all_statuses = all_statuses
+        self.fields = tuple(fields)
+        self.collapse = collapse
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retries = retries
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=self.timeout),
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    def parameters_for_api(self, page_index=None):
+        """与 Ruby 版 parameters_for_api 相同的查询参数"""
+        parameters = [("fl", ",".join(self.fields)), ("gzip", "false")]
+        if self.collapse:
+            parameters.insert(1, ("collapse", self.collapse))
+        if not self.all_statuses:
+            parameters.append(("filter", "statuscode:200"))
+        if self.from_timestamp:
+            parameters.append(("from", str(self.from_timestamp)))
+        if self.to_timestamp:
+            parameters.append(("to", str(self.to_timestamp)))
+        if page_index is not None:
+            parameters.append(("page", str(page_index)))
+        return parameters
+
+    def request_params(self, url, page_index=None):
+        return [("output", "json"), ("url", url)] + self.parameters_for_api(page_index)
+
+    async def get_page_count(self, url):
+        """通过 showNumPages=true 获取分页总数"""
+        params = [("url", url), ("showNumPages", "true")] + [
+            p for p in self.parameters_for_api() if p[0] != "fl"
+        ]
+        key = self.cache.make_key(url, params) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0]
+
+        async def read_text(resp):
+            return (await resp.text()).strip()
+
+        text = await self._get(params, read_text)
+        try:
+            count = int(text)
+        except ValueError:
+            return 0
+        if key:
+            self.cache.put(key, url, [count])
+        return count
+
+    async def fetch_page(self, url, page_index=None, on_row=None):
+        """抓取一页并边下载边解析；on_row 不为空时逐行回调。返回整页行列表"""
+        params = self.request_params(url, page_index)
+        key = self.cache.make_key(url, params) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if on_row:
+                    for row in cached:
+                        on_row(row)
+                return cached
+
+        rows = []
+        header = list(self.fields)
+
+        async def read_rows(resp):
+            # 重试时跳过上一次已经回调过的行，避免重复产出
+            seen = 0
+            async for line in resp.content:
+                row = parse_json_row(line)
+                if row is None or row == header:
+                    continue
+                seen += 1
+                if seen <= len(rows):
+                    continue
+                if on_row:
+                    on_row(row)
+                rows.append(row)
+
+        await self._get(params, read_rows)
+        if key:
+            self.cache.put(key, url, rows)
+        return rows
+
+    async def _get(self, params, consume):
+        """发出一次 CDX 请求并交给 consume(resp) 处理；可重试错误按指数退避重试"""
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            try:
+                async with self._semaphore:
+                    async with self._session.get(self.base_url + CDX_PATH, params=params) as resp:
+                        if resp.status == 429 and self.rate_limiter:
+                            self.rate_limiter.pause(retry_after_seconds(resp.headers) or backoff_delay(attempt))
+                        resp.raise_for_status()
+                        return await consume(resp)
+            except Exception as e:
+                if attempt > self.retries or classify_exception(e) != RETRYABLE:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+
+    async def iter_snapshots(self, url, maximum_pages=100, exact_url=False):
+        """
+        异步产出 url 的全部快照行：先查精确 url，再并发抓取 url/* 的各分页。
+        各页的行在到达时即被产出，不保证页间顺序。
+        """
+        queue = asyncio.Queue()
+        done = object()
+        listing_key = None
+        if self.cache:
+            listing_key = self.cache.make_key(url, self.parameters_for_api() + [
+                ("exact_url", exact_url), ("maximum_pages", maximum_pages)])
+
+        def cached_listing(prefix, page_count):
+            """游标标记为完成的列表：全部页都在缓存中时返回所有行，有页被淘汰时返回 None"""
+            rows = []
+            keys = [self.cache.make_key(url, self.request_params(url))]
+            if not exact_url:
+                keys += [self.cache.make_key(prefix, self.request_params(prefix, i)) for i in range(page_count or 0)]
+            for key in keys:
+                page = self.cache.get(key)
+                if page is None:
+                    return None
+                rows.extend(page)
+            return rows
+
+        async def fetch_pages(prefix, cursor):
+            if cursor and cursor['page_count'] is not None:
+                pages = cursor['page_count']
+            else:
+                pages = min(await self.get_page_count(prefix), maximum_pages)
+                if listing_key:
+                    self.cache.set_cursor(listing_key, url, page_count=pages)
+
+            # 游标之前的页上次已全部取得，按顺序从缓存读出（被淘汰的页由 fetch_page 重新抓取），
+            # 只有之后的页并发请求
+            start = min(cursor['last_page'] + 1, pages) if cursor else 0
+            for i in range(start):
+                await self.fetch_page(prefix, i, queue.put_nowait)
+
+            finished = set()
+            last_good = [start - 1]
+
+            async def fetch_one(i):
+                await self.fetch_page(prefix, i, queue.put_nowait)
+                finished.add(i)
+                while last_good[0] + 1 in finished:
+                    last_good[0] += 1
+                if listing_key:
+                    self.cache.set_cursor(listing_key, url, last_page=last_good[0])
+
+            await asyncio.gather(*(fetch_one(i) for i in range(start, pages)))
+
+        async def produce():
+            try:
+                prefix = url.rstrip('/') + '/*'
+                cursor = self.cache.get_cursor(listing_key) if listing_key else None
+                if cursor and cursor['complete']:
+                    rows = cached_listing(prefix, cursor['page_count'])
+                    if rows is not None:
+                        for row in rows:
+                            queue.put_nowait(row)
+                        return
+                    self.cache.set_cursor(listing_key, url, complete=False)
+                await self.fetch_page(url, None, queue.put_nowait)
+                if not exact_url:
+                    await fetch_pages(prefix, cursor)
+                if listing_key:
+                    self.cache.set_cursor(listing_key, url, complete=True)
+            finally:
+                queue.put_nowait(done)
+
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                row = await queue.get()
+                if row is done:
+                    break
+                yield row
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+
+
+async def _collect(url, maximum_pages, exact_url, **client_kwargs):
+    async with CDXClient(**client_kwargs) as client:
+        return [row async for row in client.iter_snapshots(url, maximum_pages, exact_url)]
+
+
+def list_snapshots(url, maximum_pages=100, exact_url=False, **client_kwargs):
+    """同步封装：返回 url 的全部快照行列表，供 wayback_main.py 等同步代码调用"""
+    return asyncio.run(_collect(url, maximum_pages, exact_url, **client_kwargs))
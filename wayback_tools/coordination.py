@@ -0,0 +1,233 @@
+"""
+多台机器（共享同一文件系统）分摊同一份域名列表。
+
+每个节点定期在 <coord>/nodes/<node_id>.json 写心跳，心跳未过期的节点组成一致性哈希环，
+域名只由环上对应的节点下载；节点崩溃后心跳过期，它负责的域名自动落到其他节点上，
+其余域名的归属不变。
+
+下载前在 <coord>/leases/<domain>.lease 用 O_CREAT|O_EXCL 原子地创建租约，心跳线程
+定期续期；租约过期（持有者崩溃）后可被其他节点接管。域名完成或失败后租约改写为
+不过期的 done/failed 记录，其他节点据此同步自己的任务状态库。
+
+SQLite 不适合放在网络文件系统上，所以每个节点使用自己的任务状态库，
+节点之间只通过这些小文件协调。
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """一致性哈希环，每个节点放 vnodes 个虚拟节点使分布均匀"""
+
+    def __init__(self, nodes, vnodes=64):
+        self.nodes = sorted(nodes)
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [key for key, _node in self._ring]
+
+    def node_for(self, domain):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, _hash(domain)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class Coordinator:
+    def __init__(self, coord_dir="coord", node_id=None, lease_ttl=300, vnodes=64):
+        self.coord_dir = coord_dir
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.vnodes = vnodes
+        self.nodes_dir = os.path.join(coord_dir, "nodes")
+        self.leases_dir = os.path.join(coord_dir, "leases")
+        os.makedirs(self.nodes_dir, exist_ok=True)
+        os.makedirs(self.leases_dir, exist_ok=True)
+        self._held = set()
+        self._lock = threading.Lock()
+        self._ring = None
+        self._ring_at = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # ---- 节点心跳与哈希环 ----
+
+    def heartbeat(self):
+        """
+        写心跳并为持有的租约续期。续期前重新读取租约：已改写为 done/failed，
+        或过期后已被其他节点接管的租约不再续期，并从持有列表中移除。
+        """
+        now = time.time()
+        _write_json(os.path.join(self.nodes_dir, f"{self.node_id}.json"),
+                    {'node_id': self.node_id, 'host': socket.gethostname(), 'pid': os.getpid(), 'updated_at': now})
+        with self._lock:
+            for domain in list(self._held):
+                info = self.lease_info(domain)
+                if not info or info.get('state') != LEASED or info.get('node_id') != self.node_id:
+                    self._held.discard(domain)
+                    if info and info.get('state') == LEASED:
+                        print(f"⚠️ {domain} 的租约已过期并被节点 {info.get('node_id')} 接管")
+                    continue
+                _write_json(self._lease_path(domain),
+                            {'node_id': self.node_id, 'state': LEASED, 'expires_at': now + self.lease_ttl})
+
+    def live_nodes(self):
+        now = time.time()
+        nodes = []
+        for name in os.listdir(self.nodes_dir):
+            if not name.endswith('.json'):
+                continue
+            info = _read_json(os.path.join(self.nodes_dir, name))
+            if info and info.get('updated_at', 0) + self.lease_ttl > now:
+                nodes.append(info['node_id'])
+        return nodes
+
+    def ring(self):
+        """心跳间隔内缓存哈希环，避免每个域名都列一次目录"""
+        now = time.time()
+        if self._ring is None or now - self._ring_at > self.lease_ttl / 3:
+            nodes = set(self.live_nodes())
+            nodes.add(self.node_id)
+            self._ring = HashRing(nodes, self.vnodes)
+            self._ring_at = now
+        return self._ring
+
+    def is_mine(self, domain):
+        return self.ring().node_for(domain) == self.node_id
+
+    def start(self):
+        """注册本节点，并启动心跳线程（每 lease_ttl/3 秒一次）"""
+        self.heartbeat()
+
+        def beat():
+            while not self._stopped.wait(self.lease_ttl / 3):
+                try:
+                    self.heartbeat()
+                except OSError as e:
+                    print(f"⚠️ 写入心跳失败: {e}")
+
+        self._thread = threading.Thread(target=beat, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止心跳并注销本节点，未完成的租约释放给其他节点"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            held = list(self._held)
+        for domain in held:
+            self.release(domain)
+        try:
+            os.remove(os.path.join(self.nodes_dir, f"{self.node_id}.json"))
+        except FileNotFoundError:
+            pass
+
+    # ---- 域名租约 ----
+
+    def _lease_path(self, domain):
+        return os.path.join(self.leases_dir, f"{domain}.lease")
+
+    def lease_info(self, domain):
+        return _read_json(self._lease_path(domain))
+
+    def acquire(self, domain):
+        """原子地获取域名租约；已被其他节点持有（未过期）或已完成时返回 False"""
+        path = self._lease_path(domain)
+        lease = {'node_id': self.node_id, 'state': LEASED, 'expires_at': time.time() + self.lease_ttl}
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._take_over_expired(path):
+                    return False
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(lease, f)
+            with self._lock:
+                self._held.add(domain)
+            return True
+        return False
+
+    def _take_over_expired(self, path):
+        """
+        过期租约先改名为墓碑再重新创建：同时接管的节点中只有一个能改名成功。
+        改名后发现拿到的其实是刚创建的新租约（竞争失败）时放回原处。
+        """
+        info = _read_json(path)
+        if info is None:
+            return True  # 已被删除或正在写入，重试创建
+        if info.get('state') != LEASED or info.get('expires_at', 0) > time.time():
+            return False
+        tombstone = f"{path}.{self.node_id}.{time.time():.6f}.expired"
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            return True
+        taken = _read_json(tombstone)
+        if taken and taken.get('state') == LEASED and taken.get('expires_at', 0) > time.time():
+            try:
+                os.link(tombstone, path)
+            except FileExistsError:
+                pass
+            os.remove(tombstone)
+            return False
+        os.remove(tombstone)
+        return True
+
+    def release(self, domain):
+        """放弃租约（例如域名被重新排队），其他节点可以立即领取"""
+        with self._lock:
+            self._held.discard(domain)
+            info = self.lease_info(domain)
+            if info and info.get('node_id') == self.node_id and info.get('state') == LEASED:
+                try:
+                    os.remove(self._lease_path(domain))
+                except FileNotFoundError:
+                    pass
+
+    def complete(self, domain, state, **fields):
+        """把租约改写为不过期的 done/failed 记录"""
+        with self._lock:
+            self._held.discard(domain)
+            _write_json(self._lease_path(domain),
+                        dict(fields, node_id=self.node_id, state=state, finished_at=time.time()))
+
+    def clear_failed(self):
+        """删除 failed 记录，使失败的域名可以在任意节点上重试"""
+        cleared = 0
+        for name in os.listdir(self.leases_dir):
+            if name.endswith('.lease'):
+                path = os.path.join(self.leases_dir, name)
+                info = _read_json(path)
+                if info and info.get('state') == FAILED:
+                    os.remove(path)
+                    cleared += 1
+        return cleared
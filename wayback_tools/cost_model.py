@@ -0,0 +1,126 @@
+"""
+下载前的成本估算与最大优先（LPT）排序。
+
+-sl -f 2009 模式下，一个域名的耗时主要由两部分组成：
+  * 列出 domain/* 的 CDX 分页（大站可达上百页）；
+  * 下载每年最新的主页（最多 2009 年至今每年一个文件）。
+只用一次 showNumPages 请求即可得到前者；--planner homepage 时一次精确 url 查询
+就能得到后者。估算结果存入任务状态库（estimates 表，并写入 priority），
+重跑时不再请求；CDX 响应本身也经过 CDXCache，实际下载时可直接复用。
+
+最大的域名先开始（LPT，Longest Processing Time first），尾部只剩小域名，
+多个 worker 的总完成时间（makespan）更短。
+"""
+
+import asyncio
+import heapq
+import time
+
+from wayback_tools.cdx_client import WAYBACK_BASE_URL, CDXClient
+from wayback_tools.planner import HOMEPAGE_COLLAPSE
+
+FROM_YEAR = 2009
+SECONDS_PER_PAGE = 3.0        # 一页 CDX 列表的大致耗时
+SECONDS_PER_FILE = 2.0        # 一个快照文件的大致耗时
+DEFAULT_FILE_BYTES = 100 * 1024
+
+
+def year_span():
+    return time.localtime().tm_year - FROM_YEAR + 1
+
+
+def cost_of(domain, planner, pages, files, file_bytes=DEFAULT_FILE_BYTES,
+            seconds_per_page=SECONDS_PER_PAGE, seconds_per_file=SECONDS_PER_FILE):
+    return {
+        'domain': domain,
+        'planner': planner,
+        'pages': pages,
+        'files': files,
+        'bytes': int(files * file_bytes),
+        'seconds': pages * seconds_per_page + files * seconds_per_file,
+    }
+
+
+async def _estimate_all(domains, planner, concurrency, cache, rate_limiter, base_url, on_error, **cost_kwargs):
+    if planner == 'homepage':
+        client = CDXClient(base_url, concurrency=concurrency, from_timestamp=FROM_YEAR, cache=cache,
+                           rate_limiter=rate_limiter, collapse=HOMEPAGE_COLLAPSE)
+    else:
+        client = CDXClient(base_url, concurrency=concurrency, from_timestamp=FROM_YEAR, cache=cache,
+                           rate_limiter=rate_limiter)
+    async with client:
+        async def one(domain):
+            try:
+                if planner == 'homepage':
+                    # 精确 url 查询本身就是全部的列表开销，按年份计数即得文件数
+                    rows = await client.fetch_page(domain)
+                    return cost_of(domain, planner, 1, len({row[0][:4] for row in rows}), **cost_kwargs)
+                pages = min(await client.get_page_count(domain.rstrip('/') + '/*'), 100)
+                # 与 -sl 相同：精确 url 一页加 domain/* 的各页；有快照时按每年一个主页估计
+                return cost_of(domain, planner, pages + 1, year_span() if pages else 0, **cost_kwargs)
+            except Exception as e:
+                on_error(domain, e)
+                return None
+
+        results = await asyncio.gather(*(one(domain) for domain in domains))
+    return [result for result in results if result is not None]
+
+
+def estimate_domains(domains, planner='full', concurrency=8, cache=None, rate_limiter=None,
+                     base_url=WAYBACK_BASE_URL, on_error=None, **cost_kwargs):
+    """并发估算一批域名，返回成本列表；估算失败的域名交给 on_error(domain, error) 并跳过"""
+    on_error = on_error or (lambda domain, e: print(f"⚠️ 估算失败: {domain}，错误信息: {e}"))
+    return asyncio.run(_estimate_all(list(domains), planner, concurrency, cache, rate_limiter, base_url,
+                                     on_error, **cost_kwargs))
+
+
+def lpt_makespan(seconds, workers):
+    """按从大到小依次分给当前负载最小的 worker，返回最后一个 worker 完成的时间"""
+    loads = [0.0] * max(1, int(workers))
+    for cost in sorted(seconds, reverse=True):
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}小时{minutes:02d}分" if hours else f"{minutes}分{secs:02d}秒"
+
+
+def print_plan(estimates, jobs, top=20):
+    """打印总量、LPT 预计耗时和最大的 top 个域名"""
+    if not estimates:
+        print("📐 没有待下载的域名")
+        return
+    ordered = sorted(estimates, key=lambda e: e['seconds'], reverse=True)
+    total_seconds = sum(e['seconds'] for e in ordered)
+    makespan = lpt_makespan([e['seconds'] for e in ordered], jobs)
+    print(f"📐 {len(ordered)} 个域名，约 {sum(e['pages'] for e in ordered)} 页 CDX 列表、"
+          f"{sum(e['files'] for e in ordered)} 个文件、{sum(e['bytes'] for e in ordered) / 1024 ** 2:.1f} MB")
+    print(f"⏱️ 单 worker 合计 {format_duration(total_seconds)}，{jobs} 个 worker 按最大优先约 {format_duration(makespan)}")
+    for e in ordered[:top]:
+        print(f"   {e['domain']}: {e['pages']} 页，{e['files']} 个文件，约 {format_duration(e['seconds'])}")
+
+
+def prepare_plan(store, jobs, planner='full', concurrency=8, cache=None, rate_limiter=None,
+                 base_url=WAYBACK_BASE_URL, refresh=False, top=20):
+    """
+    估算任务状态库中所有 pending 域名（已有估算的直接复用，refresh 时全部重算），
+    保存估算并按 LPT 写入优先级，打印计划，返回估算列表。
+    """
+    known, missing = store.pending_estimates(planner)
+    if refresh:
+        missing += [e['domain'] for e in known]
+        known = []
+    file_bytes = store.average_file_bytes() or DEFAULT_FILE_BYTES
+    if missing:
+        print(f"📐 估算 {len(missing)} 个域名的下载成本（{len(known)} 个已有估算）")
+        batch_size = 1000
+        for start in range(0, len(missing), batch_size):
+            estimates = estimate_domains(missing[start:start + batch_size], planner, concurrency, cache,
+                                         rate_limiter, base_url, file_bytes=file_bytes)
+            store.save_estimates(estimates)
+            known += estimates
+    print_plan(known, jobs, top)
+    return known
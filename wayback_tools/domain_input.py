@@ -0,0 +1,129 @@
+"""
+流式读取域名列表。
+
+支持 xlsx（openpyxl 只读逐行模式）、CSV、JSONL、纯文本以及标准输入（路径为 "-"），
+边读边用 clean_url 清洗、保持输入顺序去重，内存占用有上限；
+可以在后台线程中分批写入任务状态库，调度器无需等整个列表读完就能开始下载。
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+
+def clean_url(url):
+    url = url.strip()           # 去除首尾空格
+    url = url.lower()           # 全部转小写
+    url = url.replace('http://', '').replace('https://', '')  # 移除协议头
+    return url
+
+
+def _iter_xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(min_col=1, max_col=1, values_only=True)
+        next(rows, None)  # 与 pd.read_excel 一致，第一行是表头
+        for (value,) in rows:
+            yield value
+    finally:
+        workbook.close()
+
+
+def _iter_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # 第一行是表头
+        for row in reader:
+            if row:
+                yield row[0]
+
+
+def _iter_jsonl(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict):
+            item = item.get('domain') or item.get('url')
+        yield item
+
+
+def iter_raw_values(path):
+    """按文件类型逐条产出第一列的原始值"""
+    if path == '-':
+        yield from sys.stdin
+        return
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        yield from _iter_xlsx(path)
+    elif ext == '.csv':
+        yield from _iter_csv(path)
+    elif ext in ('.jsonl', '.ndjson'):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from _iter_jsonl(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from f
+
+
+class RecentSet:
+    """只记住最近 maxsize 个元素的集合，用于有界内存的流式去重"""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def add(self, item):
+        """元素是新的返回 True，最近出现过返回 False"""
+        if item in self._items:
+            self._items.move_to_end(item)
+            return False
+        self._items[item] = None
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return True
+
+
+def iter_domains(path, normalize=clean_url, window=100000):
+    """
+    逐个产出清洗后的域名，保持输入顺序。
+    去重只在最近 window 个域名内进行；写入任务状态库时由 domain 唯一约束保证完全去重。
+    """
+    recent = RecentSet(window)
+    for value in iter_raw_values(path):
+        if value is None:
+            continue
+        domain = normalize(str(value))
+        if domain and recent.add(domain):
+            yield domain
+
+
+class StoreFeeder(threading.Thread):
+    """后台线程：把域名流分批写入任务状态库，调度器可以同时开始领取"""
+
+    def __init__(self, store, domains, batch_size=200):
+        super().__init__(daemon=True)
+        self.store = store
+        self.domains = domains
+        self.batch_size = batch_size
+        self.read = 0
+        self.added = 0
+        self.error = None
+
+    def _counted(self):
+        for domain in self.domains:
+            self.read += 1
+            yield domain
+
+    def run(self):
+        try:
+            self.added = self.store.add_domains(self._counted(), batch_size=self.batch_size)
+        except Exception as e:
+            self.error = e
+            print(f"❌ 读取域名列表出错: {e}")
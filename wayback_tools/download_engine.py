@@ -0,0 +1,197 @@
+"""
+进程内的 Python 快照下载引擎。
+
+代替每个域名启动一次 Ruby 解释器：所有域名共用一个 requests.Session，
+keep-alive 连接池在域名之间复用，不再为每个线程重新握手 TLS。
+全局在途请求数有上限，响应体流式写入 <path>.part 后再改名，
+输出行与 Ruby 版格式相同（"url -> path (n/total)" / "url # error"），
+指标统计和日志无需区分两种下载路径。
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import unquote
+
+import requests
+
+from wayback_tools.cdx_client import ARCHIVE_URL, WAYBACK_BASE_URL
+from wayback_tools.retry import RETRYABLE, classify_exception
+from wayback_tools.verify import append_manifest
+
+_WINDOWS_UNSAFE = re.compile(r'[:*?&=<>\\|]')
+
+
+def snapshot_url(timestamp, file_url, raw=False, base_url=ARCHIVE_URL):
+    """raw=True 时使用 id_ 形式，返回归档时的原始响应体（不含 Wayback 工具栏和改写的链接）"""
+    return f"{base_url}/web/{timestamp}{'id_' if raw else ''}/{file_url}"
+
+
+def file_id_for(file_url, year=None):
+    """与 Ruby 版相同：file_url 去掉协议和主机后的部分；-sl 模式下以年份开头"""
+    file_id = '/'.join(file_url.split('/')[3:])
+    if year is not None:
+        file_id = f"{year}/{file_id}"
+    return unquote(file_id, errors='replace')
+
+
+def local_file_path(backup_path, file_id, file_url, timestamp):
+    """
+    与 Ruby 版 download_file 相同的保存路径，返回 (dir_path, file_path)。
+    backup_path 以 '/' 结尾，如 'websites/example.com/'。
+    """
+    # Ruby 的 split('/') 会丢掉末尾的空串
+    elements = file_id.split('/')
+    while elements and elements[-1] == '':
+        elements.pop()
+    if file_id == "":
+        dir_path = backup_path
+        file_path = backup_path + 'index.html'
+    elif file_url.endswith('/') or '.' not in elements[-1]:
+        dir_path = backup_path + '/'.join(elements)
+        file_path = backup_path + '/'.join(elements) + '/' + timestamp + '_index.html'
+    else:
+        dir_path = backup_path + '/'.join(elements[:-1])
+        file_path = backup_path + '/'.join(elements)
+    if os.name == 'nt':
+        dir_path = _WINDOWS_UNSAFE.sub(lambda m: '%' + format(ord(m.group()), 'x'), dir_path)
+        file_path = _WINDOWS_UNSAFE.sub(lambda m: '%' + format(ord(m.group()), 'x'), file_path)
+    return dir_path, file_path
+
+
+def _describe_error(exc):
+    response = getattr(exc, 'response', None)
+    if isinstance(exc, requests.HTTPError) and response is not None:
+        return f"HTTP {response.status_code} {response.reason}"
+    return f"{type(exc).__name__}: {exc}"
+
+
+class DownloadEngine:
+    """
+    多个域名共享的下载引擎，线程安全。
+    pool_size 为连接池大小，max_in_flight 为所有域名合计的在途请求上限（默认等于 pool_size）。
+    传入 controller（AIMDController）时，在途上限改由控制器根据延迟和错误动态调整；
+    传入 redirect_cache（RedirectCache）时，曾经重定向过的快照地址直接请求最终地址。
+    """
+
+    def __init__(self, pool_size=60, max_in_flight=None, rate_limiter=None, raw=False,
+                 base_url=WAYBACK_BASE_URL, timeout=120, chunk_size=64 * 1024, controller=None,
+                 redirect_cache=None):
+        self.raw = raw
+        self.base_url = base_url
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.rate_limiter = rate_limiter
+        self.controller = controller
+        self.redirect_cache = redirect_cache
+        self._in_flight = controller or threading.BoundedSemaphore(max_in_flight or pool_size)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @contextmanager
+    def stream(self, url):
+        """限速并占用一个在途名额后发起 GET，错误状态抛出 requests.HTTPError"""
+        target = self.redirect_cache.resolve(url) if self.redirect_cache else url
+        with self._in_flight:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                with self.session.get(target, stream=True, timeout=self.timeout) as resp:
+                    latency = time.monotonic() - started
+                    resp.raise_for_status()
+                    if self.redirect_cache and resp.history:
+                        self.redirect_cache.record(url, resp.url, len(resp.history))
+                    yield resp
+            except Exception as e:
+                if self.controller and classify_exception(e) == RETRYABLE:
+                    self.controller.on_error()
+                if target != url and isinstance(e, requests.HTTPError):
+                    self.redirect_cache.forget(url)
+                raise
+            if self.controller:
+                self.controller.on_success(latency)
+
+    def fetch_to_file(self, url, file_path):
+        """流式写入 file_path.part，完整下载后原子改名，返回 (字节数, SHA1 十六进制)"""
+        part_path = file_path + '.part'
+        size = 0
+        sha1 = hashlib.sha1()
+        try:
+            with self.stream(url) as resp, open(part_path, 'wb') as f:
+                for chunk in resp.iter_content(self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        sha1.update(chunk)
+                        size += len(chunk)
+            if size:
+                os.replace(part_path, file_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return size, sha1.hexdigest()
+
+    def download_files(self, domain, file_list, concurrency, base_dir="websites", emit=print, budget=None):
+        """
+        下载一个域名的 curated 文件列表（[{'file_url', 'timestamp', 'file_id'}]），
+        已存在的文件跳过。每处理一个文件调用 emit(line)，格式与 Ruby 版输出相同。
+        budget 为 DomainBudget 时，超出上限后不再开始新文件，未开始的文件计入 skipped。
+        返回 {'files', 'bytes', 'skipped', 'errors': [(file_url, exception)]}。
+        """
+        backup_path = os.path.join(base_dir, domain) + '/'
+        total = len(file_list)
+        stats = {'files': 0, 'bytes': 0, 'skipped': 0, 'errors': []}
+        counter = {'processed': 0}
+        lock = threading.Lock()
+
+        def download(file_info):
+            file_url, timestamp = file_info['file_url'], file_info['timestamp']
+            dir_path, file_path = local_file_path(backup_path, file_info['file_id'], file_url, timestamp)
+            if os.path.exists(file_path):
+                with lock:
+                    counter['processed'] += 1
+                    emit(f"{file_url} # {file_path} already exists. ({counter['processed']}/{total})")
+                return
+            if budget and not budget.reserve():
+                with lock:
+                    stats['skipped'] += 1
+                return
+            size, error = 0, None
+            try:
+                os.makedirs(dir_path, exist_ok=True)
+                size, sha1 = self.fetch_to_file(snapshot_url(timestamp, file_url, self.raw, self.base_url),
+                                                file_path)
+                if size:
+                    # 与 Ruby 版一致，记录的是非 id_ 形式的快照地址
+                    with lock:
+                        with open(os.path.join(backup_path, f"{domain}.txt"), 'a', encoding='utf-8') as f:
+                            f.write(snapshot_url(timestamp, file_url) + "\n")
+                        append_manifest(backup_path, [{
+                            'path': file_path[len(backup_path):], 'size': size, 'sha1': sha1,
+                            'timestamp': timestamp, 'url': file_url}])
+            except Exception as e:
+                error = e
+            with lock:
+                counter['processed'] += 1
+                if error is not None:
+                    stats['errors'].append((file_url, error))
+                    emit(f"{file_url} # {_describe_error(error)}")
+                elif size:
+                    stats['files'] += 1
+                    stats['bytes'] += size
+                emit(f"{file_url} -> {file_path} ({counter['processed']}/{total})")
+            if budget:
+                budget.add(1 if size and error is None else 0, size, reserved=True)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            list(pool.map(download, file_list))
+        return stats
+
+    def close(self):
+        self.session.close()
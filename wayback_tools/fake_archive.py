@@ -0,0 +1,339 @@
+"""
+本地的 Wayback Machine 替身服务器，用于离线测试和压测下载路径。
+
+接口与 web.archive.org 相同：
+    /cdx/search/xd            CDX 查询（output=json、fl、collapse、filter、from/to、page、showNumPages）
+    /web/<ts>[xx_]/<url>      快照内容；非 id_ 形式像真实页面一样注入工具栏块，
+                              时间戳不精确时 302 到最近的快照
+    /stats                    服务器端计数（JSON）：请求数、429、503、重定向、字节数、最大并发
+语料可以按参数合成（固定随机种子，每次相同），也可以读取已下载的 websites/ 目录。
+可配置延迟、带宽、503/429 注入比例、并发上限（超出时返回 429）以及快照被"挪到"
+相邻时间戳的比例（请求 CDX 给出的时间戳时多一次 302）。
+
+用法：
+    python -m wayback_tools.fake_archive --port 8765 --domains 200 --latency 0.2 --throttle-rate 0.02
+    WAYBACK_BASE_URL=http://127.0.0.1:8765 python wayback_main.py --input domains.txt
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+
+from aiohttp import web
+
+FIRST_YEAR = 2009
+LAST_YEAR = 2024
+THIRD_PARTY_SCRIPTS = [
+    "http://www.googletagmanager.com/gtm.js",
+    "http://www.google-analytics.com/analytics.js",
+    "http://connect.facebook.net/en_US/fbevents.js",
+    "http://static.hotjar.com/c/hotjar.js",
+]
+FIELD_VALUES = {
+    'timestamp': lambda c: c['timestamp'],
+    'original': lambda c: c['original'],
+    'digest': lambda c: c['digest'],
+    'statuscode': lambda c: "200",
+    'mimetype': lambda c: c['mimetype'],
+    'length': lambda c: str(c['length']),
+}
+_SNAPSHOT_PATH = re.compile(r'^(\d{1,14})([a-z]{2}_)?/(.+)$')
+_TOOLBAR_HEAD = (b'<script src="//archive.org/includes/analytics.js?v=cf34f82" type="text/javascript"></script>\n'
+                 b'<script type="text/javascript" src="/_static/js/bundle-playback.js?v=1B2M2Y8A"></script>\n'
+                 b'<!-- End Wayback Rewrite JS Include -->\n')
+_TOOLBAR_BODY = (b'<!-- BEGIN WAYBACK TOOLBAR INSERT -->\n<div id="wm-ipp-base" style="display:none">'
+                 + b'x' * 2048 + b'</div>\n<!-- END WAYBACK TOOLBAR INSERT -->\n')
+
+
+def synthetic_domains(count):
+    """合成语料的域名列表，压测脚本用它生成输入文件"""
+    return [f"site{i}.example" for i in range(count)]
+
+
+def url_key(url):
+    """近似 CDX 的 SURT 规范化：忽略协议、www.、:80 和末尾的 /"""
+    url = re.sub(r'^https?://', '', url.strip().lower())
+    host, _, path = url.partition('/')
+    host = host.split(':')[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    return f"{host}/{path.rstrip('/')}"
+
+
+def cdx_digest(body):
+    """CDX 的 digest 是 SHA1 的 base32"""
+    return base64.b32encode(hashlib.sha1(body).digest()).decode('ascii')
+
+
+def synthetic_body(host, path, version, size):
+    """按 (host, path, version) 确定的页面内容，version 相同的快照内容相同（可测试去重）"""
+    seed = hashlib.sha1(f"{host}|{path}|{version}".encode('utf-8')).hexdigest()
+    if path.endswith('.js'):
+        head = f"/* {host}{path} build {version} */\n".encode('utf-8')
+        return head + (f"var _{seed[:8]}=1;\n" * max(1, size // 16)).encode('utf-8')
+    rng = random.Random(seed)
+    scripts = "".join(f'<script async src="{url}"></script>\n'
+                      for url in THIRD_PARTY_SCRIPTS if rng.random() < 0.5)
+    head = (f"<!DOCTYPE html>\n<html>\n<head>\n<title>{host}</title>\n{scripts}</head>\n<body>\n"
+            f"<h1>{host} {version}</h1>\n<a href=\"/about.html\">about</a>\n").encode('utf-8')
+    filler = (f"<p>{seed}</p>\n" * max(1, (size - len(head)) // 48)).encode('utf-8')
+    return head + filler + b"</body>\n</html>\n"
+
+
+class Corpus:
+    """所有快照：按 url_key 分组，每组按时间戳排序"""
+
+    def __init__(self):
+        self.by_key = {}
+        self.by_host = {}
+
+    def add(self, original, timestamp, body=None, path=None, mimetype="text/html", moved=False):
+        if body is None:
+            with open(path, 'rb') as f:
+                body_bytes = f.read()
+        else:
+            body_bytes = body
+        key = url_key(original)
+        capture = {
+            'key': key,
+            'original': original,
+            'timestamp': timestamp,
+            'digest': cdx_digest(body_bytes),
+            'length': len(body_bytes),
+            'mimetype': mimetype,
+            'body': body,
+            'path': path,
+            # 被"挪到"下一秒的快照：请求 CDX 时间戳时先 302 一次
+            'served_at': str(int(timestamp) + 1) if moved else timestamp,
+        }
+        self.by_key.setdefault(key, []).append(capture)
+        self.by_host.setdefault(key.split('/')[0], []).append(capture)
+
+    def finish(self):
+        for captures in list(self.by_key.values()) + list(self.by_host.values()):
+            captures.sort(key=lambda c: (c['key'], c['timestamp']))
+
+    def body_of(self, capture):
+        if capture['body'] is not None:
+            return capture['body']
+        with open(capture['path'], 'rb') as f:
+            return f.read()
+
+    def nearest(self, key, timestamp):
+        captures = self.by_key.get(key)
+        if not captures:
+            return None
+        target = int(timestamp.ljust(14, '0'))
+        return min(captures, key=lambda c: abs(int(c['served_at']) - target))
+
+
+def build_synthetic(domains=100, pages=5, body_bytes=20000, seed=1, redirect_rate=0.0):
+    """
+    每个域名每年若干个主页快照（内容每两年变一次）和若干其他页面，页面数按帕累托分布，
+    少数域名特别大；外加几个被很多主页引用的第三方脚本。
+    """
+    rng = random.Random(seed)
+    corpus = Corpus()
+
+    def timestamp(year):
+        return f"{year}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}{rng.randint(0, 23):02d}" \
+               f"{rng.randint(0, 59):02d}{rng.randint(0, 58):02d}"
+
+    for host in synthetic_domains(domains):
+        extra_pages = min(pages * 20, int(pages * (rng.paretovariate(1.2) - 1)))
+        size = int(body_bytes * rng.uniform(0.5, 1.5))
+        for year in range(FIRST_YEAR, LAST_YEAR + 1):
+            for original in (f"http://{host}/", f"http://www.{host}:80/"):
+                if rng.random() < 0.6:
+                    corpus.add(original, timestamp(year), synthetic_body(host, '/', year // 2, size),
+                               moved=rng.random() < redirect_rate)
+            for i in range(extra_pages):
+                path = f"/page{i}.html"
+                corpus.add(f"http://{host}{path}", timestamp(year), synthetic_body(host, path, year, size // 2),
+                           moved=rng.random() < redirect_rate)
+    for url in THIRD_PARTY_SCRIPTS:
+        host, path = url.split('/', 3)[2], '/' + url.split('/', 3)[3]
+        for year in range(FIRST_YEAR, LAST_YEAR + 1):
+            corpus.add(url, timestamp(year), synthetic_body(host, path, year // 3, 30000),
+                       mimetype="application/javascript")
+    corpus.finish()
+    return corpus
+
+
+def load_recorded(base_dir="websites"):
+    """把已下载的 websites/<domain>/<year>/<ts>_index.html 作为各域名的主页快照"""
+    corpus = Corpus()
+    pattern = re.compile(r'^(\d{14})_index\.html$')
+    for domain in sorted(os.listdir(base_dir)):
+        domain_dir = os.path.join(base_dir, domain)
+        if not os.path.isdir(domain_dir):
+            continue
+        for root, _dirs, names in os.walk(domain_dir):
+            for name in names:
+                match = pattern.match(name)
+                if match:
+                    corpus.add(f"http://{domain}/", match.group(1), path=os.path.join(root, name))
+    corpus.finish()
+    return corpus
+
+
+class FakeArchive:
+    def __init__(self, corpus, latency=0.0, jitter=0.0, bandwidth=0, error_rate=0.0, throttle_rate=0.0,
+                 max_concurrency=0, page_size=50, seed=1):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.page_size = page_size
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'cdx': 0, 'snapshots': 0, 'redirects': 0, 'not_found': 0,
+                      'throttled': 0, 'errors': 0, 'bytes': 0, 'max_in_flight': 0}
+
+    def app(self):
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get('/cdx/search/xd', self.cdx)
+        app.router.add_get('/web/{tail:.*}', self.snapshot)
+        app.router.add_get('/stats', self.get_stats)
+        return app
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        """统一处理并发上限、429/503 注入和延迟；/stats 不受影响"""
+        if request.path == '/stats':
+            return await handler(request)
+        self.stats['requests'] += 1
+        self.in_flight += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+        try:
+            if (self.max_concurrency and self.in_flight > self.max_concurrency) or \
+                    self.rng.random() < self.throttle_rate:
+                self.stats['throttled'] += 1
+                return web.Response(status=429, text="Too Many Requests", headers={'Retry-After': '1'})
+            if self.rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return web.Response(status=503, text="Service Unavailable")
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.stats, in_flight=self.in_flight))
+
+    def query(self, url):
+        if url.endswith('*'):
+            prefix = url_key(url.rstrip('*'))
+            host = prefix.split('/')[0]
+            return [c for c in self.corpus.by_host.get(host, []) if c['key'].startswith(prefix.rstrip('/'))]
+        return self.corpus.by_key.get(url_key(url), [])
+
+    async def cdx(self, request):
+        self.stats['cdx'] += 1
+        q = request.query
+        rows = self.query(q.get('url', ''))
+        start, end = q.get('from'), q.get('to')
+        if start:
+            rows = [c for c in rows if c['timestamp'][:len(start)] >= start]
+        if end:
+            rows = [c for c in rows if c['timestamp'][:len(end)] <= end]
+        collapse = q.get('collapse')
+        if collapse:
+            field, _, length = collapse.partition(':')
+            value = FIELD_VALUES[field]
+            collapsed, previous = [], None
+            for c in rows:
+                current = value(c)[:int(length)] if length else value(c)
+                if current != previous:
+                    collapsed.append(c)
+                previous = current
+            rows = collapsed
+        if q.get('showNumPages') == 'true':
+            return web.Response(text=f"{math.ceil(len(rows) / self.page_size)}\n")
+        if 'page' in q:
+            page = int(q['page'])
+            rows = rows[page * self.page_size:(page + 1) * self.page_size]
+        fields = q.get('fl', 'timestamp,original').split(',')
+        if not rows:
+            return web.Response(text="[]\n", content_type='application/json')
+        lines = [json.dumps(fields)] + [json.dumps([FIELD_VALUES[f](c) for f in fields]) for c in rows]
+        return web.Response(text="[" + ",\n".join(lines) + "]\n", content_type='application/json')
+
+    async def snapshot(self, request):
+        self.stats['snapshots'] += 1
+        tail = request.match_info['tail']
+        if request.query_string:
+            tail += '?' + request.query_string
+        match = _SNAPSHOT_PATH.match(tail)
+        capture = match and self.corpus.nearest(url_key(match.group(3)), match.group(1))
+        if not capture:
+            self.stats['not_found'] += 1
+            return web.Response(status=404, text="Not Found")
+        timestamp, flag = match.group(1), match.group(2) or ''
+        if timestamp != capture['served_at']:
+            self.stats['redirects'] += 1
+            raise web.HTTPFound(f"/web/{capture['served_at']}{flag}/{capture['original']}")
+        body = self.corpus.body_of(capture)
+        if flag != 'id_' and capture['mimetype'] == 'text/html':
+            body = body.replace(b'<head>\n', b'<head>\n' + _TOOLBAR_HEAD, 1)
+            body = body.replace(b'<body>\n', b'<body>\n' + _TOOLBAR_BODY, 1)
+            body += (f"<!--\n     FILE ARCHIVED ON {timestamp} AND RETRIEVED FROM THE\n"
+                     f"     INTERNET ARCHIVE ON {timestamp}.\n-->\n").encode('utf-8')
+        response = web.StreamResponse(headers={'Content-Type': capture['mimetype']})
+        response.content_length = len(body)
+        await response.prepare(request)
+        chunk_size = 16 * 1024
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            await response.write(chunk)
+            self.stats['bytes'] += len(chunk)
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+        await response.write_eof()
+        return response
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地 Wayback Machine 替身服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--corpus', default=None, help='使用已下载的 websites/ 目录作为语料（默认合成语料）')
+    parser.add_argument('--domains', type=int, default=100, help='合成语料的域名数（默认 100）')
+    parser.add_argument('--pages', type=int, default=5, help='合成语料每个域名的平均非主页页面数（默认 5）')
+    parser.add_argument('--body-bytes', type=int, default=20000, help='合成页面的平均大小（默认 20000）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='额外的随机延迟上限（秒）')
+    parser.add_argument('--bandwidth', type=float, default=0, help='每个响应的带宽（字节/秒，0 不限）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的比例')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='返回 429 的比例')
+    parser.add_argument('--max-concurrency', type=int, default=0, help='超过该并发数时返回 429（0 不限）')
+    parser.add_argument('--redirect-rate', type=float, default=0.0, help='快照需要多一次 302 的比例')
+    parser.add_argument('--page-size', type=int, default=50, help='CDX 每页行数（默认 50）')
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_recorded(args.corpus)
+    else:
+        corpus = build_synthetic(args.domains, args.pages, args.body_bytes, args.seed, args.redirect_rate)
+    archive = FakeArchive(corpus, args.latency, args.jitter, args.bandwidth, args.error_rate, args.throttle_rate,
+                          args.max_concurrency, args.page_size, args.seed)
+    print(f"🗄️ {len(corpus.by_host)} 个主机、{sum(len(c) for c in corpus.by_key.values())} 个快照，"
+          f"监听 http://{args.host}:{args.port}")
+    web.run_app(archive.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+基于 SQLite 的下载任务状态库。
+
+每个域名一行，记录状态（pending/listing/downloading/done/failed/capped）、尝试次数、
+时间戳以及已下载的文件数与字节数。取代"websites/ 下目录存在即视为完成"的判断：
+崩溃中断的域名在下次启动时会被放回 pending，而不是被当成已完成。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from wayback_tools.verify import is_snapshot_file
+
+PENDING = "pending"
+LISTING = "listing"
+DOWNLOADING = "downloading"
+DONE = "done"
+FAILED = "failed"
+CAPPED = "capped"    # 超出单域名预算，已下载的部分保留，可用 continue_capped 低优先级续传
+
+STATES = (PENDING, LISTING, DOWNLOADING, DONE, FAILED, CAPPED)
+ACTIVE_STATES = (LISTING, DOWNLOADING)
+
+
+class JobStore:
+    def __init__(self, db_path="wayback_jobs.sqlite"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=30000")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                domain TEXT NOT NULL UNIQUE,
+                state TEXT NOT NULL DEFAULT 'pending',
+                priority INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                files INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL,
+                updated_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                next_attempt_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS jobs_pick ON jobs(state, priority DESC, id);
+            CREATE TABLE IF NOT EXISTS estimates (
+                domain TEXT PRIMARY KEY,
+                planner TEXT NOT NULL,
+                pages INTEGER NOT NULL,
+                files INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                estimated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                domain TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS plan (
+                domain TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                url TEXT NOT NULL,
+                year TEXT NOT NULL,
+                PRIMARY KEY (domain, timestamp, url)
+            ) WITHOUT ROWID;
+        """)
+        self._migrate()
+
+    def _migrate(self):
+        """给旧版本创建的库补上新增的列"""
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "next_attempt_at" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+
+    def _transaction(self, func):
+        """在 BEGIN IMMEDIATE 事务中执行 func(db)，多进程共享同一个库时也不会重复领取"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def add_domains(self, domains, batch_size=1000):
+        """批量加入域名（已存在的忽略），返回新加入的数量"""
+        inserted = 0
+        batch = []
+
+        def flush(db):
+            before = db.total_changes
+            now = time.time()
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (domain, created_at, updated_at) VALUES (?, ?, ?)",
+                [(d, now, now) for d in batch])
+            return db.total_changes - before
+
+        for domain in domains:
+            batch.append(domain)
+            if len(batch) >= batch_size:
+                inserted += self._transaction(flush)
+                batch = []
+        if batch:
+            inserted += self._transaction(flush)
+        return inserted
+
+    def claim_next(self):
+        """领取优先级最高、最早加入且已过退避时间的 pending 域名并置为 listing；没有时返回 None"""
+        def claim(db):
+            now = time.time()
+            row = db.execute(
+                "SELECT id, domain FROM jobs WHERE state = ? AND next_attempt_at <= ? "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (PENDING, now)).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ?, updated_at = ? "
+                "WHERE id = ?", (LISTING, now, now, row[0]))
+            return row[1]
+        return self._transaction(claim)
+
+    def iter_claims(self, wait=True, poll_interval=5.0, keep_waiting=None):
+        """
+        逐个领取 pending 域名，供调度器惰性消费。
+        wait 为 True 时，若仍有域名在退避中或正在下载（可能被重新排队），则等待而不是结束；
+        keep_waiting() 返回 True 时（例如输入列表仍在写入）也继续等待。
+        """
+        while True:
+            domain = self.claim_next()
+            if domain is not None:
+                yield domain
+                continue
+            if not wait:
+                return
+            with self._lock:
+                waiting = self._db.execute(
+                    "SELECT MIN(next_attempt_at) FROM jobs WHERE state = ?", (PENDING,)).fetchone()[0]
+                active = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", ACTIVE_STATES).fetchone()[0]
+            if waiting is None and not active and not (keep_waiting and keep_waiting()):
+                return
+            delay = poll_interval if waiting is None else waiting - time.time()
+            time.sleep(min(poll_interval, max(0.1, delay)))
+
+    def requeue_or_fail(self, domain, error, delay_for_attempt, max_attempts=5, files=0, bytes=0):
+        """
+        可重试失败：未超过 max_attempts 时按 delay_for_attempt(attempts) 秒后重新排队并返回 True，
+        否则标记为 failed 并返回 False。
+        """
+        def update(db):
+            attempts = db.execute("SELECT attempts FROM jobs WHERE domain = ?", (domain,)).fetchone()[0]
+            now = time.time()
+            if attempts >= max_attempts:
+                db.execute(
+                    "UPDATE jobs SET state = ?, last_error = ?, files = ?, bytes = ?, "
+                    "updated_at = ?, finished_at = ? WHERE domain = ?",
+                    (FAILED, str(error), files, bytes, now, now, domain))
+                return False
+            db.execute(
+                "UPDATE jobs SET state = ?, last_error = ?, files = ?, bytes = ?, "
+                "updated_at = ?, next_attempt_at = ? WHERE domain = ?",
+                (PENDING, str(error), files, bytes, now, now + delay_for_attempt(attempts), domain))
+            return True
+        return self._transaction(update)
+
+    def set_state(self, domain, state, **fields):
+        """更新域名状态，fields 可包含 files / bytes / last_error / priority"""
+        if state not in STATES:
+            raise ValueError(f"未知状态: {state}")
+        now = time.time()
+        columns = {"state": state, "updated_at": now}
+        if state in (DONE, FAILED):
+            columns["finished_at"] = now
+        columns.update(fields)
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        self._transaction(lambda db: db.execute(
+            f"UPDATE jobs SET {assignments} WHERE domain = ?", list(columns.values()) + [domain]))
+
+    def mark_done(self, domain, files=0, bytes=0):
+        self.set_state(domain, DONE, files=files, bytes=bytes, last_error=None)
+
+    def mark_failed(self, domain, error, files=0, bytes=0):
+        self.set_state(domain, FAILED, files=files, bytes=bytes, last_error=str(error))
+
+    def mark_capped(self, domain, reason, files=0, bytes=0):
+        self.set_state(domain, CAPPED, files=files, bytes=bytes, last_error=str(reason))
+
+    def continue_capped(self, priority=-1):
+        """把 capped 的域名以低优先级（priority < 0，排在所有正常域名之后）放回 pending，返回数量"""
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = ?, priority = ?, attempts = 0, next_attempt_at = 0, updated_at = ? "
+            "WHERE state = ?", (PENDING, priority, time.time(), CAPPED)).rowcount)
+
+    def reset_stale(self):
+        """把上次运行中断时仍处于 listing/downloading 的域名放回 pending"""
+        def reset(db):
+            return db.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE state IN (?, ?)",
+                (PENDING, time.time()) + ACTIVE_STATES).rowcount
+        return self._transaction(reset)
+
+    def retry_failed(self):
+        """把 failed 的域名重新放回 pending，并清零尝试次数"""
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = ?, attempts = 0, next_attempt_at = 0, updated_at = ? WHERE state = ?",
+            (PENDING, time.time(), FAILED)).rowcount)
+
+    def requeue(self, domains):
+        """把指定域名（不论当前状态）放回 pending，例如完整性检查发现文件损坏后补下"""
+        domains = list(domains)
+        self.add_domains(domains)
+        now = time.time()
+        return self._transaction(lambda db: db.executemany(
+            "UPDATE jobs SET state = ?, attempts = 0, next_attempt_at = 0, updated_at = ? WHERE domain = ?",
+            [(PENDING, now, domain) for domain in domains]).rowcount)
+
+    def defer(self, domain, delay):
+        """把刚领取的域名放回 pending，delay 秒后再领取，不计入尝试次数"""
+        now = time.time()
+        self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = ?, attempts = MAX(0, attempts - 1), next_attempt_at = ?, updated_at = ? "
+            "WHERE domain = ?", (PENDING, now + delay, now, domain)))
+
+    def state_of(self, domain):
+        with self._lock:
+            row = self._db.execute("SELECT state FROM jobs WHERE domain = ?", (domain,)).fetchone()
+        return row[0] if row else None
+
+    def save_estimates(self, estimates):
+        """
+        保存成本估算 [{'domain', 'planner', 'pages', 'files', 'bytes', 'seconds'}]，
+        并把估算耗时（秒）写入 priority，claim_next 因此按从大到小（LPT）领取
+        """
+        now = time.time()
+
+        def save(db):
+            db.executemany(
+                "INSERT OR REPLACE INTO estimates VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(e['domain'], e['planner'], e['pages'], e['files'], e['bytes'], e['seconds'], now)
+                 for e in estimates])
+            db.executemany(
+                "UPDATE jobs SET priority = ? WHERE domain = ? AND priority >= 0",
+                [(int(e['seconds']), e['domain']) for e in estimates])
+        self._transaction(save)
+
+    def pending_estimates(self, planner):
+        """返回 (已有估算的 pending 域名列表, 尚无该 planner 估算的 pending 域名列表)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT j.domain, e.pages, e.files, e.bytes, e.seconds FROM jobs j "
+                "LEFT JOIN estimates e ON e.domain = j.domain AND e.planner = ? "
+                "WHERE j.state = ? ORDER BY j.id", (planner, PENDING)).fetchall()
+        known = [{'domain': d, 'planner': planner, 'pages': p, 'files': f, 'bytes': b, 'seconds': s}
+                 for d, p, f, b, s in rows if s is not None]
+        missing = [d for d, _p, _f, _b, s in rows if s is None]
+        return known, missing
+
+    def average_file_bytes(self):
+        """已完成域名的平均文件大小，还没有完成的域名时返回 None"""
+        with self._lock:
+            files, size = self._db.execute(
+                "SELECT SUM(files), SUM(bytes) FROM jobs WHERE state = ? AND files > 0", (DONE,)).fetchone()
+        return size / files if files else None
+
+    def add_aliases(self, pairs):
+        """记录 (别名, 实际使用的域名)，已有的别名以新记录为准"""
+        pairs = list(pairs)
+        if pairs:
+            self._transaction(lambda db: db.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?)", pairs))
+
+    def aliases(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT alias, domain FROM aliases").fetchall())
+
+    def merge_alias(self, alias, domain):
+        """把尚未开始的 alias 任务并入 domain：删除其 pending 行并记录别名，返回是否删除了任务"""
+        def merge(db):
+            deleted = db.execute("DELETE FROM jobs WHERE domain = ? AND state = ?", (alias, PENDING)).rowcount
+            db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (alias, domain))
+            db.execute("UPDATE aliases SET domain = ? WHERE domain = ?", (domain, alias))
+            return bool(deleted)
+        return self._transaction(merge)
+
+    def add_plan(self, entries, batch_size=1000):
+        """
+        批量加入计划文件中的快照 [{'domain', 'year', 'timestamp', 'url'}]，域名同时加入任务表；
+        有新快照的已完成域名重新排队。返回新加入的快照数
+        """
+        inserted = 0
+        batch = []
+
+        def flush(db):
+            now = time.time()
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (domain, created_at, updated_at) VALUES (?, ?, ?)",
+                [(d, now, now) for d in dict.fromkeys(e['domain'] for e in batch)])
+            added = []
+            for e in batch:
+                if db.execute("INSERT OR IGNORE INTO plan VALUES (?, ?, ?, ?)",
+                              (e['domain'], e['timestamp'], e['url'], e['year'])).rowcount:
+                    added.append(e['domain'])
+            db.executemany("UPDATE jobs SET state = ?, updated_at = ? WHERE domain = ? AND state = ?",
+                           [(PENDING, now, d, DONE) for d in set(added)])
+            return len(added)
+
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                inserted += self._transaction(flush)
+                batch = []
+        if batch:
+            inserted += self._transaction(flush)
+        return inserted
+
+    def plan_for(self, domain):
+        """[(year, timestamp, url)]，按时间戳排序"""
+        with self._lock:
+            return self._db.execute("SELECT year, timestamp, url FROM plan WHERE domain = ? ORDER BY timestamp, url",
+                                    (domain,)).fetchall()
+
+    def all_domains(self):
+        """[(domain, state)]，按加入顺序"""
+        with self._lock:
+            return self._db.execute("SELECT domain, state FROM jobs ORDER BY id").fetchall()
+
+    def mark_existing_done(self, base_dir="websites"):
+        """一次性迁移：把 base_dir 下已有目录的 pending 域名标记为 done"""
+        if not os.path.isdir(base_dir):
+            return 0
+        marked = 0
+        for name in os.listdir(base_dir):
+            with self._lock:
+                row = self._db.execute("SELECT state FROM jobs WHERE domain = ?", (name,)).fetchone()
+            if row and row[0] == PENDING:
+                files, size = measure_dir(os.path.join(base_dir, name))
+                self.mark_done(name, files=files, bytes=size)
+                marked += 1
+        return marked
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def domains(self, state):
+        with self._lock:
+            return [r[0] for r in self._db.execute(
+                "SELECT domain FROM jobs WHERE state = ? ORDER BY id", (state,))]
+
+    def failures(self):
+        """返回失败记录 [{'Time', 'URL', 'Error', 'Attempts'}]，即 failed_jobs.csv 的列"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT finished_at, domain, last_error, attempts FROM jobs WHERE state = ? ORDER BY id",
+                (FAILED,)).fetchall()
+        return [{"Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t or 0)),
+                 "URL": d, "Error": e, "Attempts": a} for t, d, e, a in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def measure_dir(path):
+    """统计目录下快照的文件数与总字节数（不含 <domain>.txt、.manifest.jsonl 等附属文件）"""
+    files, size = 0, 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            if not is_snapshot_file(name):
+                continue
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass
+    return files, size
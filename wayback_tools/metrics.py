@@ -0,0 +1,237 @@
+"""
+下载过程中的实时吞吐指标。
+
+逐行解析 Ruby 下载器的输出：
+    "<url> -> <path> (n/total)"                    已处理一个文件
+    "<url> # <path> already exists. (n/total)"     文件已存在
+    "<url> # <error>"                              下载出错
+    "Download completed in 12.3s, saved in ... (N files)"
+汇总出文件/秒、字节/秒、各域名的预计剩余时间和错误率，
+由后台线程定期原子地重写到指标文件（JSON），长时间运行时可以随时查看是否卡住。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+_PROGRESS_PATTERN = re.compile(r'\((\d+)/(\d+)\)\s*$')
+_SAVED_PATTERN = re.compile(r' -> (.+) \(\d+/\d+\)\s*$')
+_COMPLETED_PATTERN = re.compile(r'Download completed in ([\d.]+)s.*\((\d+) files\)')
+
+
+def parse_line(line):
+    """
+    解析一行下载器输出，返回 dict：
+    {'done', 'total'}（进度行）、'path'（新保存的文件）、'existing'、'error'、'completed_seconds'。
+    无关的行返回 None。
+    """
+    line = line.rstrip('\n')
+    completed = _COMPLETED_PATTERN.search(line)
+    if completed:
+        return {'completed_seconds': float(completed.group(1)), 'total': int(completed.group(2))}
+    event = {}
+    progress = _PROGRESS_PATTERN.search(line)
+    if progress:
+        event['done'], event['total'] = int(progress.group(1)), int(progress.group(2))
+    saved = _SAVED_PATTERN.search(line)
+    if saved:
+        event['path'] = saved.group(1)
+    elif ' # ' in line:
+        if 'already exists.' in line:
+            event['existing'] = True
+        else:
+            event['error'] = line.split(' # ', 1)[1]
+    return event or None
+
+
+class DomainProgress:
+    def __init__(self, domain):
+        self.domain = domain
+        self.started_at = time.time()
+        self.done = 0
+        self.total = 0
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.last_progress_at = self.started_at
+        self.completed_seconds = None
+
+    def eta(self, now):
+        """按本域名目前的速度估算剩余秒数"""
+        if not self.done or not self.total:
+            return None
+        rate = self.done / max(now - self.started_at, 1e-6)
+        return max(0, self.total - self.done) / rate
+
+    def as_dict(self, now):
+        eta = self.eta(now)
+        return {
+            'domain': self.domain,
+            'done': self.done,
+            'total': self.total,
+            'files': self.files,
+            'bytes': self.bytes,
+            'errors': self.errors,
+            'elapsed_s': round(now - self.started_at, 1),
+            'idle_s': round(now - self.last_progress_at, 1),
+            'eta_s': round(eta, 1) if eta is not None else None,
+        }
+
+
+class ThroughputMetrics:
+    """所有 worker 线程共享的计数器；window 秒内的速率用于观察当前吞吐"""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.started_at = time.time()
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.domains_done = 0
+        self.domains_failed = 0
+        self._active = {}
+        self._recent = deque()  # (time, files, bytes, errors)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def add_gauge(self, name, func):
+        """snapshot 时调用 func() 取值，例如自适应并发控制器的当前窗口"""
+        self._gauges[name] = func
+
+    def start_domain(self, domain):
+        with self._lock:
+            self._active[domain] = DomainProgress(domain)
+
+    def _record(self, now, files, size, errors):
+        self.files += files
+        self.bytes += size
+        self.errors += errors
+        self._recent.append((now, files, size, errors))
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+
+    def observe_line(self, domain, line):
+        """解析一行输出并更新计数，返回解析结果"""
+        event = parse_line(line)
+        if not event:
+            return None
+        size = 0
+        if 'path' in event and os.path.isfile(event['path']):
+            size = os.path.getsize(event['path'])
+        now = time.time()
+        with self._lock:
+            progress = self._active.get(domain)
+            if progress is None:
+                progress = self._active[domain] = DomainProgress(domain)
+            if 'done' in event:
+                progress.done, progress.total = event['done'], event['total']
+                progress.last_progress_at = now
+            if 'completed_seconds' in event:
+                progress.completed_seconds = event['completed_seconds']
+                progress.total = event['total']
+            files = 1 if 'path' in event and size else 0
+            errors = 1 if 'error' in event else 0
+            progress.files += files
+            progress.bytes += size
+            progress.errors += errors
+            self._record(now, files, size, errors)
+        return event
+
+    def add_files(self, domain, files, size):
+        """不经过 Ruby 输出的下载路径（如 --dedup-digests）直接计入文件数和字节数"""
+        now = time.time()
+        with self._lock:
+            progress = self._active.get(domain)
+            if progress is not None:
+                progress.files += files
+                progress.bytes += size
+                progress.done = progress.total = progress.files
+                progress.last_progress_at = now
+            self._record(now, files, size, 0)
+
+    def finish_domain(self, domain, ok=True):
+        with self._lock:
+            self._active.pop(domain, None)
+            if ok:
+                self.domains_done += 1
+            else:
+                self.domains_failed += 1
+
+    def snapshot(self):
+        now = time.time()
+        gauges = {name: func() for name, func in self._gauges.items()}
+        with self._lock:
+            elapsed = max(now - self.started_at, 1e-6)
+            window = min(self.window, elapsed)
+            recent = [item for item in self._recent if item[0] >= now - self.window]
+            recent_files = sum(item[1] for item in recent)
+            recent_bytes = sum(item[2] for item in recent)
+            recent_errors = sum(item[3] for item in recent)
+            return {
+                'updated_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)),
+                'uptime_s': round(elapsed, 1),
+                'files': self.files,
+                'bytes': self.bytes,
+                'errors': self.errors,
+                'error_rate': round(self.errors / max(1, self.files + self.errors), 4),
+                'files_per_s': round(self.files / elapsed, 3),
+                'bytes_per_s': round(self.bytes / elapsed, 1),
+                'recent_files_per_s': round(recent_files / window, 3),
+                'recent_bytes_per_s': round(recent_bytes / window, 1),
+                'recent_error_rate': round(recent_errors / max(1, recent_files + recent_errors), 4),
+                'domains_done': self.domains_done,
+                'domains_failed': self.domains_failed,
+                'domains_in_flight': [p.as_dict(now) for p in self._active.values()],
+                **gauges,
+            }
+
+
+def format_summary(snapshot):
+    """终端上显示的一行摘要"""
+    window = f"并发窗口 {snapshot['concurrency']['window']}，" if 'concurrency' in snapshot else ""
+    return (f"📈 {snapshot['recent_files_per_s']:.2f} 文件/秒，{window}"
+            f"{snapshot['recent_bytes_per_s'] / 1024:.1f} KB/秒，"
+            f"错误率 {snapshot['recent_error_rate']:.1%}，"
+            f"进行中 {len(snapshot['domains_in_flight'])} 个域名，"
+            f"已完成 {snapshot['domains_done']}，失败 {snapshot['domains_failed']}")
+
+
+class MetricsWriter(threading.Thread):
+    """后台线程：每 interval 秒把指标快照原子地写入 path，并在终端打印一行摘要"""
+
+    def __init__(self, metrics, path="metrics.json", interval=10, echo=True):
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.echo = echo
+        self._stopped = threading.Event()
+
+    def write(self):
+        snapshot = self.metrics.snapshot()
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        if self.echo:
+            print(format_summary(snapshot))
+
+    def _try_write(self):
+        """磁盘错误只提示不抛出：stop() 在主程序的 finally 中调用，不能掩盖原本的异常"""
+        try:
+            self.write()
+        except OSError as e:
+            print(f"⚠️ 写入指标文件失败: {e}")
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self._try_write()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self._try_write()
@@ -0,0 +1,99 @@
+"""
+按计划文件下载：直接给出要下载的快照，不查询 CDX。
+
+计划文件可以是 ai_agents/structured_urls.csv（表头 domain,year,url，
+url 为 https://web.archive.org/web/<timestamp>/<原始 url>），
+也可以是等价的 JSONL（每行 {"domain", "year", "url"}，或用 "timestamp" 和 "original" 代替 url）。
+快照先写入任务状态库的 plan 表，域名同时入队；下载时由共享连接池的 Python 引擎
+按 plan 表逐个域名下载，保存路径与 -sl 模式相同。在新机器上重建语料只需下载响应体本身。
+
+用法：
+    python wayback_main.py --plan ai_agents/structured_urls.csv --jobs 8 --connections 60
+"""
+
+import csv
+import json
+import os
+import re
+import sys
+from urllib.parse import urlsplit
+
+from wayback_tools.domain_input import StoreFeeder, clean_url
+from wayback_tools.download_engine import file_id_for
+
+_SNAPSHOT_URL = re.compile(r'/web/(\d{4,14})(?:[a-z]{2}_)?/(.+)$')
+
+
+def parse_snapshot_url(url):
+    """https://web.archive.org/web/<timestamp>[id_]/<原始 url> -> (timestamp, 原始 url)，不符合时返回 None"""
+    match = _SNAPSHOT_URL.search(url.strip())
+    if not match:
+        return None
+    return match.group(1), match.group(2)
+
+
+def _iter_items(path):
+    if path == '-':
+        lines = sys.stdin
+    elif os.path.splitext(path)[1].lower() == '.csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    else:
+        lines = open(path, 'r', encoding='utf-8')
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = None
+            yield item if isinstance(item, dict) else {}
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def iter_plan(path, normalize=clean_url):
+    """逐条产出 {'domain', 'year', 'timestamp', 'url'}；无法解析的行跳过并提示"""
+    skipped = 0
+    for item in _iter_items(path):
+        if item.get('url'):
+            parsed = parse_snapshot_url(item['url'])
+        elif item.get('timestamp') and item.get('original'):
+            parsed = str(item['timestamp']), item['original']
+        else:
+            parsed = None
+        if parsed is None:
+            skipped += 1
+            continue
+        timestamp, original = parsed
+        # 没有 domain 列时从原始 url 取主机名，没有协议头的 url 取不到，按无法解析处理
+        host = item.get('domain') or urlsplit(original).hostname
+        domain = normalize(str(host)) if host else None
+        if not domain:
+            skipped += 1
+            continue
+        year = str(item.get('year') or timestamp[:4])
+        yield {'domain': domain, 'year': year, 'timestamp': timestamp, 'url': original}
+    if skipped:
+        print(f"⚠️ 计划文件中 {skipped} 行无法解析，已跳过")
+
+
+def plan_file_list(rows):
+    """store.plan_for 的结果转换成 DownloadEngine.download_files 使用的文件列表，file_id 与 -sl 模式相同"""
+    return [{'file_url': url, 'timestamp': timestamp, 'file_id': file_id_for(url, year)}
+            for year, timestamp, url in rows]
+
+
+class PlanFeeder(StoreFeeder):
+    """后台线程：把计划文件分批写入 plan 表；added 为新加入的快照数"""
+
+    def run(self):
+        try:
+            self.added = self.store.add_plan(self._counted(), batch_size=self.batch_size)
+        except Exception as e:
+            self.error = e
+            print(f"❌ 读取计划文件出错: {e}")
@@ -0,0 +1,182 @@
+"""
+-sl 模式（每年最新主页）的下载规划。
+
+list_homepage_rows 只向 CDX 查询主页本身（精确 url，按月折叠），
+代替列出整个 domain/* 前缀再丢掉非主页的行。
+从 CDX 行（timestamp, original, digest）中挑出每年最新的主页快照，
+相同 digest 的响应体只下载一次放进 ContentStore，
+websites/<domain>/<year>/<timestamp>_index.html 用硬链接填充（或写入 WARC 分片）。
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from wayback_tools.cdx_client import WAYBACK_BASE_URL, list_snapshots
+from wayback_tools.download_engine import DownloadEngine, file_id_for, snapshot_url
+from wayback_tools.verify import append_manifest, digest_to_sha1
+
+
+# 按月折叠：每月只保留第一个快照，每年最多 12 行
+HOMEPAGE_COLLAPSE = "timestamp:6"
+
+
+def list_homepage_rows(domain, concurrency=1, cache=None, rate_limiter=None, base_url=WAYBACK_BASE_URL,
+                       fields=("timestamp", "original"), collapse=HOMEPAGE_COLLAPSE):
+    """只查询主页的精确 url，一次小请求即可得到 plan_latest_per_year 所需的行"""
+    return list_snapshots(domain, exact_url=True, concurrency=concurrency, from_timestamp=2009, cache=cache,
+                          rate_limiter=rate_limiter, fields=fields, collapse=collapse, base_url=base_url)
+
+
+def is_homepage(file_url):
+    """与 Ruby 版相同的判断：file_url.split('/')[3..-1] 为空即主页"""
+    return '/' in file_url and '/'.join(file_url.split('/')[3:]) == ""
+
+
+def plan_latest_per_year(rows):
+    """
+    对应 get_file_list_all_timestamps_latest：每年只保留最新的一个主页快照。
+    rows 为 [timestamp, original, digest] 列表，返回按年份排序的
+    [{'year', 'timestamp', 'file_url', 'digest'}]。
+    """
+    latest = {}
+    for row in rows:
+        timestamp, file_url, digest = row[0], row[1], row[2] if len(row) > 2 else None
+        if not is_homepage(file_url):
+            continue
+        year = timestamp[:4]
+        if year not in latest or latest[year]['timestamp'] < timestamp:
+            latest[year] = {'year': year, 'timestamp': timestamp, 'file_url': file_url, 'digest': digest}
+    return [latest[year] for year in sorted(latest)]
+
+
+def curated_file_list(entries):
+    """转换成 DownloadEngine.download_files 使用的文件列表，file_id 与 Ruby 版 -sl 模式相同"""
+    return [{'file_url': entry['file_url'], 'timestamp': entry['timestamp'],
+             'file_id': file_id_for(entry['file_url'], entry['year'])} for entry in entries]
+
+
+def snapshot_path(backup_path, entry):
+    """与 Ruby 版 download_file 一致的主页保存路径"""
+    return os.path.join(backup_path, entry['year'], f"{entry['timestamp']}_index.html")
+
+
+def recorded_url(entry):
+    """写入 <domain>.txt 的快照地址，与 Ruby 版记录的格式相同"""
+    return snapshot_url(entry['timestamp'], entry['file_url'])
+
+
+def raw_url(entry, base_url=WAYBACK_BASE_URL):
+    """id_ 形式返回归档时的原始响应体，与 CDX digest 对应"""
+    return snapshot_url(entry['timestamp'], entry['file_url'], raw=True, base_url=base_url)
+
+
+def download_domain_deduped(domain, concurrency, content_store=None, base_dir="websites",
+                            cache=None, rate_limiter=None, base_url=WAYBACK_BASE_URL, shard_writer=None,
+                            engine=None, homepage_only=False, budget=None):
+    """
+    按 digest 去重下载一个域名的每年最新主页。
+    默认存进 content_store 并硬链接到年份目录；传入 shard_writer 时改为追加到 WARC 分片，
+    相同 digest 只存一条记录，其余年份只增加索引项。
+    返回 {'files', 'bytes', 'fetched', 'linked', 'capped'}：files 为已有的年份快照数，linked 为本次新增的年份数，
+    fetched 为实际下载的响应体个数，capped 为因超出预算而没有下载的年份数。
+    engine 为多个域名共享的 DownloadEngine，未传入时临时创建一个。
+    homepage_only 为 True 时用 list_homepage_rows 只查询主页。
+    budget 为 DomainBudget 时按实际下载的响应体计数，超出上限后不再开始新的下载，
+    依赖这些响应体的年份不放入目录（硬链接已有内容不计数）。
+    """
+    fields = ("timestamp", "original", "digest")
+    if engine is not None:
+        base_url = engine.base_url
+    if homepage_only:
+        rows = list_homepage_rows(domain, concurrency, cache, rate_limiter, base_url, fields)
+    else:
+        rows = list_snapshots(domain, concurrency=concurrency, from_timestamp=2009, cache=cache,
+                              rate_limiter=rate_limiter, fields=fields, base_url=base_url)
+    entries = [entry for entry in plan_latest_per_year(rows) if entry['digest']]
+    backup_path = os.path.join(base_dir, domain)
+
+    if shard_writer:
+        def stored(digest):
+            return shard_writer.find_digest(digest) is not None
+
+        def store(digest, entry, chunks):
+            body = b"".join(chunks)
+            shard_writer.append(domain, entry['year'], entry['timestamp'], entry['file_url'], body, digest)
+            return len(body)
+
+        def placed(entry):
+            return shard_writer.contains(domain, entry['timestamp'], entry['file_url'])
+
+        def place(entry):
+            if not placed(entry):
+                shard_writer.add_alias(domain, entry['year'], entry['timestamp'], entry['file_url'],
+                                       entry['digest'])
+    else:
+        stored = content_store.has
+
+        def store(digest, entry, chunks):
+            return content_store.put_chunks(digest, chunks)
+
+        def placed(entry):
+            return os.path.exists(snapshot_path(backup_path, entry))
+
+        def place(entry):
+            path = snapshot_path(backup_path, entry)
+            content_store.link_to(entry['digest'], path)
+            manifest.append({'path': os.path.relpath(path, backup_path).replace(os.sep, '/'),
+                             'size': os.path.getsize(path), 'sha1': digest_to_sha1(entry['digest']),
+                             'timestamp': entry['timestamp'], 'url': entry['file_url']})
+
+    manifest = []
+    # 只处理本地还没有的年份；每个 digest 只取第一个快照下载一次
+    missing = [entry for entry in entries if not placed(entry)]
+    to_fetch = {}
+    for entry in missing:
+        digest = entry['digest']
+        if not stored(digest) and digest not in to_fetch:
+            to_fetch[digest] = entry
+
+    stats = {'files': len(entries), 'bytes': 0, 'fetched': 0, 'linked': len(missing), 'capped': 0}
+    own_engine = engine is None
+    if own_engine:
+        engine = DownloadEngine(pool_size=max(1, concurrency), rate_limiter=rate_limiter, base_url=base_url)
+
+    def fetch(digest, entry):
+        """超出预算时不下载，返回 None"""
+        if budget and not budget.reserve():
+            return None
+        size, saved = 0, False
+        try:
+            with engine.stream(raw_url(entry, engine.base_url)) as resp:
+                size = store(digest, entry, resp.iter_content(engine.chunk_size))
+            saved = True
+            return size
+        finally:
+            if budget:
+                budget.add(1 if saved else 0, size, reserved=True)
+
+    skipped = set()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for digest, size in zip(to_fetch, pool.map(lambda item: fetch(*item), to_fetch.items())):
+                if size is None:
+                    skipped.add(digest)
+                    continue
+                stats['fetched'] += 1
+                stats['bytes'] += size
+    finally:
+        if own_engine:
+            engine.close()
+    if skipped:
+        missing = [entry for entry in missing if entry['digest'] not in skipped]
+        stats['capped'] = stats['linked'] - len(missing)
+        stats['files'] -= stats['capped']
+        stats['linked'] = len(missing)
+
+    os.makedirs(backup_path, exist_ok=True)
+    with open(os.path.join(backup_path, f"{domain}.txt"), 'a', encoding='utf-8') as record:
+        for entry in missing:
+            place(entry)
+            record.write(recorded_url(entry) + "\n")
+    append_manifest(backup_path, manifest)
+    return stats
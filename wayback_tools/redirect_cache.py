@@ -0,0 +1,71 @@
+"""
+快照地址的重定向解析缓存。
+
+/web/<ts>/<url> 经常 302 到相邻的时间戳，每个文件多一次往返，重跑时还要再付一次。
+快照不可变，所以"请求地址 -> 最终地址"的映射可以持久保存：下次直接请求最终地址。
+映射保存在 SQLite 中（多个线程共享），命中、未命中和省下的往返次数可随时查看。
+最终地址请求失败时删除该映射，下次重新按原地址解析。
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class RedirectCache:
+    def __init__(self, db_path="redirect_cache.sqlite"):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.saved_round_trips = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=30000")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS redirects (
+                requested TEXT PRIMARY KEY,
+                final TEXT NOT NULL,
+                hops INTEGER NOT NULL,
+                created_at REAL
+            ) WITHOUT ROWID
+        """)
+
+    def resolve(self, url):
+        """返回缓存的最终地址；没有记录时返回 url 本身"""
+        with self._lock:
+            row = self._db.execute("SELECT final, hops FROM redirects WHERE requested = ?", (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return url
+            self.hits += 1
+            self.saved_round_trips += row[1]
+            return row[0]
+
+    def record(self, url, final, hops):
+        if final == url or not hops:
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO redirects VALUES (?, ?, ?, ?)",
+                             (url, final, hops, time.time()))
+            self.recorded += 1
+
+    def forget(self, url):
+        with self._lock:
+            self._db.execute("DELETE FROM redirects WHERE requested = ?", (url,))
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'saved_round_trips': self.saved_round_trips,
+                'recorded': self.recorded,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,160 @@
+"""
+失败分类、带抖动的指数退避，以及所有 worker 共享的令牌桶限速器。
+
+web.archive.org 限流时返回 429 或 5xx，或直接超时、重置连接；
+这些属于可重试错误，应在退避后重新排队，而不是整站丢失或静默残缺。
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+# Ruby 下载器输出中代表可重试错误的特征
+_RETRYABLE_LINE_PATTERNS = [
+    re.compile(r'\bHTTP (429|5\d\d)\b'),
+    re.compile(r'Too Many Requests', re.IGNORECASE),
+    re.compile(r'Net::(ReadTimeout|OpenTimeout|WriteTimeout)'),
+    re.compile(r'ECONNRESET|ECONNREFUSED|ETIMEDOUT|EHOSTUNREACH|Connection reset', re.IGNORECASE),
+    re.compile(r'execution expired|timed out|EOFError|end of file reached', re.IGNORECASE),
+    re.compile(r'SSL_connect|SSL_read', re.IGNORECASE),
+]
+_FATAL_LINE_PATTERN = re.compile(r'\bHTTP (4\d\d)\b')
+_THROTTLED_LINE_PATTERN = re.compile(r'\bHTTP 429\b|Too Many Requests', re.IGNORECASE)
+
+
+def classify_status(status):
+    """429 与 5xx 可重试，其余 HTTP 错误不可重试"""
+    if status == 429 or 500 <= status <= 599:
+        return RETRYABLE
+    return FATAL
+
+
+def classify_exception(exc):
+    """对 requests / aiohttp / 标准库异常进行分类"""
+    status = getattr(exc, 'status', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return classify_status(status)
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return RETRYABLE
+    name = type(exc).__name__
+    if any(word in name for word in ('Timeout', 'Connect', 'Disconnected', 'ChunkedEncoding',
+                                    'Payload', 'ClientOSError')):
+        return RETRYABLE
+    return FATAL
+
+
+def classify_line(line):
+    """对 Ruby 下载器的一行输出分类，不是错误行时返回 None"""
+    if ' -> ' in line:  # 成功下载的行："url -> path (n/total)"
+        return None
+    for pattern in _RETRYABLE_LINE_PATTERNS:
+        if pattern.search(line):
+            return RETRYABLE
+    if _FATAL_LINE_PATTERN.search(line):
+        return FATAL
+    return None
+
+
+def retry_after_seconds(headers):
+    """解析 Retry-After 头（只支持秒数形式）"""
+    value = headers.get('Retry-After') if headers else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=2.0, cap=600.0):
+    """第 attempt 次（从 1 开始）失败后的等待秒数：指数增长，在 [d/2, d] 之间抖动"""
+    delay = min(cap, base * (2 ** max(0, attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class FailureTally:
+    """统计一个域名下载过程中的可重试 / 不可重试错误"""
+
+    def __init__(self):
+        self.retryable = 0
+        self.throttled = 0
+        self.fatal = 0
+        self.last_retryable = None
+
+    def observe_line(self, line):
+        kind = classify_line(line)
+        if kind == RETRYABLE:
+            self.retryable += 1
+            self.last_retryable = line.strip()
+            if _THROTTLED_LINE_PATTERN.search(line):
+                self.throttled += 1
+        elif kind == FATAL:
+            self.fatal += 1
+        return kind
+
+    def observe_exception(self, exc):
+        """Python 下载路径中的异常，分类方式与 classify_exception 相同"""
+        kind = classify_exception(exc)
+        if kind == RETRYABLE:
+            self.retryable += 1
+            self.last_retryable = f"{type(exc).__name__}: {exc}"
+            if getattr(getattr(exc, 'response', None), 'status_code', None) == 429:
+                self.throttled += 1
+        else:
+            self.fatal += 1
+        return kind
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶：平均每秒 rate 个请求，最多允许 burst 个突发。
+    遇到 429 时调用 pause()，让所有共享此桶的 worker 一起暂停。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """尝试取令牌，成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """在 seconds 秒内拒绝发放令牌，并清空已积累的突发额度"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated_at = self.paused_until
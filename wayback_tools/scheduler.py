@@ -0,0 +1,108 @@
+"""
+多域名并发下载调度器。
+
+同时保持 N 个域名处于下载中，所有在途域名共享一个全局连接预算，
+取代原先"一次一个域名、每个域名固定 --concurrency 15"的串行方式。
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ConnectionBudget:
+    """全局连接预算：所有在途域名共享 total 个下载连接"""
+
+    def __init__(self, total, per_domain_max=None):
+        self.total = max(1, int(total))
+        self.per_domain_max = max(1, int(per_domain_max or total))
+        self.available = self.total
+        self._cond = threading.Condition()
+
+    def acquire(self, want):
+        """阻塞直到至少有 1 个连接可用，返回实际分到的连接数（不超过 want）"""
+        want = max(1, min(int(want), self.per_domain_max))
+        with self._cond:
+            while self.available < 1:
+                self._cond.wait()
+            granted = min(want, self.available)
+            self.available -= granted
+            return granted
+
+    def release(self, granted):
+        with self._cond:
+            self.available = min(self.total, self.available + granted)
+            self._cond.notify_all()
+
+    def resize(self, total):
+        """调整预算总量；缩小时已分出的连接照常归还，可用数可能暂时为负"""
+        total = max(1, int(total))
+        with self._cond:
+            self.available += total - self.total
+            self.total = total
+            self._cond.notify_all()
+
+    @property
+    def in_use(self):
+        return self.total - self.available
+
+
+class DomainScheduler:
+    """
+    保持最多 jobs 个域名同时在途，按需从 domains 迭代器中拉取下一个域名。
+
+    worker(domain, connections) 在线程池中执行，connections 为该域名分到的连接数；
+    返回值与异常都会交给 on_done(domain, result, error) 回调；on_done 自身抛出的异常会打印出来。
+    传入 controller（AIMDController）时，每个域名开始前把全局预算调整为控制器的当前窗口。
+    """
+
+    def __init__(self, jobs=4, connections=60, per_domain_max=None, controller=None):
+        self.jobs = max(1, int(jobs))
+        self.controller = controller
+        self.budget = ConnectionBudget(connections, per_domain_max)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._exhausted = False
+
+    def fair_share(self):
+        """当前每个域名应得的连接数：队列未取完时按 jobs 均分，收尾阶段按在途数均分"""
+        with self._lock:
+            sharers = self._in_flight if self._exhausted else self.jobs
+        return max(1, self.budget.total // max(1, sharers))
+
+    def _run_one(self, domain, worker, on_done):
+        if self.controller:
+            self.budget.resize(self.controller.window)
+        granted = self.budget.acquire(self.fair_share())
+        result, error = None, None
+        try:
+            result = worker(domain, granted)
+        except Exception as e:
+            error = e
+        finally:
+            self.budget.release(granted)
+            with self._lock:
+                self._in_flight -= 1
+        if on_done:
+            on_done(domain, result, error)
+        return result
+
+    def run(self, domains, worker, on_done=None):
+        """惰性消费 domains，直到全部域名处理完毕"""
+        slots = threading.Semaphore(self.jobs)
+
+        def _finished(domain, future):
+            slots.release()
+            # worker 的异常已交给 on_done，这里收到的是 on_done 自身抛出的异常，域名的状态可能没有更新
+            error = future.exception()
+            if error is not None:
+                print(f"❌ 处理 {domain} 的下载结果时出错: {type(error).__name__}: {error}")
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for domain in domains:
+                slots.acquire()
+                with self._lock:
+                    self._in_flight += 1
+                future = pool.submit(self._run_one, domain, worker, on_done)
+                future.add_done_callback(lambda f, domain=domain: _finished(domain, f))
+            with self._lock:
+                self._exhausted = True
@@ -0,0 +1,321 @@
+"""
+抓取主页引用的第三方脚本，全语料按内容去重。
+
+-sl 模式只下载主页，分析埋点时只能看到 <script src> 的地址，看不到 gtm.js、fbevents.js
+等脚本本身；整站下载又太贵。这里分四步，每一步的结果都记在 <store>/index.sqlite 中，
+中断后重跑只做剩下的部分：
+    scan     解析已下载主页的 <script src>（去掉 Wayback 改写的前缀，补全相对地址），
+             默认只保留第三方脚本，记为 (domain, 主页时间戳, 脚本 url)；
+    list     每个不同的脚本 url 只查一次 CDX（精确 url，按 digest 折叠），得到它的所有不同版本；
+    resolve  每条引用取主页时间戳之前最近的版本（没有时取之后最近的）；
+    fetch    每个不同的 digest 只下载一次（id_ 原始响应体），存进按内容寻址的 ContentStore。
+同一个标签管理器的构建被成千上万个域名引用，实际下载量只与不同版本数有关。
+
+用法：
+    python -m wayback_tools.script_fetch websites --store script_store
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from wayback_tools.canonical import canonical_domain
+from wayback_tools.cdx_client import WAYBACK_BASE_URL, CDXClient
+from wayback_tools.download_engine import DownloadEngine, snapshot_url
+from wayback_tools.snapshot_store import ContentStore
+
+_SCRIPT_SRC = re.compile(rb'<script\b[^>]*?\bsrc\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+# 非 id_ 下载的主页里脚本地址被改写成 https://web.archive.org/web/<ts>js_/http://...
+_ARCHIVED_PREFIX = re.compile(r'^(?:(?:https?:)?//web\.archive\.org)?/web/\d{1,14}(?:[a-z]{2}_)?/(?=https?:|//)',
+                              re.IGNORECASE)
+_HOMEPAGE = re.compile(r'^(\d{14})_index\.html$')
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pages (
+        page TEXT PRIMARY KEY,
+        mtime REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS refs (
+        domain TEXT NOT NULL,
+        page_timestamp TEXT NOT NULL,
+        url TEXT NOT NULL,
+        capture_timestamp TEXT,
+        digest TEXT,
+        PRIMARY KEY (domain, page_timestamp, url)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS refs_url ON refs(url);
+    CREATE TABLE IF NOT EXISTS captures (
+        url TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (url, timestamp)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS listed (
+        url TEXT PRIMARY KEY,
+        listed_at REAL
+    ) WITHOUT ROWID;
+"""
+
+
+def script_urls(html, page_url):
+    """主页中 <script src> 的绝对地址（只保留 http/https，去掉片段），按出现顺序去重"""
+    seen = []
+    for match in _SCRIPT_SRC.finditer(html):
+        src = next(group for group in match.groups() if group is not None)
+        src = _ARCHIVED_PREFIX.sub('', src.decode('utf-8', errors='ignore').strip())
+        if not src or src.startswith('/_static/'):
+            continue
+        url = urljoin(page_url, src).split('#', 1)[0]
+        if url.startswith('//'):
+            url = 'http:' + url
+        if urlsplit(url).scheme in ('http', 'https') and url not in seen:
+            seen.append(url)
+    return seen
+
+
+def is_third_party(url, domain):
+    """脚本主机既不是该域名，也不是它的子域名；archive.org 自己的脚本不算"""
+    host = canonical_domain(urlsplit(url).netloc)
+    site = canonical_domain(domain).split('/')[0]
+    if host == 'archive.org' or host.endswith('.archive.org'):
+        return False
+    return host != site and not host.endswith('.' + site)
+
+
+def iter_homepages(base_dir="websites", domains=None):
+    """产出 websites/<domain>/<year>/<timestamp>_index.html 的 (domain, timestamp, path)"""
+    for domain in sorted(domains or os.listdir(base_dir)):
+        domain_dir = os.path.join(base_dir, domain)
+        if not os.path.isdir(domain_dir):
+            continue
+        for year in sorted(os.listdir(domain_dir)):
+            year_dir = os.path.join(domain_dir, year)
+            if not (year.isdigit() and os.path.isdir(year_dir)):
+                continue
+            for name in sorted(os.listdir(year_dir)):
+                match = _HOMEPAGE.match(name)
+                if match:
+                    yield domain, match.group(1), os.path.join(year_dir, name)
+
+
+def nearest_capture(captures, timestamp):
+    """captures 按时间戳升序；取 timestamp 之前（含）最近的一个，没有时取之后最近的"""
+    before = [capture for capture in captures if capture[0] <= timestamp]
+    if before:
+        return before[-1]
+    return captures[0] if captures else None
+
+
+class ScriptIndex:
+    def __init__(self, root="script_store"):
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def scanned(self):
+        return dict(self._db.execute("SELECT page, mtime FROM pages"))
+
+    def add_page(self, page, mtime, domain, timestamp, urls):
+        self._db.execute("BEGIN")
+        try:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?)", (page, mtime))
+            self._db.executemany("INSERT OR IGNORE INTO refs (domain, page_timestamp, url) VALUES (?, ?, ?)",
+                                 [(domain, timestamp, url) for url in urls])
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def unlisted_urls(self):
+        return [row[0] for row in self._db.execute(
+            "SELECT DISTINCT url FROM refs WHERE url NOT IN (SELECT url FROM listed)")]
+
+    def add_captures(self, url, rows):
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany("INSERT OR IGNORE INTO captures VALUES (?, ?, ?)",
+                                 [(url, row[0], row[2]) for row in rows if len(row) > 2])
+            self._db.execute("INSERT OR REPLACE INTO listed VALUES (?, ?)", (url, time.time()))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def resolve(self):
+        """为还没有版本的引用挑选快照，返回新解析的引用数"""
+        pending = self._db.execute("""
+            SELECT domain, page_timestamp, url FROM refs
+            WHERE digest IS NULL AND url IN (SELECT url FROM listed)
+            ORDER BY url""").fetchall()
+        updates, url, captures = [], None, []
+        for domain, page_timestamp, ref_url in pending:
+            if ref_url != url:
+                url = ref_url
+                captures = self._db.execute("SELECT timestamp, digest FROM captures WHERE url = ? ORDER BY timestamp",
+                                            (url,)).fetchall()
+            capture = nearest_capture(captures, page_timestamp)
+            if capture:
+                updates.append((capture[0], capture[1], domain, page_timestamp, ref_url))
+        self._db.execute("BEGIN")
+        self._db.executemany("UPDATE refs SET capture_timestamp = ?, digest = ? "
+                             "WHERE domain = ? AND page_timestamp = ? AND url = ?", updates)
+        self._db.execute("COMMIT")
+        return len(updates)
+
+    def wanted(self):
+        """每个被引用的 digest 取一个 (url, 时间戳) 用于下载"""
+        return self._db.execute("""
+            SELECT digest, url, MIN(capture_timestamp) FROM refs
+            WHERE digest IS NOT NULL GROUP BY digest""").fetchall()
+
+    def counts(self):
+        return {
+            'pages': self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+            'refs': self._db.execute("SELECT COUNT(*) FROM refs").fetchone()[0],
+            'unresolved': self._db.execute("SELECT COUNT(*) FROM refs WHERE digest IS NULL").fetchone()[0],
+            'urls': self._db.execute("SELECT COUNT(DISTINCT url) FROM refs").fetchone()[0],
+            'digests': self._db.execute("SELECT COUNT(DISTINCT digest) FROM refs").fetchone()[0],
+        }
+
+    def close(self):
+        self._db.close()
+
+
+def scan_homepages(index, base_dir="websites", domains=None, corpus=None, include_first_party=False,
+                   match=None):
+    """解析新增或改动过的主页，返回本次扫描的主页数"""
+    scanned = index.scanned()
+    count = 0
+
+    def keep(url, domain):
+        if match and not re.search(match, url):
+            return False
+        return include_first_party or is_third_party(url, domain)
+
+    if corpus:
+        from wayback_tools.warc_shards import CorpusReader
+
+        reader = CorpusReader(corpus)
+        for domain in domains or reader.domains():
+            for entry, body in reader.iter_records(domain):
+                page = f"{corpus}:{CorpusReader.entry_path(entry)}"
+                if page in scanned:
+                    continue
+                urls = [url for url in script_urls(body, entry.url) if keep(url, domain)]
+                index.add_page(page, 0, domain, entry.timestamp, urls)
+                count += 1
+        return count
+
+    for domain, timestamp, path in iter_homepages(base_dir, domains):
+        mtime = os.path.getmtime(path)
+        if scanned.get(path) == mtime:
+            continue
+        with open(path, 'rb') as f:
+            body = f.read()
+        urls = [url for url in script_urls(body, f"http://{domain}/") if keep(url, domain)]
+        index.add_page(path, mtime, domain, timestamp, urls)
+        count += 1
+    return count
+
+
+async def _list_captures(index, urls, concurrency, cache, rate_limiter, base_url):
+    client = CDXClient(base_url, concurrency=concurrency, cache=cache, rate_limiter=rate_limiter,
+                       fields=("timestamp", "original", "digest"), collapse="digest")
+    async with client:
+        async def one(url):
+            try:
+                index.add_captures(url, await client.fetch_page(url))
+            except Exception as e:
+                print(f"⚠️ 查询脚本快照失败: {url}，错误信息: {e}")
+
+        await asyncio.gather(*(one(url) for url in urls))
+
+
+def fetch_scripts(base_dir="websites", root="script_store", domains=None, corpus=None, concurrency=8,
+                  cache=None, rate_limiter=None, base_url=WAYBACK_BASE_URL, include_first_party=False,
+                  match=None, engine=None):
+    """
+    依次执行 scan/list/resolve/fetch 四步，返回统计：
+    scanned 本次解析的主页数，listed 本次查询 CDX 的脚本 url 数，resolved 本次解析的引用数，
+    fetched/bytes 本次下载的脚本个数和字节数，reused 已在存储中、无需下载的 digest 数，
+    以及索引中的 refs/urls/digests/unresolved 总数。
+    """
+    index = ScriptIndex(root)
+    content_store = ContentStore(root)
+    stats = {'scanned': scan_homepages(index, base_dir, domains, corpus, include_first_party, match)}
+
+    urls = index.unlisted_urls()
+    if urls:
+        asyncio.run(_list_captures(index, urls, concurrency, cache, rate_limiter, base_url))
+    stats['listed'] = len(urls)
+    stats['resolved'] = index.resolve()
+
+    wanted = index.wanted()
+    to_fetch = [(digest, url, timestamp) for digest, url, timestamp in wanted if not content_store.has(digest)]
+    stats.update(fetched=0, bytes=0, errors=0, reused=len(wanted) - len(to_fetch))
+    own_engine = engine is None
+    if own_engine:
+        engine = DownloadEngine(pool_size=max(1, concurrency), rate_limiter=rate_limiter, base_url=base_url)
+
+    def fetch(item):
+        digest, url, timestamp = item
+        try:
+            with engine.stream(snapshot_url(timestamp, url, raw=True, base_url=engine.base_url)) as resp:
+                return content_store.put_chunks(digest, resp.iter_content(engine.chunk_size))
+        except Exception as e:
+            print(f"⚠️ 下载脚本失败: {url}@{timestamp}，错误信息: {e}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for size in pool.map(fetch, to_fetch):
+                if size is None:
+                    stats['errors'] += 1
+                else:
+                    stats['fetched'] += 1
+                    stats['bytes'] += size
+    finally:
+        if own_engine:
+            engine.close()
+    stats.update(index.counts())
+    index.close()
+    return stats
+
+
+def format_stats(stats):
+    return (f"📜 扫描主页 {stats['scanned']} 个，共 {stats['refs']} 条脚本引用、{stats['urls']} 个脚本地址、"
+            f"{stats['digests']} 个不同版本；本次下载 {stats['fetched']} 个（{stats['bytes'] / 1024 ** 2:.1f} MB），"
+            f"复用 {stats['reused']} 个，失败 {stats['errors']} 个，未找到快照的引用 {stats['unresolved']} 条")
+
+
+def main():
+    import argparse
+
+    from wayback_tools.cdx_cache import CDXCache
+    from wayback_tools.retry import TokenBucket
+
+    parser = argparse.ArgumentParser(description='抓取已下载主页引用的第三方脚本，按内容去重保存')
+    parser.add_argument('root', nargs='?', default='websites', help='主页目录（默认 websites）')
+    parser.add_argument('--store', default='script_store', help='脚本存储目录（默认 script_store）')
+    parser.add_argument('--corpus', default=None, help='从 WARC 分片语料读取主页（代替 root）')
+    parser.add_argument('--domain', action='append', default=None, help='只处理这些域名，可重复')
+    parser.add_argument('--concurrency', type=int, default=8, help='CDX 查询和下载的并发数（默认 8）')
+    parser.add_argument('--rate', type=float, default=5, help='每秒请求数上限（默认 5）')
+    parser.add_argument('--include-first-party', action='store_true', help='同时抓取站点自己的脚本')
+    parser.add_argument('--match', default=None, help='只抓取 url 匹配该正则的脚本，如 "gtm\\.js|fbevents\\.js"')
+    parser.add_argument('--cdx-cache', default='cdx_cache', help='CDX 响应缓存目录，传空字符串关闭缓存')
+    args = parser.parse_args()
+
+    cache = CDXCache(args.cdx_cache) if args.cdx_cache else None
+    stats = fetch_scripts(args.root, args.store, args.domain, args.corpus, args.concurrency, cache,
+                          TokenBucket(args.rate), include_first_party=args.include_first_party, match=args.match)
+    print(format_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+多次运行、多台机器共享的快照读穿缓存代理。
+
+快照 /web/<14 位时间戳>[xx_]/<url> 一经归档就不会再变，重复下载只会浪费带宽和限速额度。
+代理接收与 web.archive.org 相同的请求：
+    /web/<ts>/...   命中时直接从磁盘返回；未命中时向上游请求，边转发边写入临时文件，
+                    完整收到 200 后原子改名并记入索引。时间戳精确的 3xx 只记录 Location
+                    （改写为代理自己的地址），之后的重定向也不再访问上游。
+                    同一个地址的并发未命中只向上游请求一次，其余请求等它写完后读缓存。
+    其他路径        （CDX 查询等）原样转发，不缓存；CDX 由客户端的 CDXCache 缓存。
+    /proxy-stats    命中、未命中、合并请求数、从缓存/上游返回的字节数、淘汰数（JSON）
+429、5xx 等错误原样转发（含 Retry-After），不缓存，客户端的退避和限速照常生效。
+响应体存为 <cache_dir>/<key[:2]>/<key>，元数据放在 SQLite 索引中，总大小超过上限时
+按最近访问时间（LRU）淘汰。
+
+Python 下载路径和 Ruby 下载器都通过 WAYBACK_BASE_URL 指向代理：
+    python -m wayback_tools.snapshot_proxy --port 8766 --cache-dir snapshot_cache --max-gb 20
+    WAYBACK_BASE_URL=http://127.0.0.1:8766 python wayback_main.py --input domains.txt
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import uuid
+
+import aiohttp
+from aiohttp import web
+from yarl import URL
+
+from wayback_tools.cdx_client import ARCHIVE_URL
+
+# 只有精确到秒的时间戳才缓存；/web/2015/... 这类会重定向到"当前最近"的快照，结果可能变化
+_IMMUTABLE_PATH = re.compile(r'^/web/\d{14}(?:[a-z]{2}_)?/')
+_FORWARDED_HEADERS = ('Content-Type', 'Retry-After', 'Link', 'Memento-Datetime')
+# 多个代理共享同一个缓存目录时，其他进程写入的大小每隔这么多秒从索引重新统计一次
+TOTAL_REFRESH_SECONDS = 10
+
+
+class SnapshotCache:
+    def __init__(self, cache_dir="snapshot_cache", max_bytes=20 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), isolation_level=None)
+        self._db.execute("PRAGMA busy_timeout=30000")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                path TEXT,
+                status INTEGER NOT NULL,
+                content_type TEXT,
+                location TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL,
+                accessed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at);
+        """)
+        self._refresh_total()
+        if self.max_bytes and self._total_bytes > self.max_bytes:
+            self._evict_lru()
+
+    def _refresh_total(self):
+        """总大小以索引为准：同一目录上的其他代理进程也在写入和淘汰"""
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._refreshed_at = time.monotonic()
+
+    @staticmethod
+    def make_key(path_qs):
+        return hashlib.sha256(path_qs.encode('utf-8')).hexdigest()
+
+    def body_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """返回 {'status', 'content_type', 'location', 'size'}，没有记录或文件丢失时返回 None"""
+        row = self._db.execute("SELECT status, content_type, location, size FROM entries WHERE key = ?",
+                               (key,)).fetchone()
+        if row is None:
+            return None
+        status, content_type, location, size = row
+        if status == 200 and not os.path.exists(self.body_path(key)):
+            self._remove(key)
+            return None
+        self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return {'status': status, 'content_type': content_type, 'location': location, 'size': size}
+
+    def tmp_path(self, key):
+        """每次写入用不同的临时文件名，共享缓存目录的多台机器上进程号可能相同"""
+        path = self.body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{uuid.uuid4().hex}.tmp"
+
+    def commit(self, key, path_qs, tmp_path, content_type):
+        """把写完的临时文件改名为缓存内容并记入索引"""
+        os.replace(tmp_path, self.body_path(key))
+        self._put(key, path_qs, 200, content_type, None, os.path.getsize(self.body_path(key)))
+
+    def put_redirect(self, key, path_qs, status, location):
+        self._put(key, path_qs, status, None, location, 0)
+
+    def _put(self, key, path_qs, status, content_type, location, size):
+        now = time.time()
+        old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        self._total_bytes += size - (old[0] if old else 0)
+        self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (key, path_qs, status, content_type, location, size, now, now))
+        if time.monotonic() - self._refreshed_at > TOTAL_REFRESH_SECONDS:
+            self._refresh_total()
+        if self.max_bytes and self._total_bytes > self.max_bytes:
+            self._evict_lru()
+
+    def _remove(self, key):
+        row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._total_bytes -= row[0]
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self.body_path(key))
+        except OSError:
+            pass
+
+    def _evict_lru(self):
+        """按最近访问时间淘汰，直到总大小回到上限的 90% 以下"""
+        self._refresh_total()
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for (key,) in self._db.execute("SELECT key FROM entries ORDER BY accessed_at").fetchall():
+            if self._total_bytes <= target:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def snapshot(self):
+        self._refresh_total()
+        entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {'entries': entries, 'bytes': self._total_bytes, 'evictions': self.evictions}
+
+    def close(self):
+        self._db.close()
+
+
+class SnapshotProxy:
+    def __init__(self, cache, upstream=ARCHIVE_URL, connections=60, timeout=120, chunk_size=64 * 1024):
+        self.cache = cache
+        self.upstream = upstream.rstrip('/')
+        self.connections = connections
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'passthrough': 0, 'upstream_errors': 0,
+                      'bytes_from_cache': 0, 'bytes_from_upstream': 0}
+        self._session = None
+        self._in_flight = {}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/proxy-stats', self.get_stats)
+        app.router.add_get('/{tail:.*}', self.handle)
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._stop)
+        return app
+
+    async def _start(self, app):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=self.timeout))
+
+    async def _stop(self, app):
+        await self._session.close()
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats.update(self.cache.snapshot())
+        return stats
+
+    async def get_stats(self, request):
+        return web.json_response(self.snapshot())
+
+    def _local_location(self, location):
+        """上游返回的 Location 改写为相对地址，客户端跟随重定向时仍经过代理"""
+        for prefix in (self.upstream, ARCHIVE_URL, ARCHIVE_URL.replace('https://', 'http://')):
+            if location.startswith(prefix + '/'):
+                return location[len(prefix):]
+        return location
+
+    async def handle(self, request):
+        path_qs = request.rel_url.raw_path_qs
+        if not _IMMUTABLE_PATH.match(request.path):
+            self.stats['passthrough'] += 1
+            return await self._forward(request, path_qs)
+
+        key = self.cache.make_key(path_qs)
+        while key in self._in_flight:
+            self.stats['coalesced'] += 1
+            await self._in_flight[key].wait()
+        entry = self.cache.get(key)
+        if entry:
+            self.stats['hits'] += 1
+            return self._serve_cached(key, entry)
+
+        self.stats['misses'] += 1
+        done = self._in_flight[key] = asyncio.Event()
+        try:
+            return await self._forward(request, path_qs, key)
+        finally:
+            del self._in_flight[key]
+            done.set()
+
+    def _serve_cached(self, key, entry):
+        if entry['status'] != 200:
+            return web.Response(status=entry['status'], headers={'Location': entry['location']})
+        self.stats['bytes_from_cache'] += entry['size']
+        return web.FileResponse(self.cache.body_path(key),
+                                headers={'Content-Type': entry['content_type'] or 'application/octet-stream'})
+
+    async def _forward(self, request, path_qs, key=None):
+        """向上游请求并边收边转发；key 不为空时把完整的 200 响应和精确时间戳的 3xx 写入缓存"""
+        try:
+            upstream = await self._session.get(URL(self.upstream + path_qs, encoded=True), allow_redirects=False)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats['upstream_errors'] += 1
+            return web.Response(status=502, text=f"{type(e).__name__}: {e}")
+        async with upstream:
+            headers = {name: upstream.headers[name] for name in _FORWARDED_HEADERS if name in upstream.headers}
+            if 300 <= upstream.status < 400 and 'Location' in upstream.headers:
+                location = self._local_location(upstream.headers['Location'])
+                if key and _IMMUTABLE_PATH.match(location):
+                    self.cache.put_redirect(key, path_qs, upstream.status, location)
+                return web.Response(status=upstream.status, headers=dict(headers, Location=location))
+            if upstream.status >= 400:
+                self.stats['upstream_errors'] += 1
+
+            response = web.StreamResponse(status=upstream.status, headers=headers)
+            if upstream.content_length is not None and 'Content-Encoding' not in upstream.headers:
+                response.content_length = upstream.content_length
+            await response.prepare(request)
+            caching = key is not None and upstream.status == 200
+            tmp_path = self.cache.tmp_path(key) if caching else None
+            f = open(tmp_path, 'wb') if caching else None
+            try:
+                async for chunk in upstream.content.iter_chunked(self.chunk_size):
+                    self.stats['bytes_from_upstream'] += len(chunk)
+                    if f:
+                        f.write(chunk)
+                    await response.write(chunk)
+                if f:
+                    f.close()
+                    self.cache.commit(key, path_qs, tmp_path, upstream.headers.get('Content-Type'))
+            finally:
+                if f and not f.closed:
+                    f.close()
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            await response.write_eof()
+            return response
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Wayback 快照的本地读穿缓存代理')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--upstream', default=ARCHIVE_URL, help='上游地址（默认 https://web.archive.org）')
+    parser.add_argument('--cache-dir', default='snapshot_cache', help='缓存目录（默认 snapshot_cache）')
+    parser.add_argument('--max-gb', type=float, default=20, help='缓存总大小上限（GB，默认 20）')
+    parser.add_argument('--connections', type=int, default=60, help='到上游的最大连接数（默认 60）')
+    args = parser.parse_args()
+
+    cache = SnapshotCache(args.cache_dir, int(args.max_gb * 1024 ** 3))
+    proxy = SnapshotProxy(cache, args.upstream, args.connections)
+    stats = cache.snapshot()
+    print(f"🗃️ 缓存中已有 {stats['entries']} 个响应（{stats['bytes'] / 1024 ** 2:.1f} MB），"
+          f"监听 http://{args.host}:{args.port}，上游 {proxy.upstream}")
+    try:
+        web.run_app(proxy.app(), host=args.host, port=args.port, print=None)
+    finally:
+        s = proxy.snapshot()
+        print(f"🗃️ 命中 {s['hits']} 次，未命中 {s['misses']} 次，合并 {s['coalesced']} 次，"
+              f"从缓存返回 {s['bytes_from_cache'] / 1024 ** 2:.1f} MB，从上游下载 {s['bytes_from_upstream'] / 1024 ** 2:.1f} MB")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+按内容寻址的快照存储。
+
+以 CDX 的 digest（原始响应体的 SHA1/base32）为键，每个不同的响应体只保存一份，
+各年份目录下的 *_index.html 通过硬链接指向同一份内容。
+"""
+
+import os
+import shutil
+import threading
+
+
+class ContentStore:
+    def __init__(self, root="snapshot_store"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def put_chunks(self, digest, chunks):
+        """
+        把响应体分块写入存储（先写临时文件再原子改名），返回写入的字节数。
+        临时文件按线程区分：多个域名同时下载同一 digest 时各写各的，改名后内容相同。
+        """
+        path = self.path_for(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size
+
+    def link_to(self, digest, dest_path):
+        """在 dest_path 创建指向该内容的硬链接；跨文件系统等无法硬链接时退回复制"""
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        try:
+            os.link(self.path_for(digest), dest_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(self.path_for(digest), dest_path)
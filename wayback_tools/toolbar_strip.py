@@ -0,0 +1,268 @@
+"""
+去除 Wayback Machine 注入到快照页面里的内容。
+
+非 id_ 形式下载的页面带有：
+    <head> 开头的 Rewrite JS Include（bundle-playback.js / wombat.js / analytics.js 等，
+        以 <!-- End Wayback Rewrite JS Include --> 结束）
+    <!-- BEGIN WAYBACK TOOLBAR INSERT --> ... <!-- END WAYBACK TOOLBAR INSERT -->
+    </html> 之后的 <!-- FILE ARCHIVED ON ... --> 和 <!-- playback timings ... --> 注释
+    改写成 https://web.archive.org/web/<ts>im_/http://... 形式的链接
+这些内容会让文件变大、拖慢 BeautifulSoup 解析，也会让分析脚本的正则误报。
+
+按行流式处理，已清理过的文件记录在 SQLite 账本中（路径、大小、修改时间），再次运行时跳过；
+被改写的文件同时更新 .manifest.jsonl 中的大小和 SHA1，完整性检查不会把它们当作损坏。
+
+用法：
+    python -m wayback_tools.toolbar_strip websites --workers 8
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from wayback_tools.verify import MANIFEST_NAME, append_manifest, read_manifest
+
+_BLOCKS = [
+    # (开始位置的正则, 结束标记)
+    # src 必须直接指向 Wayback 自己的静态文件；/web/2015js_/http://site/_static/js/... 这类
+    # 被改写的站点脚本不算
+    (re.compile(rb'<script[^>]*\ssrc=["\']?(?:(?:https?:)?//(?:web-static\.|web\.)?archive\.org)?'
+                rb'/(?:_static/js/|includes/|static/js/analytics\.js)', re.IGNORECASE),
+     b'<!-- End Wayback Rewrite JS Include -->'),
+    (re.compile(rb'<!--\s*BEGIN WAYBACK TOOLBAR INSERT\s*-->', re.IGNORECASE),
+     b'<!-- END WAYBACK TOOLBAR INSERT -->'),
+]
+_ARCHIVE_COMMENT = re.compile(rb'FILE ARCHIVED ON|playback timings \(ms\)', re.IGNORECASE)
+_ARCHIVE_COMMENT_INLINE = re.compile(rb'<!--\s*(?:FILE ARCHIVED ON|playback timings \(ms\)).*?-->',
+                                     re.IGNORECASE | re.DOTALL)
+# https://web.archive.org/web/20150101000000im_/http://example.com/a.png -> http://example.com/a.png
+_REWRITTEN_URL = re.compile(rb'(?:(?:https?:)?//web\.archive\.org)?/web/\d{1,14}(?:[a-z]{2}_)?/(?=https?:|//)',
+                            re.IGNORECASE)
+
+
+def _find_end(line, start, end_marker):
+    index = line.find(end_marker, start)
+    if index < 0:
+        index = line.lower().find(end_marker.lower(), start)
+    return index
+
+
+def strip_lines(lines):
+    """
+    逐行产出去除注入内容后的行（bytes）。
+    块只有在找到结束标记后才去掉：开始之后的原始内容先暂存，到文件末尾仍没有结束标记时原样输出，
+    没有注入块的页面（如 id_ 原始页面）不会因为误匹配而丢失内容。
+    """
+    end_marker = None       # 正在跳过的块的结束标记
+    pending = []            # 块开始之后暂存的原始内容
+    in_comment = False      # 正在跳过 FILE ARCHIVED ON 注释
+    held = None             # 单独一行的 "<!--"，要看下一行才知道是不是归档注释
+
+    for line in lines:
+        if held is not None:
+            if _ARCHIVE_COMMENT.search(line):
+                held, in_comment = None, True
+            else:
+                yield held
+                held = None
+        if in_comment:
+            index = line.find(b'-->')
+            if index < 0:
+                continue
+            in_comment = False
+            line = line[index + 3:]
+            if not line.strip():
+                continue
+
+        out = b''
+        touched = end_marker is not None
+        while line:
+            if end_marker:
+                index = _find_end(line, 0, end_marker)
+                if index < 0:
+                    pending.append(line)
+                    break
+                line = line[index + len(end_marker):]
+                end_marker, pending = None, []
+                continue
+            starts = [(match.start(), end) for pattern, end in _BLOCKS
+                      for match in [pattern.search(line)] if match]
+            if not starts:
+                out += line
+                break
+            index, end_marker = min(starts)
+            out += line[:index]
+            line = line[index:]
+            touched = True
+
+        if b'<!--' in out:
+            stripped = _ARCHIVE_COMMENT_INLINE.sub(b'', out)
+            touched = touched or stripped != out
+            out = stripped
+        if b'/web/' in out:
+            out = _REWRITTEN_URL.sub(b'', out)
+        if out.strip() == b'<!--':
+            held = out
+            continue
+        if end_marker and pending and not out.strip():
+            # 块开始前的缩进留给暂存内容，块没有结束时一起原样输出
+            pending[0] = out + pending[0]
+            continue
+        # 注入块占据的整行连同换行一起去掉
+        if out and (out.strip() or not touched):
+            yield out
+    if held is not None:
+        yield held
+    if pending:
+        yield b''.join(pending)
+
+
+def strip_file(path):
+    """
+    清理一个文件（先写临时文件再原子替换），返回 (path, 原大小, 新大小, 新内容的 SHA1)。
+    没有注入内容时不改写文件。
+    """
+    size = os.path.getsize(path)
+    tmp_path = f"{path}.strip.{os.getpid()}.tmp"
+    sha1 = hashlib.sha1()
+    try:
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for chunk in strip_lines(src):
+                dst.write(chunk)
+                sha1.update(chunk)
+        new_size = os.path.getsize(tmp_path)
+        if new_size != size:
+            # 替换会断开与 snapshot_store 的硬链接，原始内容仍保留在存储中
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path, size, new_size, sha1.hexdigest()
+
+
+def _update_manifests(results):
+    """把被改写文件的新大小和 SHA1 追加到所在域名目录的 .manifest.jsonl"""
+    by_dir = {}
+    for path, size, new_size, sha1 in results:
+        if new_size == size:
+            continue
+        directory = os.path.dirname(path)
+        while not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+            parent = os.path.dirname(directory)
+            if not parent or parent == directory:
+                directory = None
+                break
+            directory = parent
+        if directory:
+            by_dir.setdefault(directory, []).append((path, new_size, sha1))
+    for directory, changed in by_dir.items():
+        manifest = read_manifest(directory)
+        records = []
+        for path, new_size, sha1 in changed:
+            record = manifest.get(os.path.relpath(path, directory).replace(os.sep, '/'))
+            if record:
+                records.append(dict(record, size=new_size, sha1=sha1))
+        append_manifest(directory, records)
+
+
+class StripLedger:
+    """记录已清理过的文件；大小或修改时间变化（重新下载）后会重新清理"""
+
+    def __init__(self, path="strip_ledger.sqlite"):
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=30000")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS stripped (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                original_size INTEGER NOT NULL,
+                stripped_at REAL NOT NULL
+            )
+        """)
+
+    def is_clean(self, path):
+        row = self._db.execute("SELECT size, mtime FROM stripped WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def record(self, results):
+        rows = []
+        for path, original_size, _new_size, _sha1 in results:
+            stat = os.stat(path)
+            rows.append((path, stat.st_size, stat.st_mtime, original_size, time.time()))
+        self._db.execute("BEGIN")
+        self._db.executemany("INSERT OR REPLACE INTO stripped VALUES (?, ?, ?, ?, ?)", rows)
+        self._db.execute("COMMIT")
+
+    def close(self):
+        self._db.close()
+
+
+def iter_snapshot_files(root, pattern="_index.html"):
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith(pattern):
+                yield os.path.join(dirpath, name)
+
+
+def strip_tree(root="websites", ledger_path="strip_ledger.sqlite", workers=None, batch_size=200):
+    """
+    清理 root 下所有 *_index.html；workers 为进程数（None 为 CPU 核数，1 为不使用进程池）。
+    返回 (清理的文件数, 跳过的文件数, 节省的字节数)。
+    """
+    ledger = StripLedger(ledger_path)
+    cleaned, skipped, saved = 0, 0, 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        batch = []
+
+        def flush():
+            nonlocal cleaned, saved
+            results = list(pool.map(strip_file, batch, chunksize=16) if pool else map(strip_file, batch))
+            _update_manifests(results)
+            ledger.record(results)
+            cleaned += sum(1 for _path, size, new_size, _sha1 in results if new_size != size)
+            saved += sum(size - new_size for _path, size, new_size, _sha1 in results)
+            batch.clear()
+
+        for path in iter_snapshot_files(root):
+            if ledger.is_clean(path):
+                skipped += 1
+                continue
+            batch.append(path)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        if pool:
+            pool.shutdown()
+        ledger.close()
+    return cleaned, skipped, saved
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='批量去除快照中 Wayback Machine 注入的工具栏、脚本和改写的链接')
+    parser.add_argument('root', nargs='?', default='websites', help='快照目录（默认 websites）')
+    parser.add_argument('--ledger', default='strip_ledger.sqlite', help='记录已清理文件的账本')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    args = parser.parse_args()
+
+    cleaned, skipped, saved = strip_tree(args.root, args.ledger, args.workers)
+    print(f"✅ 清理了 {cleaned} 个文件，节省 {saved / 1024 / 1024:.1f} MB；{skipped} 个已清理过的文件被跳过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+增量构建 ai_agents/structured_urls.csv（代替 web_ai_agent.ipynb 中每次全量扫描的单元格）。
+
+websites/<domain>/*.txt 由下载器只追加写入。每个文件的大小、修改时间和已读到的偏移
+记录在 SQLite 账本中：没变的文件直接跳过，变大的文件只读新追加的部分；
+有文件被删除或变小（被改写）的域名删掉已有记录，现有文件从头重读。(domain, year, url) 的唯一约束负责去重，
+输出时按主键顺序读出即为排好序的结果，无需在内存中 sorted(set(...))。
+
+除 CSV 外，安装了 pyarrow 时还会写一份 Parquet（列式存储，pandas 读取更快）。
+
+用法：
+    python -m wayback_tools.url_index websites --output ai_agents/structured_urls.csv
+"""
+
+import csv
+import os
+import re
+import sqlite3
+
+URL_PATTERN = re.compile(r'https?://web\.archive\.org/web/(\d{4})\d+/(https?://[^/]+)')
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        offset INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS urls (
+        domain TEXT NOT NULL,
+        year TEXT NOT NULL,
+        url TEXT NOT NULL,
+        PRIMARY KEY (domain, year, url)
+    ) WITHOUT ROWID;
+"""
+
+
+def parse_lines(domain, lines):
+    """与原 notebook 相同的解析规则，产出 (domain, year, url)"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        match = URL_PATTERN.match(line)
+        if match:
+            yield domain, match.group(1), line
+
+
+def read_new_lines(path, offset):
+    """读取 offset 之后的完整行，返回 (行列表, 新偏移)；最后一行未写完时留到下次"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    return data[:end].decode('utf-8', errors='ignore').splitlines(), offset + end
+
+
+class URLIndex:
+    def __init__(self, db_path="ai_agents/structured_urls.sqlite"):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def rebuild(self):
+        """清空账本和记录，下次 update 时全量重读"""
+        self._db.execute("DELETE FROM files")
+        self._db.execute("DELETE FROM urls")
+
+    def update(self, base_dir="websites"):
+        """
+        扫描 base_dir 下各域名的 .txt，只读新增内容。返回 (读取的文件数, 跳过的文件数, 新增记录数, 删除记录数)。
+        有 .txt 被删除或变小（被改写）的域名，其记录全部删除并重读该域名现有的文件，结果与全量扫描相同。
+        """
+        ledger = {path: (size, mtime, offset)
+                  for path, size, mtime, offset in self._db.execute("SELECT * FROM files")}
+        present = []  # (domain, path, stat)
+        with os.scandir(base_dir) as domains:
+            for domain_entry in domains:
+                if not domain_entry.is_dir():
+                    continue
+                with os.scandir(domain_entry.path) as files:
+                    for entry in files:
+                        if entry.name.endswith('.txt') and entry.is_file():
+                            present.append((domain_entry.name, entry.path, entry.stat()))
+        present_paths = {path for _domain, path, _stat in present}
+        stale = {os.path.basename(os.path.dirname(path)) for path in ledger if path not in present_paths}
+        stale.update(domain for domain, path, stat in present if stat.st_size < ledger.get(path, (0, 0, 0))[2])
+
+        read, skipped, removed = 0, 0, 0
+        before = self.count()
+        self._db.execute("BEGIN")
+        try:
+            for domain in stale:
+                removed += self._db.execute("DELETE FROM urls WHERE domain = ?", (domain,)).rowcount
+            for path in [path for path in ledger if os.path.basename(os.path.dirname(path)) in stale]:
+                self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+                del ledger[path]
+            for domain, path, stat in present:
+                size, mtime, offset = ledger.get(path, (None, None, 0))
+                if size == stat.st_size and mtime == stat.st_mtime:
+                    skipped += 1
+                    continue
+                lines, offset = read_new_lines(path, offset)
+                self._db.executemany("INSERT OR IGNORE INTO urls VALUES (?, ?, ?)", parse_lines(domain, lines))
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                 (path, stat.st_size, stat.st_mtime, offset))
+                read += 1
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return read, skipped, self.count() - before + removed, removed
+
+    def count(self):
+        return self._db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def rows(self):
+        """按 (domain, year, url) 排序产出，直接沿主键顺序读取"""
+        return self._db.execute("SELECT domain, year, url FROM urls ORDER BY domain, year, url")
+
+    def write_csv(self, output_csv):
+        tmp_path = output_csv + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['domain', 'year', 'url'])  # 表头
+            writer.writerows(self.rows())
+        os.replace(tmp_path, output_csv)
+
+    def write_parquet(self, output_parquet, batch_size=100000):
+        """分批写 Parquet；未安装 pyarrow 时返回 False"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            return False
+        schema = pa.schema([('domain', pa.string()), ('year', pa.string()), ('url', pa.string())])
+        tmp_path = output_parquet + '.tmp'
+        cursor = self.rows()
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                columns = list(zip(*batch))
+                writer.write_table(pa.table([list(c) for c in columns], schema=schema))
+        os.replace(tmp_path, output_parquet)
+        return True
+
+    def close(self):
+        self._db.close()
+
+
+def build_index(input_base_dir='./websites', output_csv='./ai_agents/structured_urls.csv',
+                output_parquet=None, db_path=None, rebuild=False):
+    """更新索引并写出 CSV（和 Parquet），返回记录总数"""
+    if db_path is None:
+        db_path = os.path.splitext(output_csv)[0] + '.sqlite'
+    if output_parquet is None:
+        output_parquet = os.path.splitext(output_csv)[0] + '.parquet'
+    index = URLIndex(db_path)
+    try:
+        if rebuild:
+            index.rebuild()
+        read, skipped, added, removed = index.update(input_base_dir)
+        total = index.count()
+        changed = added or removed or rebuild
+        if changed or not os.path.exists(output_csv):
+            index.write_csv(output_csv)
+        if output_parquet and (changed or not os.path.exists(output_parquet)):
+            if not index.write_parquet(output_parquet):
+                print("ℹ️ 未安装 pyarrow，跳过 Parquet 输出")
+    finally:
+        index.close()
+    print(f"处理完成，读取 {read} 个文件（{skipped} 个未变化），新增 {added} 条，"
+          f"删除 {removed} 条（文件已删除或被改写），共 {total} 条记录，输出到 {output_csv}")
+    return total
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='增量构建 structured_urls 索引')
+    parser.add_argument('input', nargs='?', default='./websites', help='websites 根目录')
+    parser.add_argument('--output', default='./ai_agents/structured_urls.csv', help='输出 CSV')
+    parser.add_argument('--parquet', default=None, help='输出 Parquet（默认与 CSV 同名），传空字符串不输出')
+    parser.add_argument('--db', default=None, help='账本和去重用的 SQLite（默认与 CSV 同名）')
+    parser.add_argument('--rebuild', action='store_true', help='忽略账本，全量重建')
+    args = parser.parse_args()
+    build_index(args.input, args.output, args.parquet, args.db, args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+检查已下载快照的完整性，列出需要重新下载的最少文件。
+
+下载器遇到已存在的路径就跳过，被中断的下载留下的残缺文件永远不会被重新获取。
+两个下载引擎保存文件后都会在 websites/<domain>/.manifest.jsonl 中记录
+路径、大小和 SHA1；本模块用进程池重新计算哈希并与之比对：
+    manifest 中有记录：大小或 SHA1 不一致即为损坏，文件不存在即为缺失
+    snapshot_store 中的内容：文件名就是 CDX digest，直接比对
+    没有记录的旧文件：只能检查是否为空，--strict 时把缺少 </html> 的 HTML 也视为截断
+
+用法：
+    python -m wayback_tools.verify websites --workers 8 --output refetch.jsonl
+    python -m wayback_tools.verify websites --repair     # 删除有问题的文件并把域名重新排队
+"""
+
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+MANIFEST_NAME = ".manifest.jsonl"
+_SKIP_SUFFIXES = ('.txt', '.part', '.tmp', MANIFEST_NAME)
+
+
+def digest_to_sha1(digest):
+    """CDX digest（SHA1 的 base32）转为十六进制 SHA1"""
+    return base64.b32decode(digest).hex()
+
+
+def append_manifest(backup_path, records):
+    """records 为 [{'path'（相对 backup_path）, 'size', 'sha1', 'timestamp', 'url'}]"""
+    if not records:
+        return
+    with open(os.path.join(backup_path, MANIFEST_NAME), 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def read_manifest(backup_path):
+    """返回 {相对路径: 记录}，同一路径以最后一条为准"""
+    records = {}
+    manifest_path = os.path.join(backup_path, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 写入时被中断的最后一行
+                records[record['path']] = record
+    return records
+
+
+def hash_file(path):
+    """在工作进程中运行：返回 (path, size, sha1 十六进制, 末尾是否有 </html>)"""
+    sha1 = hashlib.sha1()
+    size = 0
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            sha1.update(chunk)
+            size += len(chunk)
+            tail = (tail + chunk)[-4096:]
+    return path, size, sha1.hexdigest(), b'</html>' in tail.lower()
+
+
+def _recorded_urls(backup_path, domain):
+    """从 <domain>.txt 中读取 timestamp -> 原始 url"""
+    urls = {}
+    txt_path = os.path.join(backup_path, f"{domain}.txt")
+    if os.path.exists(txt_path):
+        with open(txt_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                parts = line.strip().split('/web/', 1)
+                if len(parts) == 2 and '/' in parts[1]:
+                    timestamp, url = parts[1].split('/', 1)
+                    urls[timestamp] = url
+    return urls
+
+
+def is_snapshot_file(name):
+    """<domain>.txt 列表、.manifest.jsonl 和未写完的 .part/.tmp 不是快照"""
+    return not name.endswith(_SKIP_SUFFIXES)
+
+
+def snapshot_files(backup_path):
+    for dirpath, _dirnames, filenames in os.walk(backup_path):
+        for name in filenames:
+            if is_snapshot_file(name):
+                yield os.path.relpath(os.path.join(dirpath, name), backup_path).replace(os.sep, '/')
+
+
+def _problem(domain, path, reason, record=None, urls=None):
+    timestamp = (record or {}).get('timestamp')
+    if timestamp is None:
+        timestamp = os.path.basename(path).split('_', 1)[0] if path.endswith('_index.html') else None
+    url = (record or {}).get('url') or (urls or {}).get(timestamp)
+    return {'domain': domain, 'path': path, 'timestamp': timestamp, 'url': url, 'reason': reason}
+
+
+def verify_tree(base_dir="websites", workers=None, strict=False, domains=None):
+    """
+    检查 base_dir 下各域名的快照，返回有问题的文件列表
+    [{'domain', 'path', 'timestamp', 'url', 'reason'}]，reason 为 missing/size/sha1/empty/truncated。
+    """
+    problems = []
+    tasks = []  # (domain, 相对路径, manifest 记录或 None)
+    urls_by_domain = {}
+    for domain in sorted(domains or os.listdir(base_dir)):
+        backup_path = os.path.join(base_dir, domain)
+        if not os.path.isdir(backup_path):
+            continue
+        manifest = read_manifest(backup_path)
+        urls_by_domain[domain] = _recorded_urls(backup_path, domain)
+        for path, record in manifest.items():
+            if not os.path.exists(os.path.join(backup_path, path)):
+                problems.append(_problem(domain, path, 'missing', record))
+        for path in snapshot_files(backup_path):
+            tasks.append((domain, path, manifest.get(path)))
+
+    paths = [os.path.join(base_dir, domain, path) for domain, path, _record in tasks]
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        results = pool.map(hash_file, paths, chunksize=32) if pool else map(hash_file, paths)
+        for (domain, path, record), (_full_path, size, sha1, closed) in zip(tasks, results):
+            reason = None
+            if record is not None:
+                if size != record['size']:
+                    reason = 'size'
+                elif sha1 != record['sha1']:
+                    reason = 'sha1'
+            elif size == 0:
+                reason = 'empty'
+            elif strict and path.endswith('.html') and not closed:
+                reason = 'truncated'
+            if reason:
+                problems.append(_problem(domain, path, reason, record, urls_by_domain[domain]))
+    finally:
+        if pool:
+            pool.shutdown()
+    return problems
+
+
+def verify_content_store(root="snapshot_store", workers=None):
+    """snapshot_store 的文件名就是 digest，返回内容与之不符的 digest 列表"""
+    paths = [os.path.join(dirpath, name) for dirpath, _dirnames, filenames in os.walk(root)
+             for name in filenames if not name.endswith('.tmp')]
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        results = pool.map(hash_file, paths, chunksize=32) if pool else map(hash_file, paths)
+        return [os.path.basename(path) for path, _size, sha1, _closed in results
+                if sha1 != digest_to_sha1(os.path.basename(path))]
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def write_refetch_list(problems, output_path="refetch.jsonl"):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for problem in problems:
+            f.write(json.dumps(problem, ensure_ascii=False) + "\n")
+
+
+def repair(problems, base_dir="websites", store=None):
+    """删除有问题的文件（下载器只会补下不存在的文件），并把涉及的域名重新排队"""
+    for problem in problems:
+        path = os.path.join(base_dir, problem['domain'], problem['path'])
+        if os.path.exists(path):
+            os.remove(path)
+    domains = sorted({problem['domain'] for problem in problems})
+    if store is not None:
+        store.requeue(domains)
+    return domains
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='检查已下载快照的完整性，生成重新下载清单')
+    parser.add_argument('root', nargs='?', default='websites', help='快照目录（默认 websites）')
+    parser.add_argument('--workers', type=int, default=None, help='计算哈希的进程数（默认 CPU 核数）')
+    parser.add_argument('--strict', action='store_true', help='没有 manifest 记录的 HTML 缺少 </html> 时也视为截断')
+    parser.add_argument('--output', default='refetch.jsonl', help='重新下载清单')
+    parser.add_argument('--content-store', default='snapshot_store', help='同时检查按内容寻址的快照存储')
+    parser.add_argument('--repair', action='store_true', help='删除有问题的文件，并在任务状态库中把域名重新排队')
+    parser.add_argument('--state-db', default='wayback_jobs.sqlite', help='--repair 时使用的任务状态库')
+    args = parser.parse_args()
+
+    problems = verify_tree(args.root, args.workers, args.strict)
+    write_refetch_list(problems, args.output)
+    print(f"🔍 {len(problems)} 个文件需要重新下载，清单已保存至 {args.output}")
+
+    bad_digests = []
+    if args.content_store and os.path.isdir(args.content_store):
+        bad_digests = verify_content_store(args.content_store, args.workers)
+        print(f"🔍 {args.content_store} 中 {len(bad_digests)} 个内容与 digest 不符")
+
+    if args.repair:
+        from wayback_tools.job_store import JobStore
+
+        for digest in bad_digests:
+            os.remove(os.path.join(args.content_store, digest[:2], digest))
+        store = JobStore(args.state_db)
+        domains = repair(problems, args.root, store)
+        print(f"🛠️ 已删除有问题的文件，{len(domains)} 个域名重新排队")
+
+
+if __name__ == "__main__":
+    main()
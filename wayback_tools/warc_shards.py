@@ -0,0 +1,327 @@
+"""
+分片的 WARC 语料存储。
+
+下载器不再为每个快照写一个小文件，而是把快照作为 WARC resource 记录追加到
+少量压缩分片中（每个域名一个分片，或按大小滚动的分片）。每条记录单独压缩
+（zstd 帧，未安装 zstandard 时退回 gzip 成员），因此可以按偏移随机读取；
+所有记录的位置保存在 corpus/index.sqlite 中。
+
+分析脚本通过 CorpusReader 顺序遍历或按 (domain, year) 随机读取，
+不必再用 os.listdir + glob 遍历 websites/ 目录树。
+
+用法：
+    python -m wayback_tools.warc_shards pack websites corpus      # 把现有 websites/ 打包成分片
+    python -m wayback_tools.warc_shards stats corpus
+"""
+
+import base64
+import glob
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+from collections import namedtuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+IndexEntry = namedtuple('IndexEntry', 'domain year timestamp url digest shard offset length')
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS records (
+        domain TEXT NOT NULL,
+        year TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        url TEXT NOT NULL,
+        digest TEXT,
+        shard TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        PRIMARY KEY (domain, timestamp, url)
+    );
+    CREATE INDEX IF NOT EXISTS records_digest ON records(digest);
+    CREATE INDEX IF NOT EXISTS records_domain_year ON records(domain, year);
+"""
+
+
+def sha1_digest(body):
+    """与 CDX digest 相同的格式：SHA1 的 base32 编码"""
+    return base64.b32encode(hashlib.sha1(body).digest()).decode('ascii')
+
+
+def _warc_date(timestamp):
+    ts = (timestamp + "00000000000000")[:14]
+    return f"{ts[0:4]}-{ts[4:6]}-{ts[6:8]}T{ts[8:10]}:{ts[10:12]}:{ts[12:14]}Z"
+
+
+def build_warc_record(url, timestamp, body, digest=None, content_type="text/html"):
+    headers = [
+        "WARC/1.1",
+        "WARC-Type: resource",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {_warc_date(timestamp)}",
+        f"WARC-Target-URI: {url}",
+    ]
+    if digest:
+        headers.append(f"WARC-Payload-Digest: sha1:{digest}")
+    headers += [f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+    return ("\r\n".join(headers) + "\r\n\r\n").encode('utf-8') + body + b"\r\n\r\n"
+
+
+def parse_warc_record(data):
+    """返回 WARC 记录的内容部分"""
+    head, _, rest = data.partition(b"\r\n\r\n")
+    length = None
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value.strip())
+    return rest[:length] if length is not None else rest.rstrip(b"\r\n")
+
+
+class _Codec:
+    def __init__(self, name):
+        self.name = name
+        self.extension = ".warc.zst" if name == "zstd" else ".warc.gz"
+
+    def compress(self, data):
+        if self.name == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def for_shard(shard):
+        return _Codec("zstd" if shard.endswith(".zst") else "gzip")
+
+    def decompress(self, data):
+        if self.name == "zstd":
+            if zstandard is None:
+                raise RuntimeError("读取 .warc.zst 分片需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+
+def _open_index(root):
+    db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA busy_timeout=30000")
+    db.executescript(_SCHEMA)
+    return db
+
+
+class ShardWriter:
+    """
+    追加写入分片。mode='domain' 时每个域名一个分片；
+    mode='bucket' 时写满 max_shard_bytes 后换新分片（分片名带进程号，多进程写入互不冲突）。
+    """
+
+    def __init__(self, root="corpus", mode="bucket", max_shard_bytes=1024 ** 3):
+        if mode not in ("bucket", "domain"):
+            raise ValueError(f"未知的分片模式: {mode}")
+        self.root = root
+        self.mode = mode
+        self.max_shard_bytes = max_shard_bytes
+        self.codec = _Codec("zstd" if zstandard else "gzip")
+        os.makedirs(root, exist_ok=True)
+        self._db = _open_index(root)
+        self._lock = threading.Lock()
+        self._bucket_seq = 0
+        self._bucket = None
+
+    def _shard_for(self, domain):
+        if self.mode == "domain":
+            return domain + self.codec.extension
+        if self._bucket is None or os.path.getsize(os.path.join(self.root, self._bucket)) >= self.max_shard_bytes:
+            while True:
+                self._bucket_seq += 1
+                name = f"shard-{os.getpid()}-{self._bucket_seq:05d}{self.codec.extension}"
+                if not os.path.exists(os.path.join(self.root, name)):
+                    break
+            open(os.path.join(self.root, name), 'ab').close()
+            self._bucket = name
+        return self._bucket
+
+    def contains(self, domain, timestamp, url):
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM records WHERE domain = ? AND timestamp = ? AND url = ?",
+                (domain, timestamp, url)).fetchone() is not None
+
+    def find_digest(self, digest):
+        """已存储过相同内容时返回其 (shard, offset, length)"""
+        if not digest:
+            return None
+        with self._lock:
+            return self._db.execute(
+                "SELECT shard, offset, length FROM records WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+
+    def append(self, domain, year, timestamp, url, body, digest=None):
+        """追加一条记录并写入索引，返回压缩后的记录长度"""
+        data = self.codec.compress(build_warc_record(url, timestamp, body, digest))
+        with self._lock:
+            shard = self._shard_for(domain)
+            with open(os.path.join(self.root, shard), 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            self._db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (domain, year, timestamp, url, digest, shard, offset, len(data)))
+        return len(data)
+
+    def add_alias(self, domain, year, timestamp, url, digest):
+        """内容已存在（digest 相同）时只增加索引项，指向同一条记录"""
+        location = self.find_digest(digest)
+        if location is None:
+            raise KeyError(digest)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (domain, year, timestamp, url, digest) + tuple(location))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CorpusReader:
+    """分析脚本使用的只读接口"""
+
+    def __init__(self, root="corpus"):
+        self.root = root
+        self._db = _open_index(root)
+
+    def domains(self):
+        return [r[0] for r in self._db.execute("SELECT DISTINCT domain FROM records ORDER BY domain")]
+
+    def entries(self, domain=None, year_from=None, year_to=None):
+        query, params = "SELECT * FROM records WHERE 1 = 1", []
+        if domain:
+            query += " AND domain = ?"
+            params.append(domain)
+        if year_from:
+            query += " AND year >= ?"
+            params.append(str(year_from))
+        if year_to:
+            query += " AND year <= ?"
+            params.append(str(year_to))
+        query += " ORDER BY domain, year, timestamp"
+        return [IndexEntry(*row) for row in self._db.execute(query, params)]
+
+    def first_per_year(self, year_from=2009, year_to=2024):
+        """每个 (domain, year) 取一条记录，对应分析脚本里 matched_files[0] 的用法"""
+        seen = set()
+        for entry in self.entries(year_from=year_from, year_to=year_to):
+            if (entry.domain, entry.year) not in seen:
+                seen.add((entry.domain, entry.year))
+                yield entry
+
+    def read(self, entry):
+        """随机读取一条记录，返回响应体 bytes"""
+        with open(os.path.join(self.root, entry.shard), 'rb') as f:
+            f.seek(entry.offset)
+            data = f.read(entry.length)
+        return parse_warc_record(_Codec.for_shard(entry.shard).decompress(data))
+
+    def get(self, domain, year):
+        for entry in self.entries(domain, year, year):
+            return self.read(entry)
+        return None
+
+    def iter_records(self, domain=None):
+        """按分片内的物理顺序遍历 (entry, body)，顺序读取最快"""
+        entries = sorted(self.entries(domain), key=lambda e: (e.shard, e.offset))
+        for entry in entries:
+            yield entry, self.read(entry)
+
+    @staticmethod
+    def entry_path(entry):
+        """用于报表的记录标识，代替原来的 file_path"""
+        return f"{entry.shard}@{entry.offset}"
+
+
+def collect_corpus_files(corpus_dir, year_from=2009, year_to=2024):
+    """
+    web_ana_tools 中的分析脚本共用：每个网站/年份取一条快照，返回 (reader, files_to_analyze)，
+    files_to_analyze 的元素与按目录扫描时相同（website、year、file_path），另带 entry 供 reader.read 读取
+    """
+    reader = CorpusReader(corpus_dir)
+    files_to_analyze = []
+    for entry in reader.first_per_year(year_from, year_to):
+        files_to_analyze.append({
+            'website': entry.domain,
+            'year': int(entry.year),
+            'file_path': CorpusReader.entry_path(entry),
+            'entry': entry
+        })
+    return reader, files_to_analyze
+
+
+def _recorded_urls(domain_dir, domain):
+    """从 <domain>.txt 中读取 timestamp -> 原始 url 的对应关系"""
+    urls = {}
+    txt_path = os.path.join(domain_dir, f"{domain}.txt")
+    if os.path.exists(txt_path):
+        with open(txt_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                parts = line.strip().split('/web/', 1)
+                if len(parts) == 2 and '/' in parts[1]:
+                    timestamp, url = parts[1].split('/', 1)
+                    urls[timestamp] = url
+    return urls
+
+
+def pack_websites(base_dir="websites", root="corpus", mode="bucket"):
+    """把现有 websites/<domain>/<year>/*_index.html 打包进分片，相同内容只存一份"""
+    writer = ShardWriter(root, mode)
+    packed, deduped = 0, 0
+    for domain in sorted(os.listdir(base_dir)):
+        domain_dir = os.path.join(base_dir, domain)
+        if not os.path.isdir(domain_dir):
+            continue
+        urls = _recorded_urls(domain_dir, domain)
+        for path in sorted(glob.glob(os.path.join(domain_dir, '*', '*_index.html'))):
+            year = os.path.basename(os.path.dirname(path))
+            timestamp = os.path.basename(path).split('_', 1)[0]
+            url = urls.get(timestamp, f"http://{domain}/")
+            if writer.contains(domain, timestamp, url):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            digest = sha1_digest(body)
+            if writer.find_digest(digest):
+                writer.add_alias(domain, year, timestamp, url, digest)
+                deduped += 1
+            else:
+                writer.append(domain, year, timestamp, url, body, digest)
+            packed += 1
+    writer.close()
+    return packed, deduped
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='分片 WARC 语料存储工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    pack = subparsers.add_parser('pack', help='把 websites/ 目录打包成分片')
+    pack.add_argument('websites', nargs='?', default='websites')
+    pack.add_argument('corpus', nargs='?', default='corpus')
+    pack.add_argument('--mode', choices=['bucket', 'domain'], default='bucket', help='按大小滚动或每个域名一个分片')
+    stats = subparsers.add_parser('stats', help='显示语料统计')
+    stats.add_argument('corpus', nargs='?', default='corpus')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        packed, deduped = pack_websites(args.websites, args.corpus, args.mode)
+        print(f"✅ 已打包 {packed} 个快照（其中 {deduped} 个与已有内容相同，只记索引）到 {args.corpus}")
+    else:
+        reader = CorpusReader(args.corpus)
+        entries = reader.entries()
+        shards = {e.shard for e in entries}
+        print(f"📊 {len(reader.domains())} 个域名，{len(entries)} 条快照，{len(shards)} 个分片")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+下载器子进程的看门狗。
+
+Ruby 下载器卡在一次没有超时的 TLS 读取上时，进程永远不会退出，占着的 worker 也就一直空等。
+Watchdog 在后台线程中检查两个条件：
+    stall_timeout 秒内子进程没有任何输出（列快照分页时打印的 "." 也算进展）；
+    从启动算起超过 wall_timeout 秒。
+任一条件满足时结束整个进程组（shell 和其下的 ruby），reason 记录原因，
+调用方据此把域名当作可重试错误重新排队。传入 budget（DomainBudget）时，
+超过单域名耗时上限也会结束进程组（文件数和字节数上限由 run_downloader 按输出检查），
+原因记在 budget.reason 中，调用方把域名记为 capped。被杀掉时正在写入的文件不完整，
+remove_unrecorded_files 按 .manifest.jsonl 删除这些文件，避免下次被当作"已存在"跳过。
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from wayback_tools.verify import read_manifest, snapshot_files
+
+
+def popen_group(command, **kwargs):
+    """在新的进程组中启动命令，看门狗可以连同子进程一起结束"""
+    if os.name == 'posix':
+        kwargs['start_new_session'] = True
+    return subprocess.Popen(command, **kwargs)
+
+
+def kill_group(process, grace=5):
+    """先 SIGTERM 整个进程组，grace 秒后仍未退出则 SIGKILL"""
+    if process.poll() is not None:
+        return
+    if os.name != 'posix':
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def iter_output_lines(stream, on_data=None):
+    """
+    逐行产出子进程输出（str）。按块读取而不是按行读取，
+    这样不带换行的输出（如逐页打印的 "."）也会调用 on_data()，不会被误判为卡住。
+    """
+    fd = stream.fileno()
+    buffer = b''
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        if on_data:
+            on_data()
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line.rstrip(b'\r').decode('utf-8', errors='replace') + '\n'
+    if buffer:
+        yield buffer.decode('utf-8', errors='replace')
+
+
+class Watchdog:
+    def __init__(self, stall_timeout=600, wall_timeout=None, poll_interval=5, budget=None):
+        self.stall_timeout = stall_timeout
+        self.wall_timeout = wall_timeout
+        self.budget = budget
+        self.poll_interval = poll_interval
+        self.reason = None
+        self.started_at = None
+        self.last_progress_at = None
+        self._process = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def watch(self, process):
+        self._process = process
+        self.started_at = self.last_progress_at = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def touch(self):
+        self.last_progress_at = time.time()
+
+    def _run(self):
+        interval = min(self.poll_interval, self.stall_timeout or self.poll_interval,
+                       self.wall_timeout or self.poll_interval)
+        while not self._stopped.wait(interval):
+            if self._process.poll() is not None:
+                return
+            if self.budget and self.budget.exceeded():
+                kill_group(self._process)
+                return
+            now = time.time()
+            if self.stall_timeout and now - self.last_progress_at > self.stall_timeout:
+                self.reason = f"{now - self.last_progress_at:.0f} 秒没有进展"
+            elif self.wall_timeout and now - self.started_at > self.wall_timeout:
+                self.reason = f"超过总时长上限 {self.wall_timeout:.0f} 秒"
+            else:
+                continue
+            kill_group(self._process)
+            return
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+
+def remove_unrecorded_files(backup_path, since):
+    """
+    删除 since 之后修改、但不在 .manifest.jsonl 中的快照文件（被中断的下载），返回删除的相对路径。
+    下载器只在文件完整写入后追加清单，所以清单之外的新文件都是不完整的。
+    """
+    if not os.path.isdir(backup_path):
+        return []
+    recorded = read_manifest(backup_path)
+    removed = []
+    for path in snapshot_files(backup_path):
+        full_path = os.path.join(backup_path, path)
+        try:
+            if path not in recorded and os.path.getmtime(full_path) >= since:
+                os.remove(full_path)
+                removed.append(path)
+        except OSError:
+            pass
+    return removed
@@ -7,6 +7,7 @@ from collections import defaultdict
 import glob
 from tqdm import tqdm
 import time
+import sys
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 
@@ -714,12 +715,13 @@ class PersonalizationAnalyzer:
             'features': self.features
         }
 
-def analyze_website_personalization(html_path, show_progress=False):
-    """分析单个网站的个性化程度"""
+def analyze_website_personalization(html_path, show_progress=False, html_content=None):
+    """分析单个网站的个性化程度，html_content 不为空时直接分析（来自分片语料）"""
     try:
-        print(f"正在读取文件: {html_path}")
-        with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
-            html_content = file.read()
+        if html_content is None:
+            print(f"正在读取文件: {html_path}")
+            with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
+                html_content = file.read()
         
         print(f"开始分析文件: {html_path}")
         analyzer = PersonalizationAnalyzer()
@@ -835,8 +837,8 @@ def update_checkpoint(checkpoint_path, website, year):
     except Exception as e:
         print(f"更新检查点文件失败: {e}")
 
-def analyze_multiple_websites(root_dir, output_path=None, resume=True, clear_checkpoint=False):
-    """分析多个网站的个性化程度，支持增量写入和断点续跑"""
+def analyze_multiple_websites(root_dir, output_path=None, resume=True, clear_checkpoint=False, corpus_dir=None):
+    """分析多个网站的个性化程度，支持增量写入和断点续跑；corpus_dir 不为空时从分片语料读取"""
     # 设置默认输出路径
     if output_path is None:
         # 使用程序所在目录作为默认输出路径
@@ -863,9 +865,24 @@ def analyze_multiple_websites(root_dir, output_path=None, resume=True, clear_che
     
     # 首先收集所有需要分析的文件路径
     files_to_analyze = []
+    reader = None
     
     print("正在收集网站文件...")
-    websites = os.listdir(root_dir)
+    if corpus_dir:
+        # 以脚本运行（python web_ana_tools/optimized_web_personalize.py）时仓库根目录不在 sys.path 上
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if repo_root not in sys.path:
+            sys.path.insert(0, repo_root)
+        from wayback_tools.warc_shards import collect_corpus_files
+        reader, corpus_files = collect_corpus_files(corpus_dir)
+        for file_info in corpus_files:
+            already_processed = any(
+                record['website'] == file_info['website'] and record['year'] == file_info['year']
+                for record in processed_records
+            )
+            if not already_processed or not resume:
+                files_to_analyze.append(file_info)
+    websites = os.listdir(root_dir) if not corpus_dir else []
     for website in tqdm(websites, desc="扫描网站目录"):
         website_path = os.path.join(root_dir, website)
         if not os.path.isdir(website_path):
@@ -905,7 +922,11 @@ def analyze_multiple_websites(root_dir, output_path=None, resume=True, clear_che
         
         try:
             # 分析个性化程度
-            personalization_results = analyze_website_personalization(file_info['file_path'], show_progress=True)
+            html_content = None
+            if reader:
+                html_content = reader.read(file_info['entry']).decode('utf-8', errors='ignore')
+            personalization_results = analyze_website_personalization(file_info['file_path'], show_progress=True,
+                                                                      html_content=html_content)
             
             # 准备结果
             result = {
@@ -1054,20 +1075,22 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="网站个性化程度分析工具")
     parser.add_argument("--dir", help="网站目录的根路径")
     parser.add_argument("--html", help="单个HTML文件路径")
+    parser.add_argument("--corpus", help="WARC 分片语料目录（代替 --dir）")
     parser.add_argument("--output", help="输出文件路径")
     parser.add_argument("--no-resume", action="store_true", help="不使用断点续跑，重新开始分析")
     parser.add_argument("--clear-checkpoint", action="store_true", help="清除检查点文件，重新开始分析")
     
     args = parser.parse_args()
     
-    if args.dir:
+    if args.dir or args.corpus:
         analyze_multiple_websites(
             args.dir, 
             output_path=args.output, 
             resume=not args.no_resume,
-            clear_checkpoint=args.clear_checkpoint
+            clear_checkpoint=args.clear_checkpoint,
+            corpus_dir=args.corpus
         )
     elif args.html:
         analyze_single_html(args.html, output_path=args.output)
     else:
-        print("请指定 --dir 或 --html 参数")
+        print("请指定 --dir、--corpus 或 --html 参数")
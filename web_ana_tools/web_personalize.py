@@ -7,6 +7,7 @@ from collections import defaultdict
 import glob
 from tqdm import tqdm
 import time
+import sys
 from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 
@@ -714,12 +715,13 @@ class PersonalizationAnalyzer:
             'features': self.features
         }
 
-def analyze_website_personalization(html_path, show_progress=False):
-    """分析单个网站的个性化程度"""
+def analyze_website_personalization(html_path, show_progress=False, html_content=None):
+    """分析单个网站的个性化程度，html_content 不为空时直接分析（来自分片语料）"""
     try:
-        print(f"正在读取文件: {html_path}")
-        with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
-            html_content = file.read()
+        if html_content is None:
+            print(f"正在读取文件: {html_path}")
+            with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
+                html_content = file.read()
         
         print(f"开始分析文件: {html_path}")
         analyzer = PersonalizationAnalyzer()
@@ -747,15 +749,23 @@ def analyze_website_personalization(html_path, show_progress=False):
             'features': []
         }
 
-def analyze_multiple_websites(root_dir):
-    """分析多个网站的个性化程度"""
+def analyze_multiple_websites(root_dir, corpus_dir=None):
+    """分析多个网站的个性化程度，corpus_dir 不为空时从分片语料读取"""
     results = []
     
     # 首先收集所有需要分析的文件路径
     files_to_analyze = []
+    reader = None
     
     print("正在收集网站文件...")
-    websites = os.listdir(root_dir)
+    if corpus_dir:
+        # 以脚本运行（python web_ana_tools/web_personalize.py）时仓库根目录不在 sys.path 上
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if repo_root not in sys.path:
+            sys.path.insert(0, repo_root)
+        from wayback_tools.warc_shards import collect_corpus_files
+        reader, files_to_analyze = collect_corpus_files(corpus_dir)
+    websites = os.listdir(root_dir) if not corpus_dir else []
     for website in tqdm(websites, desc="扫描网站目录"):
         website_path = os.path.join(root_dir, website)
         if not os.path.isdir(website_path):
@@ -786,7 +796,11 @@ def analyze_multiple_websites(root_dir):
         print(f"\n[{i+1}/{total_files}] 正在分析: {file_info['website']} ({file_info['year']})")
         
         # 分析个性化程度
-        personalization_results = analyze_website_personalization(file_info['file_path'], show_progress=True)
+        html_content = None
+        if reader:
+            html_content = reader.read(file_info['entry']).decode('utf-8', errors='ignore')
+        personalization_results = analyze_website_personalization(file_info['file_path'], show_progress=True,
+                                                                  html_content=html_content)
         
         # 添加结果
         results.append({
@@ -946,6 +960,7 @@ def main():
     parser = argparse.ArgumentParser(description='网页个性化程度分析工具')
     parser.add_argument('--file', type=str, help='单个HTML文件路径')
     parser.add_argument('--dir', type=str, help='包含多个网站的目录路径')
+    parser.add_argument('--corpus', type=str, help='WARC 分片语料目录（代替 --dir）')
     parser.add_argument('--output', type=str, help='输出结果的文件路径')
     
     args = parser.parse_args()
@@ -966,9 +981,9 @@ def main():
         if args.output:
             generate_report(results, args.output)
         
-    elif args.dir:
+    elif args.dir or args.corpus:
         # 分析多个网站
-        results = analyze_multiple_websites(args.dir)
+        results = analyze_multiple_websites(args.dir, corpus_dir=args.corpus)
         
         # 输出结果
         if args.output:
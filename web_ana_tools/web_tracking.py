@@ -7,6 +7,7 @@ from collections import defaultdict
 import glob
 from tqdm import tqdm
 import time
+import sys
 
 class TrackingEventAnalyzer:
     def __init__(self):
@@ -315,12 +316,13 @@ class TrackingEventAnalyzer:
                 except:
                     pass
 
-def analyze_website_tracking(html_path, show_progress=False):
-    """分析单个网站的埋点事件"""
+def analyze_website_tracking(html_path, show_progress=False, html_content=None):
+    """分析单个网站的埋点事件，html_content 不为空时直接分析（来自分片语料）"""
     try:
-        print(f"正在读取文件: {html_path}")
-        with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
-            html_content = file.read()
+        if html_content is None:
+            print(f"正在读取文件: {html_path}")
+            with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
+                html_content = file.read()
         
         print(f"开始分析文件: {html_path}")
         analyzer = TrackingEventAnalyzer()
@@ -344,15 +346,23 @@ def analyze_website_tracking(html_path, show_progress=False):
             'events': []
         }
 
-def analyze_multiple_websites(root_dir):
-    """分析多个网站的埋点事件"""
+def analyze_multiple_websites(root_dir, corpus_dir=None):
+    """分析多个网站的埋点事件，corpus_dir 不为空时从分片语料读取"""
     results = []
     
     # 首先收集所有需要分析的文件路径
     files_to_analyze = []
+    reader = None
     
     print("正在收集网站文件...")
-    websites = os.listdir(root_dir)
+    if corpus_dir:
+        # 以脚本运行（python web_ana_tools/web_tracking.py）时仓库根目录不在 sys.path 上
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if repo_root not in sys.path:
+            sys.path.insert(0, repo_root)
+        from wayback_tools.warc_shards import collect_corpus_files
+        reader, files_to_analyze = collect_corpus_files(corpus_dir)
+    websites = os.listdir(root_dir) if not corpus_dir else []
     for website in tqdm(websites, desc="扫描网站目录"):
         website_path = os.path.join(root_dir, website)
         if not os.path.isdir(website_path):
@@ -383,7 +393,11 @@ def analyze_multiple_websites(root_dir):
         print(f"\n[{i+1}/{total_files}] 正在分析: {file_info['website']} ({file_info['year']})")
         
         # 分析埋点事件
-        tracking_results = analyze_website_tracking(file_info['file_path'], show_progress=True)
+        html_content = None
+        if reader:
+            html_content = reader.read(file_info['entry']).decode('utf-8', errors='ignore')
+        tracking_results = analyze_website_tracking(file_info['file_path'], show_progress=True,
+                                                    html_content=html_content)
         
         # 添加结果
         results.append({
@@ -523,6 +537,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='分析网页中的埋点事件')
     parser.add_argument('--file', type=str, help='单个HTML文件路径')
     parser.add_argument('--dir', type=str, help='网站目录路径')
+    parser.add_argument('--corpus', type=str, help='WARC 分片语料目录（代替 --dir）')
     parser.add_argument('--output', type=str, default='web_tracking_analysis.xlsx', help='输出Excel文件路径')
     
     args = parser.parse_args()
@@ -539,6 +554,12 @@ if __name__ == "__main__":
         print(f"准备分析单个HTML文件: {args.file}")
         results = [analyze_single_html(args.file)]
         export_to_excel(results, args.output)
+    elif args.corpus:
+        # 分析分片语料中的多个网站
+        print(f"准备分析分片语料: {args.corpus}")
+        results = analyze_multiple_websites(None, corpus_dir=args.corpus)
+        export_to_excel(results, args.output)
+        print(f"共分析了 {len(results)} 个网站/年份组合")
     elif args.dir:
         # 分析目录中的多个网站
         print(f"准备分析目录: {args.dir}")
@@ -551,7 +572,7 @@ if __name__ == "__main__":
         export_to_excel(results, args.output)
         print(f"共分析了 {len(results)} 个网站/年份组合")
     else:
-        print("请提供 --file 或 --dir 参数")
+        print("请提供 --file、--dir 或 --corpus 参数")
     
     # 显示总耗时
     end_time = time.time()